@@ -1,18 +1,41 @@
 import streamlit as st
-import gspread
-import pandas as pd
-import io
+import logging
+import hashlib
 import os
-from openpyxl import load_workbook
-from google.oauth2.service_account import Credentials
 import datetime
 import pytz
 import time 
+import threading
+import tempfile
+import uuid
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from storage import create_storage, sync_to_google_sheet
+from write_behind import WriteBehindQueue, PENDING, COMMITTED, FAILED
+from journal import SubmitJournal
+from quota import QuotaScheduler
+from lock_engine import LockEngine
+from template_render import TemplateError, render_openpyxl, render_xml
+from bulk_export import export_filename, filter_records, parse_date, write_zip
+from bulk_import import ERRORS, ROW, assign_numbers, read_upload, template_csv, to_records, validate
+from register_export import FORMATS, mirror_chunks, register_filename, storage_chunks, write_register
+from mirror import RegisterMirror
+from shards import ShardManager
+from spec_schema import (SPEC_SECTION_NAMES, SPEC_SECTIONS, decode_spec, encode_spec, ordered_sections,
+                         section_text, serialize_sections)
+from metrics import BACKGROUND, Metrics
+from excel_cache import ExcelCache, content_key
+from analytics import DIMENSION_LABELS, DIMENSIONS, RegisterSnapshot
+
+logger = logging.getLogger(__name__)
 
 # ========== Google Sheet 設定 ==========
 SHEET_NAME = "Project_Form"
 WORKSHEET_NAME = "Python"
-LOCK_SHEET_NAME = "Lock"
+LOCK_SHEET_NAME = "Locks"  # 每個專案代碼一列（舊的 Lock 工作表是單一全域 Lock，已不再使用）
+SEQ_SHEET_NAME = "Seq"
+SHARD_SHEET_NAME = "Shards"  # 分片 manifest：已封存的工作表（Python_2025 等）與其筆數、時間範圍
+SEQ_LEASE_SIZE = 1  # 每個程序一次預領的流水號數量（>1 時會以區塊方式預領，程序重啟時未用完的號碼會跳號）
 TAIWAN_TZ = pytz.timezone("Asia/Taipei")
 
 SCOPES = [
@@ -20,12 +43,83 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
-creds = Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"],
-    scopes=SCOPES
-)
-client = gspread.authorize(creds)
-sheet = client.open(SHEET_NAME).worksheet(WORKSHEET_NAME)
+# ========== 設定讀取（環境變數優先，其次 st.secrets） ==========
+def get_config(key, default=None):
+    if key in os.environ:
+        return os.environ[key]
+    try:
+        return st.secrets.get(key, default)
+    except Exception:  # 沒有 secrets.toml 時使用預設值
+        return default
+
+# 儲存後端："gsheets"（Google Sheet）或 "sqlite"（本機資料庫，不需網路）
+STORAGE_BACKEND = str(get_config("STORAGE_BACKEND", "gsheets")).strip().lower()
+SQLITE_PATH = get_config("SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "project_form.db"))
+# 背景批次寫入：累積筆數或等待秒數先到者就寫入一次
+WRITE_BATCH_SIZE = int(get_config("WRITE_BATCH_SIZE", 50))
+WRITE_FLUSH_SECONDS = float(get_config("WRITE_FLUSH_SECONDS", 1.0))
+# 送出日誌（本機 SQLite）：Google Sheet 無法連線時先存在這裡，每 REPLAY_SECONDS 秒整批補寫
+JOURNAL_PATH = get_config("JOURNAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "submit_journal.db"))
+REPLAY_SECONDS = float(get_config("REPLAY_SECONDS", 30))
+# Lock 租期（秒），從最後一次心跳起算，超過視為失效；預覽頁每 LOCK_HEARTBEAT_SECONDS 秒續約一次；
+# 登入頁讀 Lock 狀態可使用幾秒內的快取
+LOCK_LEASE_SECONDS = int(get_config("LOCK_LEASE_SECONDS", 120))
+LOCK_HEARTBEAT_SECONDS = float(get_config("LOCK_HEARTBEAT_SECONDS", 30))
+LOCK_CACHE_SECONDS = float(get_config("LOCK_CACHE_SECONDS", 5))
+# Google API 配額（服務帳號每分鐘的讀／寫請求數），超過時排隊等待；BURST 為可以連續送出的請求數
+QUOTA_READS_PER_MINUTE = int(get_config("QUOTA_READS_PER_MINUTE", 60))
+QUOTA_WRITES_PER_MINUTE = int(get_config("QUOTA_WRITES_PER_MINUTE", 60))
+QUOTA_BURST = int(get_config("QUOTA_BURST", 10))
+# 註冊表本機鏡像：超過 MIRROR_TTL_SECONDS 才增量同步，每 MIRROR_VERIFY_SECONDS 檢查一次是否有人手動修改
+MIRROR_TTL_SECONDS = float(get_config("MIRROR_TTL_SECONDS", 60))
+MIRROR_VERIFY_SECONDS = float(get_config("MIRROR_VERIFY_SECONDS", 300))
+
+# API 監控：設定路徑後每次重跑把紀錄寫成 JSON lines／Prometheus textfile（node_exporter textfile collector）
+METRICS_JSONL_PATH = get_config("METRICS_JSONL_PATH", "")
+METRICS_PROM_PATH = get_config("METRICS_PROM_PATH", "")
+# 產生的 Excel 快取（所有 session 共用）：記憶體上限／保留秒數，磁碟目錄與上限
+EXCEL_CACHE_MB = float(get_config("EXCEL_CACHE_MB", 64))
+EXCEL_CACHE_TTL_SECONDS = float(get_config("EXCEL_CACHE_TTL_SECONDS", 86400))
+EXCEL_CACHE_DIR = get_config("EXCEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "project_form_excel_cache"))
+EXCEL_CACHE_DISK_MB = float(get_config("EXCEL_CACHE_DISK_MB", 512))
+# 統計報表用的 Parquet 快照目錄（啟動時用來 seed 註冊表鏡像）
+ANALYTICS_SNAPSHOT_DIR = get_config("ANALYTICS_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics_snapshot"))
+# 註冊表分片：SHARD_BY 為 "year"（每年封存一次）、"rows"（達到 SHARD_MAX_ROWS 筆封存）或 "off"；
+# 封存分片下載後存在 ARCHIVE_DIR（Parquet）
+SHARD_BY = str(get_config("SHARD_BY", "year")).strip().lower()
+SHARD_MAX_ROWS = int(get_config("SHARD_MAX_ROWS", 20000))
+ARCHIVE_DIR = get_config("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "register_archive"))
+# 匯出完整註冊表時每次讀取／寫出的筆數（記憶體用量只跟這個值有關）
+EXPORT_CHUNK_ROWS = int(get_config("EXPORT_CHUNK_ROWS", 2000))
+# 表單輸入模式："batched"（文字欄位放在 st.form 內，按「✅ 完成」才一次送出；下拉選單集中在表單上方，見 form_page）
+#             或 "live"（原本的版面，每個欄位變更都重跑）
+FORM_MODE = str(get_config("FORM_MODE", "batched")).strip().lower()
+# 預先暖機：登入頁畫出來之後，在背景先連線 Google Sheet 並載入 openpyxl
+PREWARM = str(get_config("PREWARM", "0")).strip().lower() in ("1", "true", "yes")
+
+# 所有 session 共用的 API 呼叫／耗時統計
+metrics = Metrics(jsonl_path=METRICS_JSONL_PATH or None)
+
+# ========== Google 連線（第一次使用時才建立，整個程序共用） ==========
+# gspread / google-auth 只在這裡載入；AuthorizedSession 會在 token 到期前自動 refresh，
+# 同一個 session 重複使用 HTTP 連線，不必每次重跑頁面都重新驗證與連線
+@st.cache_resource(show_spinner=False)
+def get_client():
+    import gspread
+    from google.oauth2.service_account import Credentials
+    from google.auth.transport.requests import AuthorizedSession
+    from requests.adapters import HTTPAdapter
+
+    creds = Credentials.from_service_account_info(
+        st.secrets["gcp_service_account"],
+        scopes=SCOPES
+    )
+    session = AuthorizedSession(creds)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    client = gspread.authorize(creds, session=session)
+    metrics.instrument_http_client(client.http_client)
+    quota_scheduler.wrap_http_client(client.http_client)
+    return client
 
 # ========== 固定 Google Sheet 欄位順序 ==========
 SHEET_HEADERS = [
@@ -34,7 +128,11 @@ SHEET_HEADERS = [
     "Delivery_Location", "Sample_Date", "Sample_Qty", "Demand_Qty",
     "Schedule SI", "Schedule PV", "Schedule MV", "Schedule MP", "Spec_Type", "Update_Time",
     "Sales_Manager", "RD_Manager", "Apply_Date", "Applicant_Name",
-    "Fill_Date", "Spec_Writer", "Sales_Review", "RD_Review", "Approval"
+    "Fill_Date", "Spec_Writer", "Sales_Review", "RD_Review", "Approval",
+    # 完整規格內容（JSON），Spec_Type 只記方案名稱；新欄位一律加在最後，舊資料列不受影響
+    "Spec_Data",
+    # 每次送出的唯一編號，補寫前用來確認是否已經寫入（避免重複）
+    "Submission_Id"
 ]
 
 # ========== 使用者帳號密碼 ==========
@@ -51,62 +149,120 @@ USER_CREDENTIALS = {
 # 優先順序
 USER_PRIORITY = {"Jovi": 1, "Sam": 2, "Vivian": 3, "Lillian": 4, "Wendy": 5, "Honda": 6}
 
-# ========== Lock 機制 ==========
-def open_lock_ws():
-    sh = client.open(SHEET_NAME)
+# 所有 Google API 請求共用的配額排程，排隊時依 USER_PRIORITY 順序
+quota_scheduler = QuotaScheduler(
+    reads_per_minute=QUOTA_READS_PER_MINUTE,
+    writes_per_minute=QUOTA_WRITES_PER_MINUTE,
+    burst=QUOTA_BURST,
+    priorities=USER_PRIORITY,
+)
+
+# 管理者（可使用批次匯出等管理功能），可用設定 ADMIN_USERS="Jovi,Sam" 覆寫
+ADMIN_USERS = {u.strip() for u in str(get_config("ADMIN_USERS", "Jovi,Sam")).split(",") if u.strip()}
+
+def is_admin():
+    return st.session_state.get("user", "") in ADMIN_USERS
+
+# ========== 儲存後端 ==========
+storage = create_storage(
+    STORAGE_BACKEND,
+    SHEET_HEADERS,
+    client_factory=get_client,
+    sheet_name=SHEET_NAME,
+    worksheet_name=WORKSHEET_NAME,
+    lock_sheet_name=LOCK_SHEET_NAME,
+    seq_sheet_name=SEQ_SHEET_NAME,
+    shard_sheet_name=SHARD_SHEET_NAME,
+    sqlite_path=SQLITE_PATH,
+    tz=TAIWAN_TZ,
+)
+
+lock_engine = LockEngine(
+    storage,
+    USER_PRIORITY,
+    TAIWAN_TZ,
+    lease_seconds=LOCK_LEASE_SECONDS,
+    cache_seconds=LOCK_CACHE_SECONDS,
+    heartbeat_seconds=LOCK_HEARTBEAT_SECONDS,
+)
+
+register_mirror = RegisterMirror(
+    storage,
+    SHEET_HEADERS,
+    ttl=MIRROR_TTL_SECONDS,
+    verify_interval=MIRROR_VERIFY_SECONDS,
+)
+# 鏡像與以下所有寫入只針對目前的分片；舊資料依年度（或筆數）封存，需要時才讀（見 shards.py）
+shard_manager = ShardManager(
+    storage,
+    register_mirror,
+    WORKSHEET_NAME,
+    ARCHIVE_DIR,
+    mode=SHARD_BY,
+    max_rows=SHARD_MAX_ROWS,
+    tz=TAIWAN_TZ,
+    manifest_ttl=MIRROR_VERIFY_SECONDS,
+    chunk_rows=EXPORT_CHUNK_ROWS,
+)
+# 統計報表：鏡像的 Parquet 快照與向量化彙總（第一次使用時才讀快照）
+register_snapshot = RegisterSnapshot(register_mirror, ANALYTICS_SNAPSHOT_DIR, archive=shard_manager)
+
+@metrics.instrument("flush_rows")
+def flush_rows(rows):
+    # 每年第一次寫入（或筆數到達上限）前先封存目前的分片；封存失敗不影響這次寫入
     try:
-        ws_lock = sh.worksheet(LOCK_SHEET_NAME)
-    except gspread.exceptions.WorksheetNotFound:
-        ws_lock = sh.add_worksheet(title=LOCK_SHEET_NAME, rows=10, cols=2)
-        ws_lock.update("A1:B1", [["User", "Locked_Time"]])
-    return ws_lock
-
-def load_lock_df():
-    ws_lock = open_lock_ws()
-    data = ws_lock.get_all_records()
-    df_lock = pd.DataFrame(data)
-    if "User" not in df_lock.columns:
-        df_lock["User"] = ""
-    if "Locked_Time" not in df_lock.columns:
-        df_lock["Locked_Time"] = ""
-    return df_lock, ws_lock
-
-def acquire_lock(username: str) -> (bool, str):
-    df_lock, ws_lock = load_lock_df()
-    active = df_lock[df_lock["User"] != ""]
-    now = datetime.datetime.now(TAIWAN_TZ)   # ✅ 改成台灣時間
-
-    if active.empty:
-        ws_lock.append_row([username, now.strftime("%Y-%m-%d %H:%M:%S")])
-        return True, ""
-
-    current_user = active.iloc[0]["User"]
-    lock_time = datetime.datetime.strptime(
-    active.iloc[0]["Locked_Time"], "%Y-%m-%d %H:%M:%S"
-    ).replace(tzinfo=TAIWAN_TZ)
-
-    time_diff = (now - lock_time).total_seconds()
-
-    if current_user == username:
-        return True, ""
-
-    if time_diff <= 3:
-        current_pri = USER_PRIORITY.get(current_user, 99)
-        new_pri = USER_PRIORITY.get(username, 99)
-        if new_pri < current_pri:
-            ws_lock.update("A2:B2", [[username, now.strftime("%Y-%m-%d %H:%M:%S")]])
-            return True, ""
-        else:
-            return False, current_user
-    else:
-        return False, current_user
+        shard_manager.maybe_rollover()
+    except Exception as e:
+        logger.warning("shard rollover failed: %s", e)
+    storage.append_records(rows)
+    register_mirror.invalidate()
+
+@metrics.instrument("reconcile_submissions")
+def committed_submissions(tickets):
+    # 回傳已經在工作表上的 Submission_Id（寫入結果不明時用來避免重複寫入）；
+    # 目前的分片找不到時再查最近封存的分片（上一次寫入之後剛好封存）
+    found = set(storage.fetch_column("Submission_Id")) & set(tickets)
+    manifest = shard_manager.manifest()
+    if found != set(tickets) and manifest:
+        found |= set(shard_manager.column("Submission_Id", [manifest[-1]["Shard"]])) & set(tickets)
+    return found
+
+submit_journal = SubmitJournal(JOURNAL_PATH)
+
+def submission_known(ticket):
+    # 已經出現在鏡像中的 Submission_Id（其他程序寫入的也算）；送出時只查鏡像已知的資料，不為了檢查多讀一次工作表：
+    # 鏡像還沒載入過（程序剛啟動、分片剛封存）就不查，以免在按鈕處理中整張下載
+    if not register_mirror.loaded():
+        return False
+    return register_mirror.contains("Submission_Id", ticket, max_age=float("inf"))
+
+# 所有使用者共用同一個背景寫入佇列（模組只載入一次，重跑頁面不會重建）
+write_queue = WriteBehindQueue(
+    flush_rows,
+    batch_size=WRITE_BATCH_SIZE,
+    flush_interval=WRITE_FLUSH_SECONDS,
+    journal=submit_journal,
+    reconcile=committed_submissions,
+    replay_interval=REPLAY_SECONDS,
+    known=submission_known,
+)
+
+# ========== Lock 機制 ==========
+# Lock 以專案代碼（ODM/產品應用/散熱方式，即專案編號 "-" 前面的部分）為單位，不同代碼可以同時開案
+@metrics.instrument("acquire_lock")
+def acquire_lock(username: str, key: str) -> (bool, str):
+    return lock_engine.acquire(username, key)
+
+@metrics.instrument("release_lock")
+def release_lock(username: str, key: str):
+    lock_engine.release(username, key)
+
+@metrics.instrument("lock_heartbeat")
+def lock_heartbeat(username: str, key: str) -> (bool, str):
+    return lock_engine.heartbeat(username, key)
 
-def release_lock(username: str):
-    df_lock, ws_lock = load_lock_df()
-    for i, row in df_lock.iterrows():
-        if row["User"] == username:
-            ws_lock.update_cell(i + 2, 1, "")
-            ws_lock.update_cell(i + 2, 2, "")
+def record_lock_key(record):
+    return str(record.get("Project_Number", "")).rsplit("-", 1)[0]
 
 # ========== 登出 ==========
 def logout():
@@ -115,143 +271,280 @@ def logout():
     st.session_state["logged_in"] = False
 
 # ========== 專案編號產生 ==========
-def generate_project_number(odm, product_app, cooling):
-    def get_code(value):
-        text = str(value)
+def project_code(value):
+    text = str(value)
 
-        # 如果選擇「其他」或「Other」，不管實際輸入內容是什麼，專案代碼固定使用 00
-        if text.startswith("(00)") or "其他" in text or "Other" in text:
-            return "00"
+    # 如果選擇「其他」或「Other」，不管實際輸入內容是什麼，專案代碼固定使用 00
+    if text.startswith("(00)") or "其他" in text or "Other" in text:
+        return "00"
 
-        # 一般選項，例如 (01)仁寶、(01)NB CPU、(01)Air Cooling，取出括號內代碼
-        if ")" in text:
-            return text.split(")")[0].strip("(")
+    # 一般選項，例如 (01)仁寶、(01)NB CPU、(01)Air Cooling，取出括號內代碼
+    if ")" in text:
+        return text.split(")")[0].strip("(")
 
-        # 如果文字沒有括號格式，代表可能是「其他」欄位的自填內容，預設代碼固定使用 00
-        return "00"
+    # 如果文字沒有括號格式，代表可能是「其他」欄位的自填內容，預設代碼固定使用 00
+    return "00"
 
-    odm_code = get_code(odm)
-    prod_code = get_code(product_app)
-    cool_code = get_code(cooling)
-    prefix = f"{odm_code}{prod_code}{cool_code}"
+def project_prefix(odm, product_app, cooling):
+    return f"{project_code(odm)}{project_code(product_app)}{project_code(cooling)}"
 
-    # 總行數（包含標題列），扣掉 1 才是已經有的資料筆數
-    total_rows = len(sheet.get_all_values()) - 1  
+@metrics.instrument("generate_project_number")
+def generate_project_number(odm, product_app, cooling, seq=None):
+    prefix = project_prefix(odm, product_app, cooling)
 
-    # 下一筆流水號 = 資料筆數 + 1
-    new_seq = total_rows + 1  
+    # 下一筆流水號改由 Seq 工作表配發，不再下載整張表計算行數；seq 為已經領到的號碼時直接沿用
+    new_seq = seq or allocate_project_seq()
 
     return f"{prefix}-{new_seq:03d}"
 
+# SQLite 模式下把本機資料匯出到 Google Sheet（下游同步，python maintenance.py --sync-to-sheet）
+def export_local_to_google_sheet(batch_size=500):
+    if STORAGE_BACKEND != "sqlite":
+        return 0
+    remote = create_storage(
+        "gsheets", SHEET_HEADERS, client_factory=get_client,
+        sheet_name=SHEET_NAME, worksheet_name=WORKSHEET_NAME, tz=TAIWAN_TZ,
+    )
+    return sync_to_google_sheet(storage, remote, batch_size=batch_size)
+
+# ========== 流水號配發 ==========
+# 流水號由儲存後端配發（Google Sheet 為 Seq 工作表，SQLite 為 seq 資料表），
+# 這裡只負責程序內的區塊預領：SEQ_LEASE_SIZE > 1 時一次領一段號碼，用完再向後端領下一段
+_seq_lease = []
+_seq_mutex = threading.Lock()
+
+def migrate_project_seq(force=False):
+    # 依目前資料筆數設定起始流水號（第一次使用或需要重新對齊時執行）
+    with _seq_mutex:
+        _seq_lease.clear()
+        return storage.seed_seq(force=force)
+
+def allocate_project_seq():
+    owner = st.session_state.get("user", "")
+    with _seq_mutex:
+        if not _seq_lease:
+            _seq_lease.extend(storage.allocate_seq(max(SEQ_LEASE_SIZE, 1), owner))
+        return _seq_lease.pop(0)
+
 # ========== 儲存 Google Sheet ==========
-def save_to_google_sheet(record):
+# 資料列先寫進本機送出日誌，再交給背景佇列批次寫入，立即回傳 ticket（即 Submission_Id），
+# 可用 write_queue.status(ticket) 查詢是否已寫入。
+# 預覽頁送出時 Submission_Id 是冪等鍵（內容雜湊 + session nonce）：同一份內容重試幾次都只會寫入一筆
+def submission_key(record, nonce):
+    values = {k: v for k, v in record.items() if k not in ("Submission_Id", "Update_Time")}
+    return content_key(values, salt=nonce)[:32]
+
+def sheet_row(record, submission_id=None):
     record_for_sheet = record.copy()
+    record_for_sheet["Submission_Id"] = submission_id or uuid.uuid4().hex
     record_for_sheet["Project_Number"] = record.get("Project_Number", "")
-    record_for_sheet["Spec_Type"] = ", ".join(record.get("Spec_Type", {}).keys())
+    record_for_sheet["Spec_Type"] = serialize_sections(record.get("Spec_Type", {}))
+    record_for_sheet["Spec_Data"] = encode_spec(record.get("Spec_Type", {}))
     # 台灣時間
     record_for_sheet["Update_Time"] = datetime.datetime.now(TAIWAN_TZ).strftime("%Y/%m/%d %H:%M")
-    
-    row = [record_for_sheet.get(col, "") for col in SHEET_HEADERS]
-    sheet.append_row(row)
+
+    return [record_for_sheet.get(col, "") for col in SHEET_HEADERS]
+
+@metrics.instrument("save_to_google_sheet")
+def save_to_google_sheet(record, submission_id=None):
+    row = sheet_row(record, submission_id)
+    return write_queue.submit(row, ticket=row[SHEET_HEADERS.index("Submission_Id")])
 
 # ========== 匯出到 Excel 模板 ==========
-def export_to_template(record):
-    template_path = os.path.join(os.path.dirname(__file__), "Kipo_Project_Form.xlsx")
-    wb = load_workbook(template_path)
-    ws = wb.active
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Kipo_Project_Form.xlsx")
+# 模板輸出方式："xml"（直接改寫工作表 XML，預設）或 "openpyxl"（原本作法）
+TEMPLATE_ENGINE = str(get_config("TEMPLATE_ENGINE", "xml")).strip().lower()
 
+# 儲存格 -> 紀錄欄位
+TEMPLATE_CELL_MAP = {
     # A. 客戶資訊
-    ws["E5"] = record.get("Project_Number", "")
-    ws["B5"] = record.get("Sales_User", "")
-    ws["B7"] = record.get("ODM_Customers", "")
-    ws["E7"] = record.get("Brand_Customers", "")
-    ws["B8"] = record.get("Project_Name", "")
-    ws["E8"] = record.get("Proposal_Date", "")
-    ws["B9"] = record.get("Application_Purpose", "")
-
+    "E5": "Project_Number",
+    "B5": "Sales_User",
+    "B7": "ODM_Customers",
+    "E7": "Brand_Customers",
+    "B8": "Project_Name",
+    "E8": "Proposal_Date",
+    "B9": "Application_Purpose",
     # B. 開案資訊
-    ws["B11"] = record.get("Product_Application", "")
-    ws["E11"] = record.get("Cooling_Solution", "")
-    ws["E13"] = record.get("Delivery_Location", "")
-    ws["B12"] = record.get("Sample_Date", "")
-    ws["E12"] = record.get("Sample_Qty", "")
-    ws["B13"] = record.get("Demand_Qty", "")
-    ws["B14"] = record.get("Schedule SI", "")
-    ws["E14"] = record.get("Schedule PV", "")
-    ws["B15"] = record.get("Schedule MV", "")
-    ws["E15"] = record.get("Schedule MP", "")
-
-    # ====== C. 規格資訊 ======
-    spec_map = {
-        "Air Cooling氣冷": "A17",
-        "Fan風扇": "C17",
-        "Liquid Cooling水冷": "E17"
-    }
-
-    # 單位定義表（可自行擴充）
-    UNIT_MAP = {
-        "Air_Flow": "RPM/Voltage/CFM",
-        "Tcase_Max": "°C",
-        "Thermal_Resistance": "°C/W",
-        "Max_Power": "W",
-        "Chip_Length": "mm",
-        "Chip_Width": "mm",
-        "Chip_Height": "mm",
-        "Input_Voltage": "V",
-        "Input_Current": "A",
-        "Speed": "RPM",
-        "Noise": "dB",
-        "Sone": "sone",
-        "Weight": "g",
-        "Cable_Length": "mm",
-        "Length": "mm",
-        "Width": "mm",
-        "Height": "mm",
-        "Tj_Max": "°C",
-        "T_Inlet": "°C",
-        "Flow_Rate": "LPM",
-        "Impedance": "KPa",
-        "Max_Loading": "lbs"
-    }
+    "B11": "Product_Application",
+    "E11": "Cooling_Solution",
+    "E13": "Delivery_Location",
+    "B12": "Sample_Date",
+    "E12": "Sample_Qty",
+    "B13": "Demand_Qty",
+    "B14": "Schedule SI",
+    "E14": "Schedule PV",
+    "B15": "Schedule MV",
+    "E15": "Schedule MP",
+}
 
-    specs = record.get("Spec_Type", {})
-    if not isinstance(specs, dict):
-        specs = {}
-
-    for section, fields in specs.items():
-        if section in spec_map:
-            lines = [section, ""]
-
-            # Chip/Length/Width/Height 一律排最後
-            if section == "Air Cooling氣冷":
-                last_keys = ["Chip_Length", "Chip_Width", "Chip_Height"]
-            elif section == "Fan風扇":
-                last_keys = ["Length", "Width", "Height"]
-            elif section == "Liquid Cooling水冷":
-                last_keys = ["Chip_Length", "Chip_Width", "Chip_Height"]
-            else:
-                last_keys = []
+# ====== C. 規格資訊 ======
+# 方案 -> 儲存格、欄位順序與單位都定義在 spec_schema.py
+SPEC_CELL_MAP = {section.name: section.cell for section in SPEC_SECTIONS}
 
-            # 先列出一般欄位
-            for k, v in fields.items():
-                if k not in last_keys:
-                    unit = UNIT_MAP.get(k, "")
-                    unit_str = f" ({unit})" if unit else ""
-                    lines.append(f"{k}{unit_str}: {v}")
+TEMPLATE_CELLS = list(TEMPLATE_CELL_MAP) + list(SPEC_CELL_MAP.values())
 
-            # 再列出最後的尺寸類欄位
-            for k in last_keys:
-                if k in fields:
-                    unit = UNIT_MAP.get(k, "")
-                    unit_str = f" ({unit})" if unit else ""
-                    lines.append(f"{k}{unit_str}: {fields.get(k, '')}")
+def build_template_values(record):
+    values = {cell: record.get(key, "") for cell, key in TEMPLATE_CELL_MAP.items()}
+    for section, fields in ordered_sections(record.get("Spec_Type", {})):
+        values[section.cell] = section_text(section, fields)
+    return values
 
-            # 寫進對應的格子
-            ws[spec_map[section]] = "\n".join(lines)
+@metrics.instrument("export_to_template")
+def export_to_template(record):
+    values = build_template_values(record)
+    if TEMPLATE_ENGINE == "xml":
+        try:
+            return render_xml(TEMPLATE_PATH, TEMPLATE_CELLS, values)
+        except TemplateError as e:  # 模板結構不符時改用 openpyxl
+            logger.warning("xml template render failed, fallback to openpyxl: %s", e)
+    return render_openpyxl(TEMPLATE_PATH, values)
+
+# ========== Excel 快取 ==========
+# key 是模板內容（build_template_values）加上模板檔版本的雜湊，內容相同就不必重新產生
+excel_cache = ExcelCache(
+    max_bytes=int(EXCEL_CACHE_MB * 1024 * 1024),
+    ttl=EXCEL_CACHE_TTL_SECONDS,
+    spill_dir=EXCEL_CACHE_DIR or None,
+    max_disk_bytes=int(EXCEL_CACHE_DISK_MB * 1024 * 1024),
+)
 
-    output = io.BytesIO()
-    wb.save(output)
-    return output.getvalue()
+def _template_version():
+    try:
+        stat = os.stat(TEMPLATE_PATH)
+        return f"{stat.st_mtime_ns}:{stat.st_size}:{TEMPLATE_ENGINE}"
+    except OSError:
+        return TEMPLATE_ENGINE
+
+TEMPLATE_VERSION = _template_version()
+
+def excel_key(record):
+    return content_key(build_template_values(record), TEMPLATE_VERSION)
+
+def cached_excel(record, key=None):
+    # 回傳 (key, Excel bytes)；快取沒有（或已被淘汰）時才重新產生
+    key = key or excel_key(record)
+    return key, excel_cache.get_or_render(key, lambda: export_to_template(record))
+
+# ========== 送出流程：預先產生 Excel，寫入與釋放 Lock 同時進行 ==========
+_submit_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="submit")
+_prerender = {}  # excel key -> Future
+_prerender_mutex = threading.Lock()
+
+def prerender_excel(record):
+    # 預覽頁一打開就在背景產生 Excel，按下送出時通常已經在快取裡
+    key = excel_key(record)
+    with _prerender_mutex:
+        for done_key in [k for k, f in _prerender.items() if f.done()]:
+            del _prerender[done_key]  # 完成的結果已存進 excel_cache
+        if key not in _prerender and not excel_cache.has(key):
+            _prerender[key] = _submit_pool.submit(cached_excel, record, key)
+    return key
+
+def take_excel(record, key):
+    with _prerender_mutex:
+        future = _prerender.get(key)
+    if future is not None:
+        try:
+            return future.result()[1]
+        except Exception as e:  # 背景產生失敗時在這裡重新產生一次，錯誤交給呼叫端
+            logger.warning("prerender failed, retry in foreground: %s", e)
+    return cached_excel(record, key)[1]
+
+def submit_record(record, user, key=None, submission_id=None):
+    # 寫入（交給背景佇列）與釋放 Lock 同時進行，Excel 直接取預先產生的結果；
+    # 三段的錯誤分開回報，只有寫入成功（拿到 ticket）才算已送出。
+    # submission_id 相同的重試不會重複寫入（見 submission_key），失敗後可以立即再送
+    key = key or excel_key(record)
+    result = {"ticket": None, "excel_key": key, "save_error": None, "release_error": None,
+              "excel_error": None, "lock_holder": None}
+    lock_key = record_lock_key(record)
+    release = _submit_pool.submit(quota_scheduler.bind(release_lock), user, lock_key)
+    try:
+        result["ticket"] = save_to_google_sheet(record, submission_id)
+    except Exception as e:
+        result["save_error"] = e
+    if result["ticket"] is not None:
+        try:
+            take_excel(record, key)
+        except Exception as e:
+            result["excel_error"] = e
+    try:
+        release.result()
+    except Exception as e:
+        result["release_error"] = e
+
+    if result["ticket"] is None and result["release_error"] is None:
+        # 沒有寫入就不算送出：Lock 已經釋放，重新取得讓使用者可以直接再送出一次
+        try:
+            ok, holder = acquire_lock(user, lock_key)
+            result["lock_holder"] = None if ok else holder
+        except Exception as e:
+            result["lock_holder"] = f"（無法確認：{e}）"
+    return result
+
+# 工作表讀回的紀錄：Spec_Type 是方案名稱字串，由 Spec_Data 還原成完整規格
+def restore_record(record):
+    record = dict(record)
+    if not isinstance(record.get("Spec_Type"), dict):
+        record["Spec_Type"] = decode_spec(record.get("Spec_Data", ""))
+    return record
+
+# 批次匯出用的紀錄來源（本機鏡像，不必每次重新下載整張表）；
+# 另外讀取與 Update_Time 區間重疊的封存分片，沒有指定區間時讀全部
+def load_export_records(start=None, end=None):
+    shards = shard_manager.shards_between(parse_date(start), parse_date(end))
+    return ([restore_record(r) for r in shard_manager.records(shards)]
+            + [restore_record(r) for r in register_mirror.records()])
+
+# 完整註冊表：分段讀取、分段寫出（見 register_export.py）
+@metrics.instrument("export_register")
+def export_register(fmt, fileobj, source="mirror", chunk_rows=None, progress=None, archived=True):
+    # archived=True 時先依封存順序寫出所有封存分片，再寫目前的分片
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    shards = [s["Shard"] for s in shard_manager.manifest()] if archived else []
+    if source == "storage":
+        parts = [storage_chunks(storage, chunk_rows, shard=s) for s in shards] + [storage_chunks(storage, chunk_rows)]
+    else:
+        parts = [shard_manager.chunks(s, chunk_rows) for s in shards] + [mirror_chunks(register_mirror, chunk_rows)]
+    chunks = (rows for part in parts for rows in part)
+    return write_register(fmt, chunks, SHEET_HEADERS, fileobj, progress=progress)
+
+def register_download(fmt, source, archived=True):
+    # 下載按鈕按下時才執行：寫到匿名暫存檔（關閉後自動刪除），回傳檔案物件給 Streamlit
+    tmp = tempfile.TemporaryFile(prefix="project_register_")
+    export_register(fmt, tmp, source=source, archived=archived)
+    tmp.seek(0)
+    return tmp
+
+# 重新匯出：先做一次增量同步（最多一次讀取），再從鏡像找出該專案編號；找不到才依序查封存分片（由新到舊）
+@metrics.instrument("load_record")
+def load_record(project_number):
+    record = register_mirror.find("Project_Number", project_number, max_age=0)
+    if record is None:
+        record = shard_manager.find("Project_Number", project_number)
+    return restore_record(record) if record else None
+
+# ========== 批次開案 ==========
+# frame 為 bulk_import.validate 的結果：通過檢查的列一次領一段流水號、一次 append_rows 寫入，
+# 回傳 (每列結果 DataFrame, 已寫入的紀錄)
+@metrics.instrument("import_projects")
+def import_projects(frame, user):
+    frame = frame.copy()
+    frame["Project_Number"] = assign_numbers(frame, project_prefix, lambda count: storage.allocate_seq(count, user))
+    rows = [sheet_row(r) for r in to_records(frame, SHEET_HEADERS)]
+
+    status = frame[ERRORS].mask(frame[ERRORS].ne(""), "❌ " + frame[ERRORS])
+    records = []
+    if rows:
+        try:
+            flush_rows(rows)
+            status = status.mask(status.eq(""), "✅ 已匯入")
+            records = [restore_record(dict(zip(SHEET_HEADERS, row))) for row in rows]
+        except Exception as e:
+            status = status.mask(status.eq(""), f"❌ 寫入失敗：{e}")
+    results = frame[[ROW, "Project_Number", "Project_Name"]].assign(結果=status)
+    return results, records
 
 # ========== 頁面：登入 ==========
 def login_page():
@@ -263,29 +556,18 @@ def login_page():
         if username in USER_CREDENTIALS and USER_CREDENTIALS[username]["password"] == password:
             st.session_state["logged_in"] = True
             st.session_state["user"] = USER_CREDENTIALS[username]["name"]
+            quota_scheduler.set_user(st.session_state["user"])
 
-            # ✅ 登入後先檢查 Lock
-            df_lock, _ = load_lock_df()
-            active = df_lock[df_lock["User"] != ""]
-
-            if not active.empty:
-                current_user = active.iloc[0]["User"]
-
-                if current_user == st.session_state["user"]:
-                    # ✅ 自己持有 Lock → 取屬於自己的「最後一筆」紀錄進入預覽
-                    records = sheet.get_all_records()  # list[dict]
-                    user = st.session_state["user"]
-                    user_records = [r for r in records if str(r.get("Sales_User", "")).strip() == user]
+            # ✅ 登入後先檢查 Lock（只看自己持有的專案代碼，其他人的 Lock 不影響登入）
+            held = metrics.instrument("lock_holder")(lock_engine.held_by)(st.session_state["user"])
 
-                    if user_records:
-                        last = user_records[-1]
-                        if isinstance(last.get("Spec_Type"), str):
-                            last["Spec_Type"] = {}
+            if held:
+                # ✅ 自己持有 Lock → 取屬於自己的「最後一筆」紀錄進入預覽（由索引直接讀取該列）
+                last = metrics.instrument("get_last_record")(storage.get_last_record)(st.session_state["user"])
 
-                        st.session_state["record"] = last
-                        st.session_state["page"] = "preview"
-                    else:
-                        st.session_state["page"] = "form"
+                if last and record_lock_key(last) in held:
+                    st.session_state["record"] = restore_record(last)
+                    st.session_state["page"] = "preview"
                 else:
                     st.session_state["page"] = "form"
             else:
@@ -294,25 +576,33 @@ def login_page():
             st.error("帳號或密碼錯誤，請重新輸入")
 
 # ========== 頁面：A. 客戶資訊 ==========
-def render_customer_info():
-    st.write(f"### 北辦業務：{st.session_state.get('user','')}")
-    st.header("A. 客戶資訊")
-
-    odm_selected = st.selectbox("ODM客戶", ["(AT)智邦", "(AB)大訊", "(AS)華碩", "(CP)仁寶", "(CS)思科", "(DL)戴爾", "(FX)富士康", "(GA)技鋼", "(GL)谷歌", "(HQ)華勤", "(HP)惠普", "(IV)英業達", "(IT)英特爾", "(LO)光寶", "(MS)微星", "(NV)輝達", "(PT)和碩", "(QT)廣達", "(SM)美超微", "(SL)索立迪姆", "(WT)緯創", "(GI)全球儀器", "(LH)倫宏", "(MC)美立堅", "(00)其他"], key="odm")
+# controls：下拉選單／勾選等會改變畫面的欄位，變更後立即重跑
+# fields：純輸入欄位；批次模式下是 st.form，按「✅ 完成」才一起送出
+# 批次模式下 controls 是表單上方的選項區，每個區塊的選項前面標出區塊名稱（與下方表單的標題對應）
+def section_label(controls, fields, title):
+    if controls is not fields:
+        controls.markdown(f"**{title}**")
+
+def render_customer_info(controls=st, fields=st):
+    controls.write(f"### 北辦業務：{st.session_state.get('user','')}")
+    section_label(controls, fields, "A. 客戶資訊")
+    fields.header("A. 客戶資訊")
+
+    odm_selected = controls.selectbox("ODM客戶", ["(AT)智邦", "(AB)大訊", "(AS)華碩", "(CP)仁寶", "(CS)思科", "(DL)戴爾", "(FX)富士康", "(GA)技鋼", "(GL)谷歌", "(HQ)華勤", "(HP)惠普", "(IV)英業達", "(IT)英特爾", "(LO)光寶", "(MS)微星", "(NV)輝達", "(PT)和碩", "(QT)廣達", "(SM)美超微", "(SL)索立迪姆", "(WT)緯創", "(GI)全球儀器", "(LH)倫宏", "(MC)美立堅", "(00)其他"], key="odm")
     odm = odm_selected
     if odm_selected == "(00)其他":
-        odm = st.text_input("請輸入ODM客戶", key="odm_other")
+        odm = fields.text_input("請輸入ODM客戶", key="odm_other")
 
-    brand = st.selectbox("品牌客戶", ["(AT)智邦", "(AB)大訊", "(AS)華碩", "(CP)仁寶", "(CS)思科", "(DL)戴爾", "(FX)富士康", "(GA)技鋼", "(GL)谷歌", "(HQ)華勤", "(HP)惠普", "(IV)英業達", "(IT)英特爾", "(LO)光寶", "(MS)微星", "(NV)輝達", "(PT)和碩", "(QT)廣達", "(SM)美超微", "(SL)索立迪姆", "(WT)緯創", "(GI)全球儀器", "(LH)倫宏", "(MC)美立堅", "(00)其他"], key="brand")
+    brand = controls.selectbox("品牌客戶", ["(AT)智邦", "(AB)大訊", "(AS)華碩", "(CP)仁寶", "(CS)思科", "(DL)戴爾", "(FX)富士康", "(GA)技鋼", "(GL)谷歌", "(HQ)華勤", "(HP)惠普", "(IV)英業達", "(IT)英特爾", "(LO)光寶", "(MS)微星", "(NV)輝達", "(PT)和碩", "(QT)廣達", "(SM)美超微", "(SL)索立迪姆", "(WT)緯創", "(GI)全球儀器", "(LH)倫宏", "(MC)美立堅", "(00)其他"], key="brand")
     if brand == "(00)其他":
-        brand = st.text_input("請輸入品牌客戶", key="brand_other")
+        brand = fields.text_input("請輸入品牌客戶", key="brand_other")
 
-    purpose = st.selectbox("申請目的", ["(01)客戶專案開發", "(02)內部新產品開發", "(03)技術平台預研", "(00)其他"], key="purpose")
+    purpose = controls.selectbox("申請目的", ["(01)客戶專案開發", "(02)內部新產品開發", "(03)技術平台預研", "(00)其他"], key="purpose")
     if purpose == "(00)其他":
-        purpose = st.text_input("請輸入申請目的", key="purpose_other")
+        purpose = fields.text_input("請輸入申請目的", key="purpose_other")
 
-    project_name = st.text_input("客戶專案名稱", key="project_name")
-    proposal_date = st.date_input("客戶提案日期", value=datetime.date.today(), key="proposal_date")
+    project_name = fields.text_input("客戶專案名稱", key="project_name")
+    proposal_date = fields.date_input("客戶提案日期", value=datetime.date.today(), key="proposal_date")
 
     return {
         "Sales_User": st.session_state["user"],
@@ -326,27 +616,28 @@ def render_customer_info():
 
 
 # ========== 頁面：B. 開案資訊 ==========
-def render_project_info():
-    st.header("B. 開案資訊")
+def render_project_info(controls=st, fields=st):
+    section_label(controls, fields, "B. 開案資訊")
+    fields.header("B. 開案資訊")
 
-    product_app_selected = st.selectbox("產品應用", ["(NB)Notebook", "(SV)Sever", "(AM)Automotive(Car)", "(MI)Minibox", "(NW)Network", "(00)Other"], key="product_app")
+    product_app_selected = controls.selectbox("產品應用", ["(NB)Notebook", "(SV)Sever", "(AM)Automotive(Car)", "(MI)Minibox", "(NW)Network", "(00)Other"], key="product_app")
     product_app = product_app_selected
     if product_app_selected == "(00)Other":
-        product_app = st.text_input("請輸入產品應用", key="product_app_other")
+        product_app = fields.text_input("請輸入產品應用", key="product_app_other")
 
-    cooling = st.selectbox("散熱方式", ["(NC)Natural Convection", "(AC)Air Cooling", "(LA)Liquid to Air", "(LL)Liquid to Liquid", "(00)Other"], key="cooling")
+    cooling = controls.selectbox("散熱方式", ["(NC)Natural Convection", "(AC)Air Cooling", "(LA)Liquid to Air", "(LL)Liquid to Liquid", "(00)Other"], key="cooling")
     if cooling == "(00)Other":
-        cooling = st.text_input("請輸入散熱方式", key="cooling_other")
+        cooling = fields.text_input("請輸入散熱方式", key="cooling_other")
 
-    delivery = st.selectbox("交貨地點", ["(01)Taiwan", "(02)China", "(03)Thailand", "(04)Vietnam", "(00)Other"], key="delivery")
+    delivery = controls.selectbox("交貨地點", ["(01)Taiwan", "(02)China", "(03)Thailand", "(04)Vietnam", "(00)Other"], key="delivery")
     if delivery == "(00)Other":
-        delivery = st.text_input("請輸入交貨地點", key="delivery_other")
+        delivery = fields.text_input("請輸入交貨地點", key="delivery_other")
 
-    sample_date = st.date_input("樣品需求日期", value=datetime.date.today(), key="sample_date")
-    sample_qty = st.text_input("樣品需求數量", key="sample_qty")
-    demand_qty = st.text_input("需求量 (預估數量/總年數)", key="demand_qty")
+    sample_date = fields.date_input("樣品需求日期", value=datetime.date.today(), key="sample_date")
+    sample_qty = fields.text_input("樣品需求數量", key="sample_qty")
+    demand_qty = fields.text_input("需求量 (預估數量/總年數)", key="demand_qty")
 
-    col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4 = fields.columns(4)
     si = col1.text_input("Schedule SI", key="si")
     pv = col2.text_input("Schedule PV", key="pv")
     mv = col3.text_input("Schedule MV", key="mv")
@@ -367,60 +658,17 @@ def render_project_info():
     }
 
 # ========== 頁面：C. 規格資訊 ==========
-def render_spec_info():
-    st.header("C. 規格資訊")
-    spec_options = st.multiselect("選擇散熱方案", ["Air Cooling氣冷", "Fan風扇", "Liquid Cooling水冷"], key="spec_options")
+def render_spec_info(controls=st, fields=st):
+    section_label(controls, fields, "C. 規格資訊")
+    fields.header("C. 規格資訊")
+    spec_options = controls.multiselect("選擇散熱方案", list(SPEC_SECTION_NAMES), key="spec_options")
     spec_data = {}
 
-    if "Air Cooling氣冷" in spec_options:
-        st.subheader("Air Cooling氣冷")
-        spec_data["Air Cooling氣冷"] = {
-            "Air_Flow": st.text_input("Air Flow (RPM/Voltage/CFM)", key="air_flow"),
-            "Tcase_Max": st.text_input("Tcase_Max (°C)", key="air_tcase"),
-            "Thermal_Resistance": st.text_input("Thermal Resistance (°C/W)", key="air_res"),
-            "Max_Power": st.text_input("Max Power (W)", key="air_power"),
-            "Chip_Length": st.text_input("Chip_Length (mm)", key="air_len"),
-            "Chip_Width": st.text_input("Chip_Width (mm)", key="air_wid"),
-            "Chip_Height": st.text_input("Chip_Height (mm)", key="air_hei"),
-        }
-
-    if "Fan風扇" in spec_options:
-        st.subheader("Fan風扇")
-        spec_data["Fan風扇"] = {
-            "Max_Power": st.text_input("Max Power (W)", key="fan_power"),
-            "Input_Voltage": st.text_input("Input voltage (V)", key="fan_volt"),
-            "Input_Current": st.text_input("Input current (A)", key="fan_curr"),
-            "PQ": st.text_input("P-Q", key="fan_pq"),
-            "Speed": st.text_input("Rotational speed (RPM)", key="fan_speed"),
-            "Noise": st.text_input("Noise (dB)", key="fan_noise"),
-            "Tone": st.text_input("Tone", key="fan_tone"),
-            "Sone": st.text_input("Sone", key="fan_sone"),
-            "Weight": st.text_input("Weight (g)", key="fan_weight"),
-            "Connector": st.text_input("端子頭型號", key="fan_con"),
-            "Wiring": st.text_input("線序", key="fan_wire"),
-            "Cable_Length": st.text_input("出框線長", key="fan_cable"),
-            "Length": st.text_input("Length (mm)", key="fan_len"),
-            "Width": st.text_input("Width (mm)", key="fan_wid"),
-            "Height": st.text_input("Height (mm)", key="fan_hei"),
-        }
-
-    if "Liquid Cooling水冷" in spec_options:
-        st.subheader("Liquid Cooling水冷")
-        spec_data["Liquid Cooling水冷"] = {
-            "Plate_Form": st.text_input("Plate Form", key="liq_plate"),
-            "Max_Power": st.text_input("Max Power (W)", key="liq_max_power"),
-            "Tj_Max": st.text_input("Tj_Max (°C)", key="liq_tj"),
-            "Tcase_Max": st.text_input("Tcase_Max (°C)", key="liq_tcase"),
-            "T_Inlet": st.text_input("T_Inlet (°C)", key="liq_inlet"),
-            "Thermal_Resistance": st.text_input("Thermal Resistance (°C/W)", key="liq_res"),
-            "Flow_Rate": st.text_input("Flow rate (LPM)", key="liq_flow"),
-            "Impedance": st.text_input("Impedance (KPa)", key="liq_imp"),
-            "Max_Loading": st.text_input("Max loading (lbs)", key="liq_load"),
-            "Chip_Length": st.text_input("Chip_Length (mm)", key="liq_chip_length"),
-            "Chip_Width": st.text_input("Chip_Width (mm)", key="liq_chip_width"),
-            "Chip_Height": st.text_input("Chip_Height (mm)", key="liq_chip_height"),
-        }
-    
+    for section in SPEC_SECTIONS:
+        if section.name in spec_options:
+            fields.subheader(section.name)
+            spec_data[section.name] = {f.key: fields.text_input(f.label, key=f.widget_key) for f in section.fields}
+
     return spec_data
 
 # ========== 頁面：表單 ==========
@@ -432,15 +680,43 @@ def form_page():
     st.title("💻 Kipo專案申請系統")
     if st.button("🚪 登出"): 
         logout()
-
-    customer_info = render_customer_info()
-    project_info = render_project_info()
-    spec_info = render_spec_info()
-
-    if st.button("✅ 完成"):
-        lock_acquired, holder = acquire_lock(st.session_state["user"])
+    if st.button("📥 批次開案"):
+        st.session_state["page"] = "bulk_import"
+        st.rerun()
+    if is_admin() and st.button("📦 批次匯出"):
+        st.session_state["page"] = "bulk_export"
+        st.rerun()
+    if is_admin() and st.button("📈 統計報表"):
+        st.session_state["page"] = "analytics"
+        st.rerun()
+    render_reexport()
+
+    if FORM_MODE == "live":
+        customer_info = render_customer_info()
+        project_info = render_project_info()
+        spec_info = render_spec_info()
+        done = st.button("✅ 完成")
+    else:
+        # 版面與逐欄重跑模式（live）不同：下拉選單與規格勾選集中在表單上方的選項區（依 A/B/C 分組標示），
+        # 文字與日期欄位在下方的 st.form 內依區塊排列。原因是 st.form 內的 widget 在送出前不會重跑，
+        # 選到「(00)其他」或勾選方案時就無法立即顯示對應欄位；而一個表單在畫面上是連續的一塊、只有一個送出按鈕，
+        # 選項無法插回各區塊標題底下。打字不會重跑，按「✅ 完成」時一次送出。需要原本版面時設 FORM_MODE=live
+        controls = st.container(border=True)
+        with st.form("project_form", border=False, enter_to_submit=False):
+            customer_info = render_customer_info(controls, st)
+            project_info = render_project_info(controls, st)
+            spec_info = render_spec_info(controls, st)
+            done = st.form_submit_button("✅ 完成")
+
+    if done:
+        lock_key = project_prefix(
+            customer_info.get("ODM_Code_Source", customer_info["ODM_Customers"]),
+            project_info.get("Product_Application_Code_Source", project_info["Product_Application"]),
+            project_info["Cooling_Solution"],
+        )
+        lock_acquired, holder = acquire_lock(st.session_state["user"], lock_key)
         if not lock_acquired:
-            st.warning(f"目前由 {holder} 使用中，請稍後")
+            st.warning(f"專案代碼 {lock_key} 目前由 {holder} 使用中，請稍後")
             st.warning("當鎖定問題無法透過正常流程解除時，請尋求PM協助處理")
             return
 
@@ -459,11 +735,14 @@ def form_page():
             elif not spec_info:
                 st.error("規格資訊請至少選擇一種方案")
             else:
+                # 同一份草稿（返回修改後再按完成）沿用已經領到的流水號，送出後才清除，避免跳號
                 project_number = generate_project_number(
                     customer_info.get("ODM_Code_Source", customer_info["ODM_Customers"]),
                     project_info.get("Product_Application_Code_Source", project_info["Product_Application"]),
                     project_info["Cooling_Solution"],
+                    st.session_state.get("project_seq"),
                 )
+                st.session_state["project_seq"] = int(project_number.rsplit("-", 1)[1])
                 st.session_state["record"] = {
                     "Project_Number": project_number,
                     **customer_info,
@@ -510,99 +789,458 @@ def preview_page():
         st.write(f"**{v}：** {value}")
 
     st.subheader("C. 規格資訊")
-    DISPLAY_NAMES = {
-        "Air_Flow": "Air Flow (RPM/Voltage/CFM)",
-        "Tcase_Max": "Tcase_Max (°C)",
-        "Thermal_Resistance": "Thermal Resistance (°C/W)",
-        "Max_Power": "Max Power (W)",
-        "Chip_Length": "Chip_Length (mm)",
-        "Chip_Width": "Chip_Width (mm)",
-        "Chip_Height": "Chip_Height (mm)",
-        "Input_Voltage": "Input voltage (V)",
-        "Input_Current": "Input current (A)",
-        "PQ": "P-Q",
-        "Speed": "Rotational speed (RPM)",
-        "Noise": "Noise (dB)",
-        "Tone": "Tone",
-        "Sone": "Sone",
-        "Weight": "Weight (g)",
-        "Connector": "端子頭型號",
-        "Wiring": "線序",
-        "Cable_Length": "出框線長",
-        "Length": "Length (mm)",
-        "Width": "Width (mm)",
-        "Height": "Height (mm)",
-        "Plate_Form": "Plate Form",
-        "Tj_Max": "Tj_Max (°C)",
-        "T_Inlet": "T_Inlet (°C)",
-        "Flow_Rate": "Flow rate (LPM)",
-        "Impedance": "Impedance (KPa)",
-        "Max_Loading": "Max loading (lbs)"
-    }
+    for section, fields in ordered_sections(record.get("Spec_Type", {})):
+        st.markdown(f"**{section.name}**")
+        for f in section.fields:
+            value = str(fields.get(f.key, "")) if fields.get(f.key, "") not in [None, ""] else ""
+            st.write(f"{f.label}: {value}")
 
-    for section, fields in record.get("Spec_Type", {}).items():
-        st.markdown(f"**{section}**")
-        for k, label in DISPLAY_NAMES.items():
-            value = str(fields.get(k, "")) if fields.get(k, "") not in [None, ""] else ""
-            st.write(f"{label}: {value}")
+    if not st.session_state.get("submitted"):
+        st.session_state["preview_excel_key"] = prerender_excel(record)
 
     col1, col2 = st.columns(2)
     if col1.button("🔙 返回修改"):
-        release_lock(st.session_state["user"])
+        release_lock(st.session_state["user"], record_lock_key(record))
         st.session_state["page"] = "form"
 
-        # 初始化冷卻計時器
-    if "last_submit_time" not in st.session_state:
-        st.session_state["last_submit_time"] = 0
     if "submitted" not in st.session_state:
         st.session_state["submitted"] = False
-
-    now_ts = time.time()
-    cooldown = 5  # 冷卻 5 秒
+    # 冪等鍵的 nonce：每個 session 一個，同一份內容重送（連點、失敗重試）得到同一個 Submission_Id
+    if "submit_nonce" not in st.session_state:
+        st.session_state["submit_nonce"] = uuid.uuid4().hex
 
     # ✅ 防重複送出
     if col2.button("💾 確認送出", key="confirm_submit", disabled=st.session_state["submitted"]):
         if st.session_state["submitted"]:
             st.warning("⚠️ 已經送出過了，請勿重複提交")
-        elif now_ts - st.session_state["last_submit_time"] < cooldown:
-            st.warning("⏳ 請稍候再送出，避免重複紀錄")
         else:
-            save_to_google_sheet(record)
-            excel_data = export_to_template(record)
-            release_lock(st.session_state["user"])
-
-            # 固定專案資料與檔名
-            TAIWAN_TZ = pytz.timezone("Asia/Taipei")
-            apply_date = datetime.datetime.now(TAIWAN_TZ).strftime("%Y%m%d")
-            st.session_state["excel_data"] = excel_data
-            st.session_state["fixed_record"] = record.copy()
-            st.session_state["fixed_filename"] = f"ProjectForm_{record.get('Project_Number','')}_{apply_date}.xlsx"
-
-            st.session_state["submitted"] = True
-            st.session_state["last_submit_time"] = now_ts
-            st.success("✅ 已準備好下載Excel檔案")
-
-    # ✅ 後續下載都用第一次固定的 excel_data & 檔名
-    if "excel_data" in st.session_state:
+            result = submit_record(record, st.session_state["user"], st.session_state.get("preview_excel_key"),
+                                   submission_key(record, st.session_state["submit_nonce"]))
+
+            if result["ticket"] is None:
+                # 寫入失敗：維持未送出狀態，可以直接再按一次
+                st.error(f"❌ 送出失敗，請再試一次：{result['save_error']}")
+                if result["lock_holder"]:
+                    st.warning(f"Lock 目前由 {result['lock_holder']} 使用中，請返回修改後重新送出")
+            else:
+                # 固定專案資料與檔名
+                TAIWAN_TZ = pytz.timezone("Asia/Taipei")
+                apply_date = datetime.datetime.now(TAIWAN_TZ).strftime("%Y%m%d")
+                st.session_state["excel_key"] = result["excel_key"]
+                st.session_state["fixed_record"] = record.copy()
+                st.session_state["fixed_filename"] = f"ProjectForm_{record.get('Project_Number','')}_{apply_date}.xlsx"
+                st.session_state["submit_ticket"] = result["ticket"]
+                st.session_state["submitted"] = True
+                st.session_state.pop("project_seq", None)
+
+                if result["release_error"] is not None:
+                    st.warning(f"⚠️ 釋放 Lock 失敗（{result['release_error']}），租期到期後會自動失效")
+                if result["excel_error"] is not None:
+                    st.error(f"❌ Excel 產生失敗：{result['excel_error']}")
+                else:
+                    st.success("✅ 已準備好下載Excel檔案")
+
+    if st.session_state.get("submit_ticket"):
+        render_submit_status()
+    elif not st.session_state.get("submitted") and st.session_state.get("page") == "preview":
+        render_lock_heartbeat()
+
+    # ✅ 後續下載都用第一次固定的紀錄 & 檔名，檔案內容由共用快取取出
+    if "excel_key" in st.session_state:
+        try:
+            _, excel_data = cached_excel(st.session_state["fixed_record"], st.session_state["excel_key"])
+        except Exception as e:
+            st.error(f"❌ Excel 產生失敗：{e}")
+            return
         st.download_button(
             label="⬇️ 自動下載Excel檔案",
-            data=st.session_state["excel_data"],
+            data=excel_data,
             file_name=st.session_state.get("fixed_filename", "ProjectForm.xlsx"),
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 
+# ========== 頁面：批次匯出 ==========
+def bulk_export_page():
+    if not st.session_state.get("logged_in", False) or not is_admin():
+        st.session_state["page"] = "login" if not st.session_state.get("logged_in", False) else "form"
+        return
+
+    st.title("📦 批次匯出專案申請表")
+    if st.button("🔙 返回表單"):
+        st.session_state["page"] = "form"
+        st.rerun()
+
+    today = datetime.date.today()
+    date_range = st.date_input("送出日期區間", value=(today.replace(day=1), today), key="bulk_dates")
+    start, end = (list(date_range) + [None, None])[:2] if isinstance(date_range, (list, tuple)) else (date_range, date_range)
+    records = load_export_records(start, end or start)
+    sales = st.multiselect("北辦業務", sorted({str(r.get("Sales_User", "")) for r in records} - {""}), key="bulk_sales")
+    odms = st.multiselect("ODM客戶", sorted({str(r.get("ODM_Customers", "")) for r in records} - {""}), key="bulk_odm")
+
+    selected = list(filter_records(records, start, end, sales, odms))
+    st.write(f"符合條件：{len(selected)} 筆")
+    age = register_mirror.meta()["age_seconds"] or 0
+    st.caption(f"資料更新於 {int(age)} 秒前")
+
+    if st.button("📦 產生 zip", disabled=not selected):
+        old_path = st.session_state.pop("bulk_zip_path", None)
+        if old_path and os.path.exists(old_path):
+            os.remove(old_path)
+
+        # 先寫到暫存檔，產生過程中每個 Excel 完成就寫入，不會整批留在記憶體
+        progress = st.progress(0.0)
+        with tempfile.NamedTemporaryFile(prefix="project_forms_", suffix=".zip", delete=False) as tmp:
+            write_zip(selected, tmp, progress=lambda n: progress.progress(n / len(selected)))
+        st.session_state["bulk_zip_path"] = tmp.name
+        st.session_state["bulk_zip_name"] = f"ProjectForms_{start:%Y%m%d}_{(end or start):%Y%m%d}.zip"
+        st.success(f"✅ 已產生 {len(selected)} 份 Excel")
+
+    zip_path = st.session_state.get("bulk_zip_path")
+    if zip_path and os.path.exists(zip_path):
+        with open(zip_path, "rb") as f:
+            st.download_button(
+                label="⬇️ 下載 zip",
+                data=f,
+                file_name=st.session_state.get("bulk_zip_name", "ProjectForms.zip"),
+                mime="application/zip"
+            )
+
+    st.divider()
+    st.subheader("📋 匯出完整註冊表")
+    fmt = st.radio("格式", list(FORMATS), horizontal=True, key="register_format",
+                   format_func={"xlsx": "Excel", "csv": "CSV", "parquet": "Parquet"}.get)
+    latest = st.checkbox(f"直接讀取 Google Sheet（最新資料，每 {EXPORT_CHUNK_ROWS} 筆一次讀取）", key="register_latest")
+    manifest = shard_manager.manifest()
+    archived = st.checkbox(f"包含已封存的分片（{len(manifest)} 個，"
+                           f"{sum(int(s['Rows'] or 0) for s in manifest)} 筆）", value=True, key="register_archived",
+                           disabled=not manifest)
+    st.caption(f"目前分片 {register_mirror.meta()['rows']} 筆；按下後才開始產生檔案")
+    # 傳入函式：按下按鈕才產生（一般重跑不會重做），並帶著目前使用者的 API 配額順位
+    st.download_button(
+        label="⬇️ 下載註冊表",
+        data=quota_scheduler.bind(functools.partial(register_download, fmt, "storage" if latest else "mirror",
+                                                    archived)),
+        file_name=register_filename(fmt, datetime.datetime.now(TAIWAN_TZ)),
+        mime=FORMATS[fmt][1],
+        key="register_download"
+    )
+
+# ========== 頁面：批次開案 ==========
+def bulk_import_page():
+    if not st.session_state.get("logged_in", False):
+        st.session_state["page"] = "login"
+        return
+
+    st.title("📥 批次開案")
+    if st.button("🔙 返回表單"):
+        st.session_state["page"] = "form"
+        st.rerun()
+
+    st.download_button("⬇️ 下載匯入範本（CSV）", data=template_csv(SHEET_HEADERS), file_name="ProjectImport.csv",
+                       mime="text/csv")
+    upload = st.file_uploader("上傳 CSV / Excel（欄位順序同 Google Sheet，專案編號留空）", type=["csv", "xlsx"],
+                              key="import_file")
+    if upload is None:
+        return
+
+    # 同一份檔案只解析與檢查一次
+    data = upload.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    if st.session_state.get("import_checked", (None,))[0] != digest:
+        try:
+            frame = validate(read_upload(data, upload.name, SHEET_HEADERS), st.session_state["user"],
+                             allow_other_users=is_admin())
+        except Exception as e:
+            st.error(f"❌ 無法讀取檔案：{e}")
+            return
+        st.session_state["import_checked"] = (digest, frame)
+    frame = st.session_state["import_checked"][1]
+
+    valid = int(frame[ERRORS].eq("").sum())
+    st.write(f"共 {len(frame)} 筆，可匯入 {valid} 筆，錯誤 {len(frame) - valid} 筆")
+    if valid < len(frame):
+        st.dataframe(frame.loc[frame[ERRORS].ne(""), [ROW, "Project_Name", ERRORS]], hide_index=True)
+
+    with_zip = st.checkbox("同時產生 Excel 申請表（zip）", key="import_with_zip")
+    imported = st.session_state.get("import_digest") == digest
+    if st.button(f"📥 匯入 {valid} 筆", disabled=not valid or imported):
+        # 依序取得所有用到的專案代碼的 Lock，任何一個拿不到就全部放掉
+        user = st.session_state["user"]
+        ok_rows = frame[frame[ERRORS].eq("")]
+        keys = sorted({project_prefix(*k) for k in zip(ok_rows["ODM_Customers"], ok_rows["Product_Application"],
+                                                        ok_rows["Cooling_Solution"])})
+        locked = []
+        for key in keys:
+            lock_acquired, holder = acquire_lock(user, key)
+            if not lock_acquired:
+                for k in locked:
+                    release_lock(user, k)
+                st.warning(f"專案代碼 {key} 目前由 {holder} 使用中，請稍後")
+                return
+            locked.append(key)
+        try:
+            results, records = import_projects(frame, user)
+        finally:
+            for key in locked:
+                release_lock(user, key)
+        st.session_state["import_digest"] = digest
+        st.session_state["import_results"] = results
+
+        old_path = st.session_state.pop("import_zip_path", None)
+        if old_path and os.path.exists(old_path):
+            os.remove(old_path)
+        if with_zip and records:
+            progress = st.progress(0.0)
+            with tempfile.NamedTemporaryFile(prefix="project_import_", suffix=".zip", delete=False) as tmp:
+                write_zip(records, tmp, progress=lambda n: progress.progress(n / len(records)))
+            st.session_state["import_zip_path"] = tmp.name
+        imported = True
+
+    if imported and "import_results" in st.session_state:
+        results = st.session_state["import_results"]
+        done = int(results["結果"].eq("✅ 已匯入").sum())
+        (st.success if done else st.error)(f"已匯入 {done} 筆")
+        st.dataframe(results, hide_index=True)
+        st.download_button("⬇️ 下載結果（CSV）", data=results.to_csv(index=False).encode("utf-8-sig"),
+                           file_name="ProjectImport_result.csv", mime="text/csv")
+        zip_path = st.session_state.get("import_zip_path")
+        if zip_path and os.path.exists(zip_path):
+            with open(zip_path, "rb") as f:
+                st.download_button("⬇️ 下載 Excel（zip）", data=f, file_name="ProjectForms_import.zip",
+                                   mime="application/zip")
+
+# ========== 頁面：統計報表 ==========
+def analytics_page():
+    if not st.session_state.get("logged_in", False) or not is_admin():
+        st.session_state["page"] = "login" if not st.session_state.get("logged_in", False) else "form"
+        return
+
+    st.title("📈 專案統計報表")
+    if st.button("🔙 返回表單"):
+        st.session_state["page"] = "form"
+        st.rerun()
+
+    first, last = register_snapshot.date_range()
+    today = datetime.date.today()
+    date_range = st.date_input("送出日期區間", value=(first or today, last or today), key="analytics_dates")
+    start, end = (list(date_range) + [None, None])[:2] if isinstance(date_range, (list, tuple)) else (date_range, date_range)
+
+    filters = {}
+    with st.expander("篩選條件"):
+        for col in DIMENSIONS[:-1]:
+            filters[col] = st.multiselect(DIMENSION_LABELS[col], register_snapshot.options(col), key=f"analytics_{col}")
+    group_by = st.multiselect("分組欄位（最多兩個）", DIMENSIONS, default=["ODM_Customers"], max_selections=2,
+                              format_func=DIMENSION_LABELS.get, key="analytics_group_by")
+    if not group_by:
+        st.info("請選擇分組欄位")
+        return
+
+    t = time.perf_counter()
+    result = register_snapshot.counts(group_by, filters, start, end)
+    elapsed_ms = (time.perf_counter() - t) * 1000
+
+    st.metric("專案數", int(result["Count"].sum()))
+    if len(group_by) == 1:
+        st.bar_chart(result, x=group_by[0], y="Count")
+        st.dataframe(result.rename(columns=DIMENSION_LABELS), hide_index=True)
+    else:
+        pivot = result.pivot_table(index=group_by[0], columns=group_by[1], values="Count",
+                                   fill_value=0, observed=True, aggfunc="sum")
+        pivot.index, pivot.columns = pivot.index.astype(str), pivot.columns.astype(str)  # category 索引轉成一般字串再顯示
+        st.dataframe(pivot.rename_axis(index=DIMENSION_LABELS[group_by[0]], columns=DIMENSION_LABELS[group_by[1]]))
+    st.download_button("⬇️ 下載 CSV", data=result.to_csv(index=False).encode("utf-8-sig"),
+                       file_name="project_counts.csv", mime="text/csv", key="analytics_csv")
+
+    meta = register_snapshot.meta()
+    age = register_mirror.meta()["age_seconds"] or 0
+    st.caption(f"目前分片 {meta['rows']} 筆（已載入封存分片 {meta['archived_shards_loaded']} 個），資料更新於 {int(age)} 秒前，"
+               f"快照 {meta['parts']} 個檔案；查詢 {elapsed_ms:.1f} ms")
+
+# ========== 重新匯出已送出的申請表 ==========
+def render_reexport():
+    with st.expander("🔁 重新匯出已送出的申請表"):
+        number = st.text_input("專案編號", key="reexport_number").strip()
+        if st.button("🔁 重新匯出", key="reexport", disabled=not number):
+            record = load_record(number)
+            if not record:
+                st.session_state.pop("reexport_record", None)
+                st.error(f"找不到專案編號 {number}")
+            elif not is_admin() and str(record.get("Sales_User", "")).strip() != st.session_state.get("user"):
+                st.session_state.pop("reexport_record", None)
+                st.error("只能重新匯出自己送出的申請表")
+            else:
+                st.session_state["reexport_record"] = record
+                st.session_state["reexport_name"] = export_filename(record)
+
+        if "reexport_record" in st.session_state:
+            _, excel_data = cached_excel(st.session_state["reexport_record"])
+            st.download_button(
+                label="⬇️ 下載Excel檔案",
+                data=excel_data,
+                file_name=st.session_state.get("reexport_name", "ProjectForm.xlsx"),
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key="reexport_download"
+            )
+
+# ========== 管理者側邊欄：API 監控 ==========
+def render_metrics_panel():
+    session = metrics.context()["session"]
+    with st.sidebar.expander("📊 API 監控", expanded=False):
+        reruns = metrics.recent_reruns(session, limit=10)
+        if reruns:
+            last = reruns[-1]
+            st.write(f"上一次重跑（{last['page']}）：API {last['api_calls']} 次 / {last['api_ms']} ms，總耗時 {last['wall_ms']} ms")
+        st.write("**本 session**", metrics.session_summary(session))
+        st.write("**最近重跑**")
+        st.dataframe(reruns[::-1], hide_index=True)
+        st.write("**各頁面累計（全部 session）**")
+        st.dataframe(metrics.summary(), hide_index=True)
+        st.write("**Excel 快取**", excel_cache.stats())
+        st.write("**送出日誌**", {**submit_journal.counts(), "duplicates": write_queue.duplicates})
+        shards = shard_manager.meta()
+        if shards["last_error"]:
+            st.warning(f"⚠️ 註冊表分片封存失敗（{shards['last_error'][0]}）：{shards['last_error'][1]}")
+        st.write("**註冊表分片**", shards)
+        quota = quota_scheduler.stats()
+        st.write("**API 配額**")
+        st.dataframe(quota["buckets"], hide_index=True)
+        if quota["waits"]:
+            st.dataframe(quota["waits"], hide_index=True)
+        st.download_button("⬇️ JSON lines", data=metrics.jsonl(), file_name="project_form_metrics.jsonl",
+                           mime="application/json", key="metrics_jsonl")
+        st.download_button("⬇️ Prometheus", data=metrics.prometheus_text() + quota_scheduler.prometheus_text(),
+                           file_name="project_form.prom", mime="text/plain", key="metrics_prom")
+
+def dump_metrics():
+    if METRICS_PROM_PATH:
+        tmp_path = METRICS_PROM_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(metrics.prometheus_text())
+            f.write(quota_scheduler.prometheus_text())
+        os.replace(tmp_path, METRICS_PROM_PATH)
+
+# ========== 定時重跑的片段 ==========
+# st.fragment(run_every=...) 定時重跑時只執行片段本身、不經過 main()：在這裡補上這個 session 的
+# 監控範圍（頁面記為 "<頁面>:<片段>"）與使用者，API 才會依使用者的優先順序排隊，而不是算成背景工作
+def fragment_scope(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if metrics.context()["session"] != BACKGROUND:  # 整頁重跑時已經在 main() 的範圍內
+                return func(*args, **kwargs)
+            st.session_state["_rerun"] = st.session_state.get("_rerun", 0) + 1
+            metrics.begin_rerun(st.session_state.get("_session_id", ""), st.session_state["_rerun"],
+                                f"{st.session_state.get('page', '')}:{name}")
+            quota_scheduler.set_user(st.session_state.get("user", ""))
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.end_rerun()
+                quota_scheduler.set_user(None)
+        return wrapper
+    return decorator
+
+# ========== 送出狀態（每 2 秒自動更新，只重跑這一小段） ==========
+@st.fragment(run_every=2)
+@fragment_scope("submit_status")
+def render_submit_status():
+    ticket = st.session_state.get("submit_ticket")
+    info = write_queue.status(ticket) if ticket else None
+    if not info:
+        return
+
+    if info["status"] == PENDING and info.get("spooled"):
+        st.warning("📥 Google Sheet 暫時無法連線，資料已存在本機佇列，恢復後會自動補寫")
+    elif info["status"] == PENDING:
+        st.info("⏳ 已受理，正在寫入 Google Sheet…")
+    elif info["status"] == COMMITTED:
+        st.success("✅ 已寫入 Google Sheet")
+    elif info["status"] == FAILED:
+        st.error(f"❌ 寫入 Google Sheet 失敗：{info['error']}")
+        if st.button("🔁 重新寫入", key="retry_submit"):
+            write_queue.retry(ticket)
+
+# ========== Lock 心跳（預覽頁停留期間定期續約） ==========
+@st.fragment(run_every=LOCK_HEARTBEAT_SECONDS)
+@fragment_scope("lock_heartbeat")
+def render_lock_heartbeat():
+    record = st.session_state.get("record", {})
+    if not record.get("Project_Number") or st.session_state.get("submitted"):
+        return
+    try:
+        held, holder = lock_heartbeat(st.session_state["user"], record_lock_key(record))
+    except Exception as e:  # 暫時無法連線時下一次心跳再試，租期內 Lock 仍然有效
+        logger.warning("lock heartbeat failed: %s", e)
+        return
+    if not held:
+        st.warning(f"⚠️ 專案代碼 {record_lock_key(record)} 的 Lock 已失效"
+                   + (f"，目前由 {holder} 使用中" if holder else "（超過租期）") + "；專案編號已保留，仍可送出")
+
+# ========== 預先暖機 ==========
+_prewarm_started = False
+_prewarm_mutex = threading.Lock()
+
+def prewarm(background=True):
+    # 每個程序只執行一次：載入 openpyxl、建立 Google 連線並開好常用工作表
+    global _prewarm_started
+    with _prewarm_mutex:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+
+    def _run():
+        try:
+            import openpyxl  # noqa: F401
+            register_snapshot.load()
+            submit_journal.prune()
+            if STORAGE_BACKEND != "sqlite":
+                storage.sheet
+                storage.lock_ws
+        except Exception as e:  # 暖機失敗不影響正常流程，第一次實際使用時會再連線
+            logger.warning("prewarm failed: %s", e)
+
+    if background:
+        threading.Thread(target=_run, name="prewarm", daemon=True).start()
+    else:
+        _run()
+
 # ========== 主程式 ==========
 def main():
     if "page" not in st.session_state:
         st.session_state["page"] = "login"
         st.session_state["logged_in"] = False
 
-    if st.session_state["page"] == "login":
-        login_page()
-    elif st.session_state["page"] == "form":
-        form_page()
-    elif st.session_state["page"] == "preview":
-        preview_page()
+    # 每次重跑的 API 呼叫／耗時都記在這個 session 與頁面底下
+    if "_session_id" not in st.session_state:
+        st.session_state["_session_id"] = uuid.uuid4().hex[:8]
+    st.session_state["_rerun"] = st.session_state.get("_rerun", 0) + 1
+    metrics.begin_rerun(st.session_state["_session_id"], st.session_state["_rerun"], st.session_state["page"])
+    # 這次重跑送出的 API 請求依目前使用者排隊（還沒登入時排在所有使用者之後）
+    quota_scheduler.set_user(st.session_state.get("user", ""))
+
+    try:
+        if st.session_state["page"] == "login":
+            login_page()
+        elif st.session_state["page"] == "form":
+            form_page()
+        elif st.session_state["page"] == "preview":
+            preview_page()
+        elif st.session_state["page"] == "bulk_import":
+            bulk_import_page()
+        elif st.session_state["page"] == "bulk_export":
+            bulk_export_page()
+        elif st.session_state["page"] == "analytics":
+            analytics_page()
+
+        if is_admin():
+            render_metrics_panel()
+    finally:
+        metrics.end_rerun()
+        quota_scheduler.set_user(None)
+        dump_metrics()
+
+    if PREWARM:
+        prewarm()
 
 if __name__ == "__main__":
     main()
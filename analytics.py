@@ -0,0 +1,246 @@
+import glob
+import logging
+import os
+import threading
+import time
+
+# ========== 統計報表：欄式快照與彙總 ==========
+# RegisterSnapshot 把註冊表（RegisterMirror 的資料列）存成磁碟上的 Parquet 快照：
+#   - 每次同步後只把新增的列寫成一個新的 part 檔（rows-<起始列>.parquet），不重寫整份
+#   - part 檔超過 compact_parts 個，或鏡像整張重新下載過（generation 改變）時才合併重寫
+#   - 程式啟動時先讀快照 seed 鏡像，之後只需增量同步
+# 報表用的 DataFrame 只保留統計需要的欄位，維度欄轉成 category，另外算好 Month 欄（依 Update_Time），
+# 篩選與 group-by 都是向量化運算，結果依 (資料版本, 篩選條件, 分組欄位) 快取。
+# 鏡像只有目前使用中的分片；查詢的日期區間涵蓋已封存的分片（shards.py）時才載入那些分片，
+# 封存分片不會再變動，DataFrame 建好後一直留在記憶體。
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ["Sales_User", "ODM_Customers", "Brand_Customers", "Cooling_Solution", "Product_Application", "Month"]
+DIMENSION_LABELS = {
+    "Sales_User": "北辦業務",
+    "ODM_Customers": "ODM客戶",
+    "Brand_Customers": "品牌客戶",
+    "Cooling_Solution": "散熱方式",
+    "Product_Application": "產品應用",
+    "Month": "月份",
+}
+DATE_COLUMN = "Update_Time"
+DATE_FORMAT = "%Y/%m/%d %H:%M"
+
+
+class RegisterSnapshot:
+    def __init__(self, mirror, folder, compact_parts=16, max_cached_results=256, archive=None):
+        self.mirror = mirror
+        self.archive = archive
+        self.folder = folder
+        self.compact_parts = compact_parts
+        self.max_cached_results = max_cached_results
+        self._mutex = threading.RLock()
+        self._loaded = False
+        self._generation = None  # 已寫入快照的鏡像 generation
+        self._persisted = 0  # 已寫入快照的列數
+        self._frame = None
+        self._frame_rows = 0
+        self._frame_key = None
+        self._results = {}
+        self._archive_frames = {}  # 封存分片 -> DataFrame
+        self._combined = None  # (資料版本, 分片清單) -> 目前分片 + 封存分片合併後的 DataFrame
+        self._combined_key = None
+        self.last_persist = None
+
+    # ---- Parquet 快照 ----
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.folder, "rows-*.parquet")))
+
+    def load(self):
+        # 讀取快照並 seed 鏡像；鏡像已經同步過就不使用快照
+        import pyarrow.parquet as pq
+
+        with self._mutex:
+            if self._loaded:
+                return
+            self._loaded = True
+            rows = []
+            try:
+                for path in self._parts():
+                    start = int(os.path.basename(path)[5:-8])
+                    if start != len(rows):  # part 檔不連續代表快照不完整，整份捨棄
+                        rows = []
+                        break
+                    table = pq.read_table(path, columns=self.mirror.headers)
+                    columns = [table.column(h).to_pylist() for h in self.mirror.headers]
+                    rows.extend(list(r) for r in zip(*columns))
+            except Exception as e:  # 快照損毀或欄位不符時當作沒有快照
+                logger.warning("analytics snapshot load failed: %s", e)
+                rows = []
+            if rows and self.mirror.seed(rows):
+                self._generation = 0
+                self._persisted = len(rows)
+
+    def _write_part(self, start, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        headers = self.mirror.headers
+        table = pa.table({h: pa.array([r[i] for r in rows], type=pa.string()) for i, h in enumerate(headers)})
+        path = os.path.join(self.folder, f"rows-{start:010d}.parquet")
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+    def _persist(self, generation):
+        os.makedirs(self.folder, exist_ok=True)
+        parts = self._parts()
+        if generation != self._generation or not parts or len(parts) >= self.compact_parts:
+            # 整份重寫：先以原子方式換掉第一個 part，再刪掉其餘 part
+            _, _, rows = self.mirror.rows_since(0, max_age=float("inf"))
+            self._write_part(0, rows)
+            for path in parts:
+                if os.path.basename(path) != "rows-0000000000.parquet":
+                    os.remove(path)
+            self._persisted = len(rows)
+        else:
+            _, _, rows = self.mirror.rows_since(self._persisted, max_age=float("inf"))
+            if not rows:
+                return
+            self._write_part(self._persisted, rows)
+            self._persisted += len(rows)
+        self._generation = generation
+        self.last_persist = time.time()
+
+    # ---- 報表資料 ----
+    def refresh(self, max_age=None):
+        # 同步鏡像（超過 ttl 才會讀後端），有新資料就更新 DataFrame 並把新增的列寫進快照
+        with self._mutex:
+            self.load()
+            start = self._frame_rows if self._frame is not None else 0
+            generation, version, new_rows = self.mirror.rows_since(start, max_age)
+            if self._frame_key == (generation, version):
+                return self._frame
+
+            if self._frame is None or self._frame_key[0] != generation:
+                _, _, rows = self.mirror.rows_since(0, max_age=float("inf"))
+                self._frame = build_frame(rows, self.mirror.headers)
+            else:
+                self._frame = append_frame(self._frame, build_frame(new_rows, self.mirror.headers))
+            self._frame_rows = len(self._frame)
+            self._frame_key = (generation, version)
+            self._results = {}
+
+            try:
+                self._persist(generation)
+            except Exception as e:  # 快照寫入失敗不影響報表
+                logger.warning("analytics snapshot persist failed: %s", e)
+            return self._frame
+
+    # ---- 封存分片 ----
+    def _archive_frame(self, shard):
+        with self._mutex:
+            if shard not in self._archive_frames:
+                frame = build_frame([], self.mirror.headers)
+                for rows in self.archive.chunks(shard):
+                    frame = append_frame(frame, build_frame(rows, self.mirror.headers))
+                self._archive_frames[shard] = frame
+            return self._archive_frames[shard]
+
+    def frame(self, start=None, end=None, max_age=None):
+        # 回傳 (資料版本, DataFrame)：目前的分片，加上與日期區間重疊的封存分片
+        active = self.refresh(max_age)
+        shards = tuple(self.archive.shards_between(start, end)) if self.archive else ()
+        key = (self._frame_key, shards)
+        if not shards:
+            return key, active
+        with self._mutex:
+            if self._combined_key != key:
+                frame = self._archive_frame(shards[0])
+                for shard in shards[1:]:
+                    frame = append_frame(frame, self._archive_frame(shard))
+                self._combined = append_frame(frame, active)
+                self._combined_key = key
+            return key, self._combined
+
+    def counts(self, by, filters=None, start=None, end=None, max_age=None):
+        # 依 by（欄位名稱或清單）計算筆數；filters: {欄位: [值, ...]}，start/end 篩選 Update_Time 日期
+        data_key, frame = self.frame(start, end, max_age)
+        by = [by] if isinstance(by, str) else list(by)
+        key = (data_key, tuple(by), _freeze(filters), start, end)
+        with self._mutex:
+            if key in self._results:
+                return self._results[key]
+        result = aggregate(frame, by, filters, start, end)
+        with self._mutex:
+            if len(self._results) >= self.max_cached_results:
+                self._results.pop(next(iter(self._results)))
+            self._results[key] = result
+        return result
+
+    def date_range(self, max_age=None):
+        frame = self.refresh(max_age)
+        dates = frame[DATE_COLUMN].dropna()
+        return (dates.min().date(), dates.max().date()) if len(dates) else (None, None)
+
+    def options(self, column, max_age=None):
+        # 目前的分片與已載入的封存分片中出現過的值
+        frames = [self.refresh(max_age)]
+        with self._mutex:
+            frames += list(self._archive_frames.values())
+        return sorted({v for frame in frames for v in frame[column].cat.categories if v != ""})
+
+    def meta(self):
+        with self._mutex:
+            return {
+                "rows": self._frame_rows,
+                "parts": len(self._parts()),
+                "persisted_rows": self._persisted,
+                "last_persist": self.last_persist,
+                "cached_results": len(self._results),
+                "archived_shards_loaded": len(self._archive_frames),
+            }
+
+
+def _freeze(filters):
+    return tuple(sorted((k, tuple(sorted(map(str, v)))) for k, v in (filters or {}).items() if v))
+
+
+def build_frame(rows, headers):
+    import pandas as pd
+
+    columns = [h for h in DIMENSIONS if h in headers] + [DATE_COLUMN, "Project_Number"]
+    idx = [headers.index(h) for h in columns]
+    data = {h: [r[i] if i < len(r) else "" for r in rows] for h, i in zip(columns, idx)}
+    df = pd.DataFrame(data, columns=columns, dtype="string")
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], format=DATE_FORMAT, errors="coerce")
+    df["Month"] = df[DATE_COLUMN].dt.strftime("%Y-%m").fillna("")
+    for col in DIMENSIONS:
+        df[col] = df[col].fillna("").str.strip().astype("category")
+    return df
+
+
+def append_frame(frame, new):
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    if new.empty:
+        return frame
+    merged = pd.concat([frame, new], ignore_index=True)
+    for col in DIMENSIONS:
+        # concat 不同類別的 category 會變成 object，合併類別後再轉回
+        merged[col] = union_categoricals([frame[col], new[col]], ignore_order=True)
+    return merged
+
+
+def aggregate(frame, by, filters=None, start=None, end=None):
+    import pandas as pd
+
+    mask = pd.Series(True, index=frame.index)
+    for col, values in (filters or {}).items():
+        if values:
+            mask &= frame[col].isin(list(values))
+    if start is not None:
+        mask &= frame[DATE_COLUMN] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= frame[DATE_COLUMN] < pd.Timestamp(end) + pd.Timedelta(days=1)
+    selected = frame.loc[mask, by]
+    result = selected.groupby(by, observed=True).size().rename("Count").reset_index()
+    return result.sort_values("Count", ascending=False, kind="stable", ignore_index=True)
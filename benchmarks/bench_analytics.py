@@ -0,0 +1,112 @@
+# ========== 統計報表效能測試 ==========
+# 以 SQLite 放 N 筆模擬資料，量測：
+#   cold      第一次整張下載 + 建立 DataFrame + 寫 Parquet 快照
+#   restart   重新啟動：讀快照 seed 鏡像 + 增量同步驗證 + 建立 DataFrame
+#   delta     新增少量資料後的增量更新（只寫新的 part 檔）
+#   query     隨機篩選條件 + group-by（未快取／已快取）
+# 執行：python benchmarks/bench_analytics.py --rows 100000 --queries 200
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import DIMENSIONS, RegisterSnapshot  # noqa: E402
+from mirror import RegisterMirror  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+HEADERS = [
+    "Project_Number", "Sales_User", "ODM_Customers", "Brand_Customers", "Application_Purpose",
+    "Project_Name", "Proposal_Date", "Product_Application", "Cooling_Solution",
+    "Delivery_Location", "Sample_Date", "Sample_Qty", "Demand_Qty",
+    "Schedule SI", "Schedule PV", "Schedule MV", "Schedule MP", "Spec_Type", "Update_Time",
+]
+VALUES = {
+    "Sales_User": ["Jovi", "Sam", "Vivian", "Wendy", "Lillian"],
+    "ODM_Customers": ["(CP)仁寶", "(QT)廣達", "(WT)緯創", "(HQ)華勤", "(IV)英業達", "(PT)和碩", "(LO)光寶", "(AS)華碩"],
+    "Brand_Customers": ["(DL)戴爾", "(HP)惠普", "(LO)光寶", "(AS)華碩", "(MS)微星", "(GL)谷歌"],
+    "Cooling_Solution": ["(NC)Natural Convection", "(AC)Air Cooling", "(LA)Liquid to Air", "(LL)Liquid to Liquid"],
+    "Product_Application": ["(NB)Notebook", "(SV)Sever", "(AM)Automotive(Car)", "(MI)Minibox", "(NW)Network"],
+}
+
+
+def make_rows(start, count, rng):
+    rows = []
+    for i in range(start, start + count):
+        record = {h: "" for h in HEADERS}
+        record.update({k: rng.choice(v) for k, v in VALUES.items()})
+        record["Project_Number"] = f"BENCH-{i:06d}"
+        record["Project_Name"] = f"bench-{i}"
+        record["Update_Time"] = f"{rng.choice([2024, 2025, 2026])}/{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d} 10:00"
+        rows.append([record[h] for h in HEADERS])
+    return rows
+
+
+def timed(fn):
+    t = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - t) * 1000
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def random_query(rng):
+    by = rng.sample(DIMENSIONS, rng.choice([1, 2]))
+    filters = {}
+    for col in rng.sample(list(VALUES), rng.randint(0, 2)):
+        filters[col] = rng.sample(VALUES[col], rng.randint(1, 3))
+    year = rng.choice([None, 2024, 2025, 2026])
+    start, end = (f"{year}-01-01", f"{year}-12-31") if year else (None, None)
+    return by, filters, start, end
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    folder = tempfile.mkdtemp(prefix="bench_analytics_")
+    try:
+        storage = SQLiteStorage(os.path.join(folder, "bench.db"), HEADERS)
+        storage.append_records(make_rows(0, args.rows, rng))
+        snapshot_dir = os.path.join(folder, "snapshot")
+
+        snapshot = RegisterSnapshot(RegisterMirror(storage, HEADERS, ttl=0), snapshot_dir)
+        _, cold_ms = timed(snapshot.refresh)
+
+        restarted = RegisterSnapshot(RegisterMirror(storage, HEADERS, ttl=0), snapshot_dir)
+        _, restart_ms = timed(restarted.refresh)
+
+        storage.append_records(make_rows(args.rows, 50, rng))
+        _, delta_ms = timed(restarted.refresh)
+
+        queries = [random_query(rng) for _ in range(args.queries)]
+        mirror = restarted.mirror
+        mirror.ttl = 3600  # 查詢時不重新同步，只量測彙總本身
+        uncached = [timed(lambda q=q: restarted.counts(*q))[1] for q in queries]
+        cached = [timed(lambda q=q: restarted.counts(*q))[1] for q in queries]
+
+        print(f"rows={args.rows + 50} snapshot parts={restarted.meta()['parts']}")
+        print(f"  cold build     {cold_ms:9.1f} ms")
+        print(f"  restart        {restart_ms:9.1f} ms   (seeded={mirror.meta()['seeded']}, full_syncs={mirror.meta()['full_syncs']})")
+        print(f"  delta +50 rows {delta_ms:9.1f} ms")
+        for name, values in (("query", uncached), ("query cached", cached)):
+            print(f"  {name:13s}  p50 {statistics.median(values):7.2f} ms   p95 {percentile(values, 95):7.2f} ms   "
+                  f"max {max(values):7.2f} ms")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
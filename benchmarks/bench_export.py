@@ -0,0 +1,75 @@
+# ========== Excel 匯出效能測試 ==========
+# 比較 export_to_template 兩種輸出方式的單次延遲與尖峰記憶體（tracemalloc）
+# 執行：python benchmarks/bench_export.py -n 50
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+
+import Project  # noqa: E402
+
+SAMPLE_RECORD = {
+    "Project_Number": "CPNBAC-001",
+    "Sales_User": "Sam",
+    "ODM_Customers": "(CP)仁寶",
+    "Brand_Customers": "(DL)戴爾",
+    "Application_Purpose": "(01)客戶專案開發",
+    "Project_Name": "Benchmark",
+    "Proposal_Date": "2026/01/01",
+    "Product_Application": "(NB)Notebook",
+    "Cooling_Solution": "(AC)Air Cooling",
+    "Delivery_Location": "(01)Taiwan",
+    "Sample_Date": "2026/02/01",
+    "Sample_Qty": "10",
+    "Demand_Qty": "1000/3",
+    "Schedule SI": "2026/03", "Schedule PV": "2026/04", "Schedule MV": "2026/05", "Schedule MP": "2026/06",
+    "Spec_Type": {
+        "Air Cooling氣冷": {"Air_Flow": "3000/12/5", "Tcase_Max": "95", "Thermal_Resistance": "0.2",
+                          "Max_Power": "45", "Chip_Length": "30", "Chip_Width": "30", "Chip_Height": "2"},
+        "Fan風扇": {"Max_Power": "2", "Input_Voltage": "5", "Input_Current": "0.4", "PQ": "-", "Speed": "5000",
+                  "Noise": "35", "Tone": "-", "Sone": "1", "Weight": "20", "Connector": "JST", "Wiring": "4",
+                  "Cable_Length": "100", "Length": "60", "Width": "60", "Height": "10"},
+        "Liquid Cooling水冷": {"Plate_Form": "Cu", "Max_Power": "300", "Tj_Max": "100", "Tcase_Max": "85",
+                             "T_Inlet": "35", "Thermal_Resistance": "0.05", "Flow_Rate": "1.5", "Impedance": "20",
+                             "Max_Loading": "60", "Chip_Length": "50", "Chip_Width": "50", "Chip_Height": "3"},
+    },
+}
+
+
+def run(engine, n):
+    Project.TEMPLATE_ENGINE = engine
+    Project.export_to_template(SAMPLE_RECORD)  # 暖機（載入模組、解析模板）
+
+    timings = []
+    for _ in range(n):
+        t = time.perf_counter()
+        Project.export_to_template(SAMPLE_RECORD)
+        timings.append((time.perf_counter() - t) * 1000)
+
+    tracemalloc.start()
+    Project.export_to_template(SAMPLE_RECORD)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{engine:9s} median {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms   "
+          f"peak {peak / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50, help="每種方式輸出幾次")
+    args = parser.parse_args()
+    for engine in ("openpyxl", "xml"):
+        run(engine, args.n)
+
+
+if __name__ == "__main__":
+    main()
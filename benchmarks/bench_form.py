@@ -0,0 +1,76 @@
+# ========== 表單填寫重跑次數／CPU 效能測試 ==========
+# 用 Streamlit AppTest 在背景模擬一位使用者填完整張表單並按「✅ 完成」，比較兩種 FORM_MODE：
+#   live     每個欄位輸入完成（瀏覽器 blur / Enter）都會觸發一次整頁重跑
+#   batched  只有下拉選單與規格勾選會重跑，文字欄位在 st.form 內，按「✅ 完成」時一次送出
+# 重跑次數與每次重跑的 CPU 時間取自 Project.metrics 的重跑紀錄（cpu_ms）。
+# 執行：python benchmarks/bench_form.py -n 5
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench_form.db"))
+
+import Project  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+set_log_level("error")
+
+SELECTIONS = {"odm": "(00)其他", "product_app": "(NB)Notebook", "cooling": "(AC)Air Cooling"}
+SPECS = ["Air Cooling氣冷", "Fan風扇", "Liquid Cooling水冷"]
+SUBMIT_KEY = "FormSubmitter:project_form-✅ 完成"
+
+
+def fill_form(mode):
+    Project.FORM_MODE = mode
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.session_state["page"] = "form"
+    at.session_state["logged_in"] = True
+    at.session_state["user"] = "Sam"
+    at.run()
+
+    # 下拉選單與規格勾選：兩種模式都會立即重跑
+    for key, value in SELECTIONS.items():
+        at.selectbox(key=key).set_value(value).run()
+    at.multiselect(key="spec_options").set_value(SPECS).run()
+
+    # 文字欄位：live 模式每填一格重跑一次；batched 模式只改表單內的值，不重跑
+    for i in range(len(at.text_input)):
+        at.text_input[i].set_value(str(i + 1))  # 每次重跑後元素會重建，要重新取得
+        if mode == "live":
+            at.run()
+
+    if mode == "live":
+        at.button[-1].click().run()
+    else:
+        at.button(key=SUBMIT_KEY).click().run()
+
+    if at.exception or at.session_state["page"] != "preview":
+        raise RuntimeError(f"{mode}: form was not completed ({at.exception})")
+    Project.release_lock("Sam", Project.record_lock_key(at.session_state["record"]))
+    return Project.metrics.recent_reruns(at.session_state["_session_id"], limit=1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=5, help="每種模式填幾張表單")
+    args = parser.parse_args()
+
+    for mode in ("live", "batched"):
+        reruns, cpu, wall = [], [], []
+        for _ in range(args.n):
+            summary = fill_form(mode)
+            reruns.append(len(summary))
+            cpu.append(sum(r["cpu_ms"] for r in summary))
+            wall.append(sum(r["wall_ms"] for r in summary))
+        print(f"{mode:8s} reruns/form {statistics.median(reruns):5.0f}   "
+              f"CPU/form {statistics.median(cpu):8.1f} ms   script time/form {statistics.median(wall):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# ========== 完整註冊表匯出效能測試 ==========
+# 以 SQLite 放 N 筆模擬資料（含 Spec_Data JSON），比較尖峰記憶體（tracemalloc）與耗時：
+#   full      一次讀取全部資料列 + openpyxl 一般模式（原本的做法）
+#   xlsx      分段讀取 + openpyxl write_only（register_export.write_xlsx）
+#   csv       分段讀取 + csv
+#   parquet   分段讀取 + 每段一個 row group
+# --rows 可給多個值：分段匯出的尖峰記憶體應該不隨筆數增加。耗時含 tracemalloc 的額外負擔，只適合互相比較。
+# 執行：python benchmarks/bench_register_export.py --rows 10000,50000 --chunk-rows 2000
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 欄位與規格內容直接取自程式本身的定義（Project.SHEET_HEADERS、spec_schema），新增欄位時不必同步修改這裡；
+# 載入 Project 前先把本機檔案（送出日誌、快取、封存分片）指到暫存目錄
+_tmp = tempfile.mkdtemp(prefix="bench_register_export_env_")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_tmp, "project_form.db")
+os.environ["JOURNAL_PATH"] = os.path.join(_tmp, "journal.db")
+os.environ["EXCEL_CACHE_DIR"] = os.path.join(_tmp, "excel_cache")
+os.environ["ANALYTICS_SNAPSHOT_DIR"] = os.path.join(_tmp, "analytics_snapshot")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "register_archive")
+os.environ["PREWARM"] = "0"
+
+from Project import SHEET_HEADERS as HEADERS  # noqa: E402
+from register_export import storage_chunks, write_register  # noqa: E402
+from spec_schema import SPEC_SECTIONS, encode_spec, serialize_sections  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+# 前兩種規格方案，每個欄位都有值
+SPEC = {section.name: {f.key: str(i + 1) for i, f in enumerate(section.fields)} for section in SPEC_SECTIONS[:2]}
+
+
+def make_rows(count, rng):
+    spec, spec_type = encode_spec(SPEC), serialize_sections(SPEC)
+    for i in range(count):
+        record = {h: f"{h}-{rng.randint(0, 99)}" for h in HEADERS}
+        record["Project_Number"] = f"BENCH-{i:06d}"
+        record["Spec_Type"] = spec_type
+        record["Spec_Data"] = spec
+        record["Update_Time"] = f"2026/{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d} 10:00"
+        yield [record[h] for h in HEADERS]
+
+
+def export_full(storage, fileobj):
+    # 對照組：整張讀進記憶體，openpyxl 一般模式建立每個儲存格
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    rows = storage.fetch_rows(0)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for cell in ws[1]:
+        cell.font = Font(bold=True)
+    for row in rows:
+        ws.append(list(row))
+    ws.freeze_panes = "B2"
+    wb.save(fileobj)
+    return len(rows)
+
+
+def measure(fn):
+    tracemalloc.start()
+    t = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="10000,50000", help="資料筆數，可用逗號分隔多個值")
+    parser.add_argument("--chunk-rows", type=int, default=2000)
+    parser.add_argument("--skip-full", action="store_true", help="不跑對照組（筆數很大時很慢）")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench_register_export_")
+    try:
+        for n in [int(v) for v in args.rows.split(",")]:
+            storage = SQLiteStorage(os.path.join(folder, f"bench_{n}.db"), HEADERS)
+            rows = list(make_rows(n, random.Random(args.seed)))
+            storage.append_records(rows)
+            del rows
+
+            cases = [] if args.skip_full else [("full", lambda f: export_full(storage, f))]
+            for fmt in ("xlsx", "csv", "parquet"):
+                cases.append((fmt, lambda f, fmt=fmt: write_register(
+                    fmt, storage_chunks(storage, args.chunk_rows), HEADERS, f)))
+            for name, fn in cases:
+                path = os.path.join(folder, f"out_{name}")
+                with open(path, "wb") as f:
+                    count, elapsed, peak = measure(lambda: fn(f))
+                size = os.path.getsize(path)
+                print(f"rows={n:<7d} {name:8s} {elapsed:6.2f} s   peak {peak / 1048576:7.1f} MiB   "
+                      f"file {size / 1048576:6.1f} MiB   ({count} rows)")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
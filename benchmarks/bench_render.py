@@ -0,0 +1,218 @@
+# ========== 頁面渲染效能測試（Streamlit AppTest，不連網路） ==========
+# 用 AppTest 跑 main() 的完整流程：登入頁 -> 登入 -> 表單（選完下拉選單、勾選全部三種規格方案）
+# -> 按「✅ 完成」-> 預覽頁。儲存後端、送出日誌、快取都放在暫存目錄（SQLite），不呼叫 Google API，
+# 量到的只有畫面這一側的成本。每一步（一次 at.run()）記錄：
+#   wall_ms     at.run() 的耗時（含 AppTest 本身的負擔）
+#   cpu_ms      腳本執行緒的 CPU 時間（Project.metrics 的重跑紀錄）
+#   alloc_kib   重跑期間 tracemalloc 的尖峰記憶體增量（另外跑 --alloc-runs 次，避免 tracemalloc 拖慢計時）
+#   widgets     畫面上的 widget 數量（有 widget id 的元素），elements 為全部元素數量
+# 第一輪當暖機不計，之後每步取 -n 次的中位數，與基準檔（--baseline）比較：
+#   時間超過基準 --time-tolerance（且差距超過 --min-ms）、記憶體超過 --alloc-tolerance、
+#   widget／元素數量有任何變動，都算退步，逐項列出後以結束碼 1 結束。
+# 基準與機器有關：換機器，或確認是預期中的變動（例如新增欄位）後，用 --save-baseline 重新產生。
+# 執行：python benchmarks/bench_render.py -n 5
+#       python benchmarks/bench_render.py -n 5 --save-baseline
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_tmp = tempfile.mkdtemp(prefix="bench_render_")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_tmp, "bench_render.db")
+os.environ["JOURNAL_PATH"] = os.path.join(_tmp, "journal.db")
+os.environ["EXCEL_CACHE_DIR"] = os.path.join(_tmp, "excel_cache")
+os.environ["ANALYTICS_SNAPSHOT_DIR"] = os.path.join(_tmp, "analytics_snapshot")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "register_archive")
+os.environ["PREWARM"] = "0"
+
+import Project  # noqa: E402
+import streamlit  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+set_log_level("error")
+
+APP = os.path.join(ROOT, "app.py")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_baseline.json")
+SELECTIONS = {"odm": "(00)其他", "product_app": "(NB)Notebook", "cooling": "(AC)Air Cooling"}
+SPECS = ["Air Cooling氣冷", "Fan風扇", "Liquid Cooling水冷"]
+SUBMIT_KEY = "FormSubmitter:project_form-✅ 完成"
+
+
+def _walk(node):
+    yield node
+    for child in getattr(node, "children", {}).values():
+        yield from _walk(child)
+
+
+def count_elements(at):
+    widgets = elements = 0
+    for node in _walk(at._tree):
+        proto = getattr(node, "proto", None)
+        if proto is None:
+            continue
+        elements += 1
+        widgets += bool(getattr(proto, "id", ""))
+    return widgets, elements
+
+
+def run_flow(username, password, trace=False):
+    # 跑一次完整流程，回傳 [{step, wall_ms, cpu_ms, alloc_kib, widgets, elements}, ...]
+    Project.FORM_MODE = "batched"
+    at = AppTest.from_file(APP, default_timeout=60)
+    steps = []
+
+    def step(name, action):
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        action()
+        wall = (time.perf_counter() - start) * 1000
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception}")
+        widgets, elements = count_elements(at)
+        last = Project.metrics.recent_reruns(at.session_state["_session_id"], limit=1)[-1]
+        steps.append({
+            "step": name,
+            "page": last["page"],
+            "wall_ms": round(wall, 2),
+            "cpu_ms": last["cpu_ms"],
+            "alloc_kib": round((tracemalloc.get_traced_memory()[1] - before) / 1024, 1) if trace else None,
+            "widgets": widgets,
+            "elements": elements,
+        })
+
+    step("login", at.run)
+    at.text_input(key="login_username").set_value(username)
+    at.text_input(key="login_password").set_value(password)
+    step("login_submit", lambda: at.button[0].click().run())
+    step("form", at.run)
+    for key, value in SELECTIONS.items():
+        step(f"select_{key}", lambda key=key, value=value: at.selectbox(key=key).set_value(value).run())
+    step("select_specs", lambda: at.multiselect(key="spec_options").set_value(SPECS).run())
+    for i in range(len(at.text_input)):
+        if at.text_input[i].key != "reexport_number":
+            at.text_input[i].set_value(str(i + 1))
+    step("form_submit", lambda: at.button(key=SUBMIT_KEY).click().run())
+    step("preview", at.run)
+
+    if at.session_state["page"] != "preview":
+        raise RuntimeError(f"flow did not reach the preview page ({at.session_state['page']})")
+    Project.release_lock(at.session_state["user"], Project.record_lock_key(at.session_state["record"]))
+    return steps
+
+
+def median_steps(runs, metrics):
+    result = {}
+    for i, first in enumerate(runs[0]):
+        row = {"page": first["page"]}
+        for metric in metrics:
+            row[metric] = round(statistics.median(run[i][metric] for run in runs), 2)
+        result[first["step"]] = row
+    return result
+
+
+def compare(current, baseline, args):
+    # 回傳退步清單 [(步驟, 項目, 基準值, 目前值)]
+    regressions = []
+    for name, row in current.items():
+        base = baseline.get(name)
+        if base is None:
+            regressions.append((name, "step", "missing", "new"))
+            continue
+        for metric in ("wall_ms", "cpu_ms"):
+            if row[metric] > base[metric] * (1 + args.time_tolerance) and row[metric] - base[metric] > args.min_ms:
+                regressions.append((name, metric, base[metric], row[metric]))
+        if row["alloc_kib"] > base["alloc_kib"] * (1 + args.alloc_tolerance) and row["alloc_kib"] - base["alloc_kib"] > 64:
+            regressions.append((name, "alloc_kib", base["alloc_kib"], row["alloc_kib"]))
+        for metric in ("widgets", "elements"):
+            if row[metric] != base[metric]:
+                regressions.append((name, metric, base[metric], row[metric]))
+    for name in baseline:
+        if name not in current:
+            regressions.append((name, "step", "present", "missing"))
+    return regressions
+
+
+def _delta(value, base):
+    if base in (None, 0):
+        return ""
+    return f"{(value - base) / base * 100:+5.0f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=5, help="計時的流程次數（不含暖機）")
+    parser.add_argument("--alloc-runs", type=int, default=2, help="開 tracemalloc 量記憶體的流程次數")
+    parser.add_argument("--user", default="Vivian", help="登入的業務名稱（非管理者，側邊欄不顯示監控面板）")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="把這次結果存成基準")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="時間可以比基準慢多少（比例）")
+    parser.add_argument("--alloc-tolerance", type=float, default=0.25, help="記憶體可以比基準多多少（比例）")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="時間差距小於這個值不算退步")
+    args = parser.parse_args()
+
+    username, password = next((u, c["password"]) for u, c in Project.USER_CREDENTIALS.items()
+                              if c["name"] == args.user)
+
+    run_flow(username, password)  # 暖機：載入模組、解析模板、第一次建立資料庫
+    timed = [run_flow(username, password) for _ in range(args.n)]
+    tracemalloc.start()
+    try:
+        traced = [run_flow(username, password, trace=True) for _ in range(args.alloc_runs)]
+    finally:
+        tracemalloc.stop()
+
+    current = median_steps(timed, ["wall_ms", "cpu_ms", "widgets", "elements"])
+    for name, row in median_steps(traced, ["alloc_kib"]).items():
+        current[name]["alloc_kib"] = row["alloc_kib"]
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["steps"]
+
+    print(f"{'step':16s} {'page':8s} {'wall ms':>9s} {'cpu ms':>9s} {'alloc KiB':>10s} {'widgets':>8s} {'elements':>9s}")
+    for name, row in current.items():
+        base = (baseline or {}).get(name, {})
+        print(f"{name:16s} {row['page']:8s} {row['wall_ms']:9.1f} {row['cpu_ms']:9.1f} {row['alloc_kib']:10.1f} "
+              f"{row['widgets']:8.0f} {row['elements']:9.0f}   "
+              f"{_delta(row['wall_ms'], base.get('wall_ms'))} {_delta(row['cpu_ms'], base.get('cpu_ms'))} "
+              f"{_delta(row['alloc_kib'], base.get('alloc_kib'))}")
+
+    if args.save_baseline:
+        data = {
+            "meta": {"python": platform.python_version(), "streamlit": streamlit.__version__,
+                     "machine": platform.machine(), "n": args.n, "alloc_runs": args.alloc_runs,
+                     "created": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "steps": current,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --save-baseline first")
+        return
+
+    regressions = compare(current, baseline, args)
+    if regressions:
+        print(f"\nREGRESSION: {len(regressions)} metric(s) worse than baseline")
+        for name, metric, base, value in regressions:
+            print(f"  {name:16s} {metric:10s} baseline {base}  now {value}")
+        sys.exit(1)
+    print("\nOK: no regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
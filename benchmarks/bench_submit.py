@@ -0,0 +1,213 @@
+# ========== 送出流程效能測試（離線） ==========
+# 以 fake_gspread 模擬 Google Sheets，N 個使用者同時執行 登入 -> 表單 -> 預覽 -> 送出，
+# 走的是 Project.py 實際的函式（acquire_lock、generate_project_number、save_to_google_sheet、
+# export_to_template、release_lock），只把 Google 連線換成模擬伺服器。
+# Lock 以專案代碼為單位：--prefixes 1 代表所有人開同一個代碼（等同原本的全域 Lock），
+# 預設每個使用者各用一個 ODM 客戶（代碼不同，可同時開案）。--users 可給多個值，依序各跑一次。
+# 執行：python benchmarks/bench_submit.py --users 6 --submits 5 --latency 0.15 --jitter 0.05 --quota 300
+#       python benchmarks/bench_submit.py --users 1,2,4,8 --prefixes 1 --preview-seconds 2
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ["STORAGE_BACKEND"] = "gsheets"
+# 送出日誌放在暫存目錄，不會補寫到正式的日誌
+os.environ["JOURNAL_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_submit_"), "journal.db")
+
+import Project  # noqa: E402
+from fake_gspread import FakeSheetsServer  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+
+set_log_level("error")  # 模擬使用者不在 Streamlit 執行環境內，關掉 session_state 警告
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+ODMS = ["(CP)仁寶", "(QT)廣達", "(WT)緯創", "(HQ)華勤", "(IV)英業達", "(PT)和碩", "(LO)光寶", "(AS)華碩",
+        "(DL)戴爾", "(HP)惠普", "(MS)微星", "(GL)谷歌"]
+
+
+def make_record(user, project_number, i, odm):
+    return {
+        "Project_Number": project_number,
+        "Sales_User": user,
+        "ODM_Customers": odm,
+        "Brand_Customers": "(DL)戴爾",
+        "Application_Purpose": "(01)客戶專案開發",
+        "Project_Name": f"bench-{user}-{i}",
+        "Proposal_Date": "2026/01/01",
+        "Product_Application": "(NB)Notebook",
+        "Cooling_Solution": "(AC)Air Cooling",
+        "Delivery_Location": "(01)Taiwan",
+        "Sample_Date": "2026/02/01",
+        "Sample_Qty": "10",
+        "Demand_Qty": "1000",
+        "Spec_Type": {"Fan風扇": {"Max_Power": "2", "Speed": "5000"}},
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {"login": [], "acquire": [], "submit": [], "end_to_end": [], "commit": []}
+        self.lock_waits = 0
+        self.lock_waited_submits = 0
+        self.errors = 0
+        self.submits = 0
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.timings[name].append(seconds * 1000)
+
+
+def retry(stats, fn, *args):
+    # 頁面上遇到 429 / 5xx 時使用者會再按一次，這裡以重試模擬並計入 client_errors
+    while True:
+        try:
+            return fn(*args)
+        except Exception:
+            with stats.lock:
+                stats.errors += 1
+            time.sleep(0.2)
+
+
+def simulate_user(user, submits, stats, retry_interval, preview_seconds, odm):
+    lock_key = Project.project_prefix(odm, "(NB)Notebook", "(AC)Air Cooling")
+    for i in range(submits):
+        start = time.perf_counter()
+
+        # 登入：檢查自己持有的 Lock，持有者會接續最後一筆
+        t = time.perf_counter()
+        if retry(stats, Project.lock_engine.held_by, user):
+            retry(stats, Project.storage.get_last_record, user)
+        stats.add("login", time.perf_counter() - t)
+
+        # 表單「✅ 完成」：取得該專案代碼的 Lock、產生專案編號
+        t = time.perf_counter()
+        waited = False
+        while True:
+            ok, _ = retry(stats, Project.acquire_lock, user, lock_key)
+            if ok:
+                break
+            waited = True
+            with stats.lock:
+                stats.lock_waits += 1
+            time.sleep(retry_interval)
+        project_number = retry(stats, Project.generate_project_number, odm, "(NB)Notebook", "(AC)Air Cooling")
+        stats.add("acquire", time.perf_counter() - t)
+
+        # 預覽頁打開時先在背景產生 Excel；「💾 確認送出」：寫入與釋放 Lock 同時進行
+        record = make_record(user, project_number, i, odm)
+        key = Project.prerender_excel(record)
+        time.sleep(preview_seconds)
+        t = time.perf_counter()
+        result = Project.submit_record(record, user, key)
+        if result["release_error"] is not None:
+            with stats.lock:
+                stats.errors += 1
+            retry(stats, Project.release_lock, user, lock_key)
+        ticket = result["ticket"]
+        accepted = time.perf_counter()
+        stats.add("submit", accepted - t)
+        stats.add("end_to_end", accepted - start)
+
+        # 背景寫入確認完成的時間
+        Project.write_queue.wait(ticket, timeout=300)
+        stats.add("commit", time.perf_counter() - accepted)
+
+        with stats.lock:
+            stats.submits += 1
+            stats.lock_waited_submits += int(waited)
+
+
+def run(server, n_users, args):
+    users = list(Project.USER_PRIORITY)[:n_users]
+    users += [f"User{i}" for i in range(len(users) + 1, n_users + 1)]
+    prefixes = args.prefixes or n_users
+    stats = Stats()
+    server.reset_stats()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=simulate_user,
+                                args=(u, args.submits, stats, args.retry_interval, args.preview_seconds,
+                                      ODMS[i % min(prefixes, len(ODMS))]))
+               for i, u in enumerate(users)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "users": n_users,
+        "prefixes": min(prefixes, n_users, len(ODMS)),
+        "submits": stats.submits,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_minute": round(stats.submits / elapsed * 60, 1),
+        "api_calls": server.total_calls,
+        "api_calls_per_submit": round(server.total_calls / max(stats.submits, 1), 2),
+        "api_calls_by_method": dict(server.calls),
+        "api_errors": dict(server.errors),
+        "lock_wait_attempts": stats.lock_waits,
+        "lock_waited_submits": stats.lock_waited_submits,
+        "client_errors": stats.errors,
+        "latency_ms": {
+            name: {"p50": round(statistics.median(v), 1) if v else 0.0, "p95": round(percentile(v, 95), 1)}
+            for name, v in stats.timings.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default="6", help="同時使用者數，可用逗號給多個值，例如 1,2,4,8")
+    parser.add_argument("--prefixes", type=int, default=0, help="使用幾個不同的專案代碼（0 = 每個使用者各一個）")
+    parser.add_argument("--submits", type=int, default=5, help="每個使用者送出幾筆")
+    parser.add_argument("--rows", type=int, default=2000, help="註冊表預先放幾筆資料")
+    parser.add_argument("--latency", type=float, default=0.15, help="每次 API 延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--quota", type=int, default=None, help="每分鐘請求上限（超過回 429）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="隨機注入 429 的機率")
+    parser.add_argument("--retry-interval", type=float, default=0.2, help="拿不到 Lock 時隔多久再試（秒）")
+    parser.add_argument("--preview-seconds", type=float, default=0.5, help="使用者在預覽頁停留幾秒才按送出")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="另存結果為 JSON 檔")
+    args = parser.parse_args()
+
+    server = FakeSheetsServer(args.latency, args.jitter, args.quota, args.error_rate, seed=args.seed)
+    rows = [[f"000000-{i + 1:03d}", "Seed"] for i in range(args.rows)]
+    server.seed_register(Project.SHEET_NAME, Project.WORKSHEET_NAME, Project.SHEET_HEADERS, rows)
+    Project.storage._client = server.client()
+    Project.write_queue.base_delay = 0.2
+
+    results = []
+    for n_users in [int(n) for n in str(args.users).split(",") if n.strip()]:
+        result = run(server, n_users, args)
+        results.append(result)
+        print(f"users={result['users']} prefixes={result['prefixes']} submits={result['submits']} "
+              f"elapsed={result['elapsed_seconds']}s throughput={result['throughput_per_minute']}/min")
+        print(f"  API calls per submit: {result['api_calls_per_submit']}  {result['api_calls_by_method']}")
+        print(f"  lock contention: {result['lock_wait_attempts']} failed attempts, "
+              f"{result['lock_waited_submits']}/{result['submits']} submits waited; API errors {result['api_errors']}")
+        for name, v in result["latency_ms"].items():
+            print(f"    {name:11s} p50 {v['p50']:9.1f} ms   p95 {v['p95']:9.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results[0] if len(results) == 1 else results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# ========== 模擬 Google Sheets（離線效能測試用） ==========
+# 提供與 gspread 相同介面的 Client / Spreadsheet / Worksheet，資料存在記憶體中。
+# 每次呼叫都算一次 API 請求，可設定：
+#   latency / jitter    每次請求的延遲（秒）與隨機抖動
+#   quota_per_minute    每 60 秒最多幾次請求，超過就回 429（與正式環境共用 service account 配額相同）
+#   error_rate          隨機注入 429 的機率
+# 呼叫次數依方法名稱統計在 FakeSheetsServer.calls，可用 reset_stats() 歸零。
+import collections
+import random
+import re
+import threading
+import time
+
+import gspread
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+
+class _FakeResponse:
+    def __init__(self, code, message, status):
+        self.status_code = code
+        self.text = message
+        self._error = {"code": code, "message": message, "status": status}
+
+    def json(self):
+        return {"error": self._error}
+
+
+def api_error(code=429, message="Quota exceeded for quota metric 'Read requests'", status="RESOURCE_EXHAUSTED"):
+    return gspread.exceptions.APIError(_FakeResponse(code, message, status))
+
+
+class FakeSheetsServer:
+    def __init__(self, latency=0.0, jitter=0.0, quota_per_minute=None, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.spreadsheets = {}
+        self.data_lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._window = collections.deque()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.calls = collections.Counter()
+            self.errors = collections.Counter()
+            self.total_calls = 0
+
+    def request(self, method):
+        # 每次 API 呼叫先經過這裡：計數、配額、注入錯誤、模擬網路延遲
+        with self._stats_lock:
+            self.calls[method] += 1
+            self.total_calls += 1
+            now = time.monotonic()
+            if self.quota_per_minute:
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                over_quota = len(self._window) >= self.quota_per_minute
+                if not over_quota:
+                    self._window.append(now)
+            else:
+                over_quota = False
+            injected = self.error_rate and self.random.random() < self.error_rate
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            time.sleep(delay)
+        if over_quota or injected:
+            with self._stats_lock:
+                self.errors[method] += 1
+            raise api_error()
+
+    def client(self):
+        return FakeClient(self)
+
+    def seed_register(self, sheet_name, worksheet_name, headers, rows=()):
+        with self.data_lock:
+            sh = self.spreadsheets.setdefault(sheet_name, FakeSpreadsheet(self, sheet_name))
+            ws = sh._add(worksheet_name)
+            ws.rows = [list(headers)] + [list(r) for r in rows]
+            return ws
+
+
+class FakeClient:
+    def __init__(self, server):
+        self.server = server
+
+    def open(self, title):
+        self.server.request("open")
+        with self.server.data_lock:
+            if title not in self.server.spreadsheets:
+                raise gspread.exceptions.SpreadsheetNotFound(title)
+            return self.server.spreadsheets[title]
+
+
+class FakeSpreadsheet:
+    def __init__(self, server, title):
+        self.server = server
+        self.title = title
+        self._worksheets = {}
+        self._next_id = 1
+
+    def _add(self, title):
+        ws = FakeWorksheet(self, title, self._next_id)
+        self._next_id += 1
+        self._worksheets[title] = ws
+        return ws
+
+    def worksheet(self, title):
+        self.server.request("worksheet")
+        with self.server.data_lock:
+            if title not in self._worksheets:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            return self._worksheets[title]
+
+    def add_worksheet(self, title, rows=100, cols=26, index=None):
+        self.server.request("add_worksheet")
+        with self.server.data_lock:
+            return self._add(title)
+
+    def worksheets(self):
+        self.server.request("worksheets")
+        with self.server.data_lock:
+            return list(self._worksheets.values())
+
+    def del_worksheet(self, worksheet):
+        self.server.request("del_worksheet")
+        with self.server.data_lock:
+            self._worksheets.pop(worksheet.title, None)
+
+    def batch_update(self, body):
+        # 只支援 updateSheetProperties 改名（分片封存）
+        self.server.request("batch_update")
+        with self.server.data_lock:
+            by_id = {ws.id: ws for ws in self._worksheets.values()}
+            renames = [req["updateSheetProperties"]["properties"] for req in body.get("requests", [])
+                       if "updateSheetProperties" in req]
+            if renames:
+                # 與 Google 相同：整批一起生效，任何名稱重複就整批失敗
+                titles = {ws.id: ws.title for ws in self._worksheets.values()}
+                titles.update({p["sheetId"]: p["title"] for p in renames})
+                if len(set(titles.values())) != len(titles):
+                    raise api_error(400, "Invalid requests: duplicate sheet title", "INVALID_ARGUMENT")
+                for p in renames:
+                    by_id[p["sheetId"]].title = p["title"]
+                self._worksheets = {ws.title: ws for ws in by_id.values()}
+        return {}
+
+
+class _Cell:
+    def __init__(self, row, col, value):
+        self.row, self.col, self.value = row, col, value
+
+
+def _parse_range(name, max_rows):
+    # "A2:B2"、"B5:B"、"A1"、"3:3" -> (r1, c1, r2, c2)，皆從 1 起算
+    name = name.split("!")[-1]
+    start, _, end = name.partition(":")
+    end = end or start
+
+    def part(text, default_row):
+        m = re.fullmatch(r"([A-Z]*)(\d*)", text)
+        col = a1_to_rowcol(m.group(1) + "1")[1] if m.group(1) else None
+        row = int(m.group(2)) if m.group(2) else default_row
+        return row, col
+
+    r1, c1 = part(start, 1)
+    r2, c2 = part(end, max_rows)
+    return r1, c1 or 1, r2, c2 or 26
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id):
+        self.spreadsheet = spreadsheet
+        self.server = spreadsheet.server
+        self.title = title
+        self.id = sheet_id
+        self.rows = []
+
+    # ---- 內部資料存取（不計 API 次數） ----
+    def _cell(self, row, col):
+        if row - 1 < len(self.rows) and col - 1 < len(self.rows[row - 1]):
+            value = self.rows[row - 1][col - 1]
+            return "" if value is None else str(value)
+        return ""
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        line = self.rows[row - 1]
+        while len(line) < col:
+            line.append("")
+        line[col - 1] = "" if value is None else str(value)
+
+    def _last_row(self):
+        n = len(self.rows)
+        while n and not any(str(v) for v in self.rows[n - 1]):
+            n -= 1
+        return n
+
+    def _read(self, r1, c1, r2, c2):
+        r2 = min(r2, self._last_row())
+        out = []
+        for r in range(r1, r2 + 1):
+            line = [self._cell(r, c) for c in range(c1, c2 + 1)]
+            while line and line[-1] == "":
+                line.pop()
+            out.append(line)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    # ---- gspread 介面 ----
+    def get(self, range_name=None, **kwargs):
+        self.server.request("get")
+        with self.server.data_lock:
+            return self._read(*_parse_range(range_name or "A1:ZZ", len(self.rows)))
+
+    def get_all_values(self, **kwargs):
+        self.server.request("get_all_values")
+        with self.server.data_lock:
+            return self._read(1, 1, len(self.rows), max((len(r) for r in self.rows), default=1))
+
+    def get_all_records(self, **kwargs):
+        self.server.request("get_all_records")
+        with self.server.data_lock:
+            values = self._read(1, 1, len(self.rows), max((len(r) for r in self.rows), default=1))
+        if not values:
+            return []
+        headers = values[0]
+        return [dict(zip(headers, row + [""] * (len(headers) - len(row)))) for row in values[1:]]
+
+    def row_values(self, row, **kwargs):
+        self.server.request("row_values")
+        with self.server.data_lock:
+            values = self._read(row, 1, row, max((len(r) for r in self.rows), default=1))
+            return values[0] if values else []
+
+    def col_values(self, col, **kwargs):
+        self.server.request("col_values")
+        with self.server.data_lock:
+            values = [self._cell(r, col) for r in range(1, self._last_row() + 1)]
+            while values and values[-1] == "":
+                values.pop()
+            return values
+
+    def acell(self, label, **kwargs):
+        self.server.request("acell")
+        row, col = a1_to_rowcol(label)
+        with self.server.data_lock:
+            value = self._cell(row, col)
+        return _Cell(row, col, value or None)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        # 同時支援舊版 update("A1:B1", [[...]]) 與新版 update(values, range_name) 的參數順序
+        if isinstance(values, str) and not isinstance(range_name, str):
+            values, range_name = range_name, values
+        self.server.request("update")
+        r1, c1, _, _ = _parse_range(range_name or "A1", len(self.rows))
+        with self.server.data_lock:
+            for i, line in enumerate(values):
+                for j, value in enumerate(line):
+                    self._set(r1 + i, c1 + j, value)
+        return {"updatedRange": f"{self.title}!{range_name}"}
+
+    def update_cell(self, row, col, value):
+        self.server.request("update_cell")
+        with self.server.data_lock:
+            self._set(row, col, value)
+        return {}
+
+    def append_row(self, values, **kwargs):
+        return self._append("append_row", [values])
+
+    def append_rows(self, values, **kwargs):
+        return self._append("append_rows", values)
+
+    def _append(self, method, values):
+        self.server.request(method)
+        with self.server.data_lock:
+            first = self._last_row() + 1
+            for i, line in enumerate(values):
+                for j, value in enumerate(line):
+                    self._set(first + i, j + 1, value)
+            last = first + len(values) - 1
+            width = max((len(v) for v in values), default=1)
+        return {"updates": {"updatedRange": f"{self.title}!A{first}:{rowcol_to_a1(last, max(width, 1))}"}}
+
+    def clear(self):
+        self.server.request("clear")
+        with self.server.data_lock:
+            self.rows = []
+        return {}
@@ -0,0 +1,151 @@
+import datetime
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# ========== 批次匯出 Excel ==========
+# 依條件（日期區間、業務、ODM 客戶）篩選紀錄，每筆都透過 Project.export_to_template 產生 Excel，
+# 交給 ProcessPoolExecutor 平行處理。同時處理中的工作數量有上限，每個檔案完成就立刻寫進 zip／資料夾並釋放，
+# 記憶體用量不會隨筆數增加。
+#   python bulk_export.py --out exports/ --start 2026/01/01 --end 2026/03/31 --sales Sam --odm "(CP)仁寶"
+#   python bulk_export.py --zip Q1.zip --start 2026/01/01 --end 2026/03/31
+
+
+def parse_date(value):
+    # 支援 "2026/01/31"、"2026-01-31"、"2026/01/31 14:00"（Update_Time 格式）與 date 物件
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    m = re.match(r"\s*(\d{4})[/-](\d{1,2})[/-](\d{1,2})", str(value or ""))
+    if not m:
+        return None
+    try:
+        return datetime.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    except ValueError:
+        return None
+
+
+def filter_records(records, start=None, end=None, sales_users=None, odms=None, date_field="Update_Time"):
+    start, end = parse_date(start), parse_date(end)
+    sales_users = {str(u).strip() for u in sales_users or []}
+    odms = {str(o).strip() for o in odms or []}
+
+    for record in records:
+        if sales_users and str(record.get("Sales_User", "")).strip() not in sales_users:
+            continue
+        if odms and str(record.get("ODM_Customers", "")).strip() not in odms:
+            continue
+        if start or end:
+            day = parse_date(record.get(date_field, ""))
+            if day is None or (start and day < start) or (end and day > end):
+                continue
+        yield record
+
+
+def export_filename(record, used=None):
+    number = str(record.get("Project_Number", "")).strip() or "NoNumber"
+    day = parse_date(record.get("Update_Time", ""))
+    stamp = day.strftime("%Y%m%d") if day else "00000000"
+    name = re.sub(r'[\\/:*?"<>|]', "_", f"ProjectForm_{number}_{stamp}.xlsx")
+    if used is not None:
+        base, n = name[:-5], 2
+        while name in used:
+            name = f"{base}_{n}.xlsx"
+            n += 1
+        used.add(name)
+    return name
+
+
+def _render(record):
+    # 在子程序中執行：第一次呼叫時載入 Project 與解析模板，之後同一個子程序重複使用
+    import Project
+
+    return Project.export_to_template(record)
+
+
+def iter_rendered(records, max_workers=None, max_pending=None):
+    # 依完成順序逐一回傳 (檔名, Excel bytes)；同時送出的工作最多 max_pending 個
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    max_pending = max_pending or max_workers * 2
+    used = set()
+    records = iter(records)
+
+    # Streamlit 伺服器是多執行緒程式，使用 spawn 避免 fork 後子程序卡在複製來的鎖
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                record = next(records, None)
+                if record is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(_render, record)] = export_filename(record, used)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                yield name, future.result()
+
+
+def write_zip(records, fileobj, max_workers=None, progress=None):
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED) as zf:
+        # xlsx 本身已經是壓縮檔，zip 內直接存放不再壓縮
+        for name, data in iter_rendered(records, max_workers=max_workers):
+            zf.writestr(name, data)
+            count += 1
+            if progress:
+                progress(count)
+    return count
+
+
+def write_directory(records, folder, max_workers=None, progress=None):
+    os.makedirs(folder, exist_ok=True)
+    count = 0
+    for name, data in iter_rendered(records, max_workers=max_workers):
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(data)
+        count += 1
+        if progress:
+            progress(count)
+    return count
+
+
+def main():
+    import argparse
+
+    import Project
+
+    parser = argparse.ArgumentParser(description="批次匯出專案申請表 Excel")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--zip", help="輸出成單一 zip 檔")
+    target.add_argument("--out", help="輸出到資料夾")
+    parser.add_argument("--start", help="起始日期（含），例如 2026/01/01")
+    parser.add_argument("--end", help="結束日期（含），例如 2026/03/31")
+    parser.add_argument("--date-field", default="Update_Time", help="依哪個日期欄位篩選（預設 Update_Time）")
+    parser.add_argument("--sales", action="append", help="業務名稱，可重複指定")
+    parser.add_argument("--odm", action="append", help="ODM 客戶（完整選項文字），可重複指定")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    # 封存分片依 Update_Time 區間挑選，以其他日期欄位篩選時全部讀取
+    bounds = (args.start, args.end) if args.date_field == "Update_Time" else (None, None)
+    records = filter_records(
+        Project.load_export_records(*bounds), args.start, args.end, args.sales, args.odm, date_field=args.date_field
+    )
+    if args.zip:
+        with open(args.zip, "wb") as f:
+            count = write_zip(records, f, max_workers=args.workers)
+    else:
+        count = write_directory(records, args.out, max_workers=args.workers)
+    print(f"exported {count} file(s)")
+
+
+if __name__ == "__main__":
+    main()
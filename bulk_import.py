@@ -0,0 +1,130 @@
+import io
+import json
+
+from spec_schema import SPEC_BY_NAME, decode_spec
+
+# ========== 批次開案（CSV / Excel 匯入） ==========
+# 上傳檔每列一個專案，欄位順序同 SHEET_HEADERS（第一列可以是標題列，也可以直接是資料）。
+# 檢查規則與表單頁相同，以整欄（向量化）方式檢查：
+#   - 客戶資訊、開案資訊（不含 Schedule）不可空白，日期需可解析
+#   - 規格資訊至少一種方案：Spec_Data（JSON，與工作表相同格式）或 Spec_Type（方案名稱以 "," 分隔）
+#   - 專案編號一律由系統配發，上傳檔中不可填寫（避免把已開案的資料重複匯入）
+# 通過檢查的列依專案代碼排序後一次領一段連續流水號，同一個代碼的專案編號會是連續的。
+
+CUSTOMER_FIELDS = ["ODM_Customers", "Brand_Customers", "Application_Purpose", "Project_Name", "Proposal_Date"]
+PROJECT_FIELDS = ["Product_Application", "Cooling_Solution", "Delivery_Location", "Sample_Date", "Sample_Qty", "Demand_Qty"]
+DATE_FIELDS = ["Proposal_Date", "Sample_Date"]
+ROW = "Row"  # 上傳檔中的列號（含標題列，方便對照）
+ERRORS = "Errors"
+
+
+def read_upload(data, filename, headers):
+    # 讀成全部是字串的 DataFrame，欄位為 headers（缺少的欄位補空白），另加 Row 欄
+    import pandas as pd
+
+    if str(filename).lower().endswith((".xlsx", ".xlsm")):
+        raw = pd.read_excel(io.BytesIO(data), dtype=str, header=None).fillna("")
+    else:
+        raw = pd.read_csv(io.BytesIO(data), dtype=str, header=None, keep_default_na=False, encoding="utf-8-sig")
+    raw = raw.apply(lambda col: col.str.strip())
+
+    first = list(raw.iloc[0]) if len(raw) else []
+    named = [v for v in first if v in headers]
+    if named and len(named) * 2 >= len([v for v in first if v]):
+        # 第一列是標題列：依欄名對應，不在 headers 中的欄位忽略
+        raw.columns = [v if v in headers else f"_ignored_{i}" for i, v in enumerate(first)]
+        raw = raw.iloc[1:]
+        offset = 2
+    else:
+        raw = raw.iloc[:, :len(headers)]
+        raw.columns = headers[:raw.shape[1]]
+        offset = 1
+
+    frame = pd.DataFrame({h: raw[h] if h in raw.columns else "" for h in headers}, index=raw.index, dtype="string")
+    frame = frame.fillna("")
+    frame.insert(0, ROW, [i + offset for i in range(len(frame))])
+    # 整列空白（Excel 常見的尾端空列）直接略過
+    return frame[frame[headers].ne("").any(axis=1)].reset_index(drop=True)
+
+
+def parse_specs(spec_type, spec_data):
+    # 回傳 (specs, 錯誤訊息)
+    if spec_data:
+        specs = decode_spec(spec_data)
+        if not specs:
+            return {}, "Spec_Data 格式錯誤"
+    else:
+        names = [n.strip() for n in str(spec_type).split(",") if n.strip()]
+        specs = decode_spec(json.dumps({n: {} for n in names}))
+    unknown = [n for n in specs if n not in SPEC_BY_NAME]
+    if unknown:
+        return specs, f"未知的散熱方案：{', '.join(unknown)}"
+    if not specs:
+        return specs, "規格資訊請至少選擇一種方案"
+    return specs, ""
+
+
+def validate(frame, user, allow_other_users=False):
+    # 回傳加上 Errors 欄（空字串代表通過）與 Spec 欄（dict）的新 DataFrame；日期統一成 YYYY/MM/DD
+    import pandas as pd
+
+    frame = frame.copy()
+    errors = pd.Series("", index=frame.index, dtype="string")
+
+    def flag(mask, message):
+        nonlocal errors
+        errors = errors.mask(mask, errors + message + "；")
+
+    frame["Sales_User"] = frame["Sales_User"].mask(frame["Sales_User"].eq(""), user)
+    if not allow_other_users:
+        flag(frame["Sales_User"].ne(user), "只能匯入自己的專案")
+    flag(frame["Project_Number"].ne(""), "專案編號由系統配發，請留空")
+    flag(frame[CUSTOMER_FIELDS].eq("").any(axis=1), "客戶資訊未完成填寫")
+    flag(frame[PROJECT_FIELDS].eq("").any(axis=1), "開案資訊未完成填寫")
+    for col in DATE_FIELDS:
+        parsed = pd.to_datetime(frame[col], errors="coerce", format="mixed")
+        flag(frame[col].ne("") & parsed.isna(), f"{col} 日期格式錯誤")
+        frame[col] = parsed.dt.strftime("%Y/%m/%d").fillna(frame[col])
+
+    # 規格欄位每種組合只解析一次
+    pairs = list(zip(frame["Spec_Type"], frame["Spec_Data"]))
+    parsed_specs = {pair: parse_specs(*pair) for pair in set(pairs)}
+    frame["Spec"] = [parsed_specs[pair][0] for pair in pairs]
+    spec_errors = pd.Series([parsed_specs[pair][1] for pair in pairs], index=frame.index, dtype="string")
+    errors = errors + spec_errors.mask(spec_errors.ne(""), spec_errors + "；")
+
+    frame[ERRORS] = errors.str.rstrip("；")
+    return frame
+
+
+def assign_numbers(frame, prefix_fn, allocate):
+    # 通過檢查的列依專案代碼排序，一次配發 len 個流水號；回傳 Project_Number Series（未通過的列為空白）
+    import pandas as pd
+
+    numbers = pd.Series("", index=frame.index, dtype="string")
+    valid = frame[frame[ERRORS].eq("")]
+    if valid.empty:
+        return numbers
+    # 代碼規則與 generate_project_number 相同，每種組合只算一次
+    keys = list(zip(valid["ODM_Customers"], valid["Product_Application"], valid["Cooling_Solution"]))
+    prefixes = {key: prefix_fn(*key) for key in set(keys)}
+    prefix = pd.Series([prefixes[k] for k in keys], index=valid.index)
+    order = prefix.sort_values(kind="stable").index
+    seqs = allocate(len(order))
+    numbers[order] = [f"{prefix[i]}-{seq:03d}" for i, seq in zip(order, seqs)]
+    return numbers
+
+
+def to_records(frame, headers):
+    # 已配發編號的列轉成紀錄（Spec_Type 為規格 dict，格式同表單頁的 record）
+    records = []
+    for row in frame[frame[ERRORS].eq("") & frame["Project_Number"].ne("")].to_dict("records"):
+        record = {h: row[h] for h in headers}
+        record["Spec_Type"] = row["Spec"]
+        records.append(record)
+    return records
+
+
+def template_csv(headers):
+    # 空白匯入範本（只有標題列），加 BOM 讓 Excel 以 UTF-8 開啟
+    return ("\ufeff" + ",".join(headers) + "\n").encode("utf-8")
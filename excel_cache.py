@@ -0,0 +1,169 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# ========== 產生的 Excel 檔快取（所有 session 共用） ==========
+# 以紀錄內容的雜湊當 key，同一份內容只產生一次 Excel：
+#   - 記憶體：LRU，總大小不超過 max_bytes，超過 ttl 秒視為過期
+#   - 磁碟：寫入時同時存一份到 spill_dir（程式重啟後仍可使用），記憶體放不下的就只留在磁碟，
+#           磁碟總大小超過 max_disk_bytes 時刪除最舊的檔案
+# session_state 只需要記住 key，下載時再從快取取出 bytes。
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(values, salt=""):
+    # values 需可轉成 JSON（無法轉換的型別用 str 表示），salt 用來區分模板版本
+    payload = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{salt}\x1f{payload}".encode("utf-8")).hexdigest()
+
+
+class ExcelCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=86400, spill_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = collections.OrderedDict()  # key -> (bytes, 存入時間)
+        self._bytes = 0
+        self._mutex = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    # ---- 讀寫 ----
+    def get(self, key):
+        now = time.time()
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self._drop(key)
+
+        data = self._read_disk(key, now)
+        with self._mutex:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, data, now)
+        return data
+
+    def put(self, key, data):
+        now = time.time()
+        self._write_disk(key, data)
+        with self._mutex:
+            if key in self._entries:
+                self._drop(key)
+            self._store(key, data, now)
+
+    def has(self, key):
+        # 只檢查是否存在，不計入命中統計
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[1] <= self.ttl:
+                return True
+        return bool(self.spill_dir) and os.path.exists(self._path(key))
+
+    def get_or_render(self, key, render):
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    # ---- 記憶體 ----
+    def _store(self, key, data, now):
+        if len(data) > self.max_bytes:
+            return  # 單一檔案超過上限只留在磁碟
+        self._entries[key] = (data, now)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            old_key, _ = next(iter(self._entries.items()))
+            self._drop(old_key)
+            self.evictions += 1
+
+    def _drop(self, key):
+        data, _ = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    # ---- 磁碟 ----
+    def _path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.xlsx")
+
+    def _read_disk(self, key, now):
+        if not self.spill_dir:
+            return None
+        path = self._path(key)
+        try:
+            if now - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.spill_dir:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._prune_disk()
+        except OSError as e:  # 磁碟寫入失敗時只用記憶體快取
+            logger.warning("excel cache spill failed: %s", e)
+
+    def _disk_files(self):
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith(".xlsx"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _prune_disk(self):
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        now = time.time()
+        for mtime, size, path in files:
+            if total <= self.max_disk_bytes and now - mtime <= self.ttl:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    # ---- 統計 ----
+    def stats(self):
+        with self._mutex:
+            data = {
+                "entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+        lookups = data["hits"] + data["disk_hits"] + data["misses"]
+        data["hit_rate"] = round((data["hits"] + data["disk_hits"]) / lookups, 3) if lookups else None
+        if self.spill_dir:
+            files = self._disk_files()
+            data["disk_entries"] = len(files)
+            data["disk_bytes"] = sum(size for _, size, _ in files)
+        return data
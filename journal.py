@@ -0,0 +1,151 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+# ========== 送出日誌（本機 SQLite，WAL 模式） ==========
+# 每筆送出先寫進日誌才算受理，Google Sheet 無法連線或配額用完時資料也不會遺失。
+# 狀態：pending（等待寫入）-> flushing（某個程序正在寫入）-> synced（已寫入）
+# uncertain=1 代表上一次寫入結果不明（逾時、5xx、程序中斷），可能已經寫進工作表，
+# 重新寫入前必須先用 Submission_Id 到工作表確認，避免重複。
+# 同一個日誌檔可以由多個程序共用：claim 以交易方式認領，認領超過 claim_timeout 秒沒有完成視為中斷。
+
+PENDING = "pending"
+FLUSHING = "flushing"
+SYNCED = "synced"
+
+
+class SubmitJournal:
+    def __init__(self, path, claim_timeout=300):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA synchronous=FULL")  # 受理前一定要落地
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticket TEXT NOT NULL UNIQUE,
+                    row TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    uncertain INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT NOT NULL DEFAULT '',
+                    owner TEXT NOT NULL DEFAULT '',
+                    claimed_at REAL,
+                    accepted_at REAL NOT NULL,
+                    synced_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_journal_status ON journal (status, id);
+            """)
+
+    # ---- 寫入 ----
+    def append(self, ticket, row):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO journal (ticket, row, accepted_at) VALUES (?, ?, ?)",
+                (ticket, json.dumps(list(row), ensure_ascii=False), time.time()),
+            )
+
+    def claim(self, tickets):
+        # 認領可寫入的資料列（pending，或認領逾時的 flushing），回傳 {ticket: uncertain}
+        if not tickets:
+            return {}
+        now = time.time()
+        marks = ", ".join("?" for _ in tickets)
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"""SELECT ticket, status, uncertain, owner, claimed_at FROM journal
+                    WHERE ticket IN ({marks}) AND status != ?""",
+                (*tickets, SYNCED),
+            ).fetchall()
+            claimed = {}
+            for ticket, status, uncertain, owner, claimed_at in rows:
+                if status == FLUSHING and owner != self.owner and now - (claimed_at or 0) < self.claim_timeout:
+                    continue  # 其他程序正在寫入
+                # 認領中斷的 flushing 時，上一個程序可能已經寫入
+                claimed[ticket] = bool(uncertain or status == FLUSHING)
+            if claimed:
+                conn.executemany(
+                    "UPDATE journal SET status = ?, owner = ?, claimed_at = ?, attempts = attempts + 1 "
+                    "WHERE ticket = ?",
+                    [(FLUSHING, self.owner, now, t) for t in claimed],
+                )
+            return claimed
+
+    def release(self, tickets, error="", uncertain=True):
+        # 寫入失敗：放回 pending。uncertain=True 代表這次寫入結果不明；
+        # 之前已經不明的資料列在確認（mark_certain）之前維持不明
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE journal SET status = ?, uncertain = MAX(uncertain, ?), error = ?, owner = '', claimed_at = NULL "
+                "WHERE ticket = ? AND status = ? AND owner = ?",
+                [(PENDING, int(uncertain), error, t, FLUSHING, self.owner) for t in tickets],
+            )
+
+    def mark_certain(self, tickets):
+        # 已到工作表確認過不存在的資料列
+        with self._transaction() as conn:
+            conn.executemany("UPDATE journal SET uncertain = 0 WHERE ticket = ?", [(t,) for t in tickets])
+
+    def mark_synced(self, tickets):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE journal SET status = ?, uncertain = 0, error = '', owner = '', synced_at = ? WHERE ticket = ?",
+                [(SYNCED, now, t) for t in tickets],
+            )
+
+    def prune(self, older_than=7 * 86400):
+        # 刪除已寫入且超過 older_than 秒的紀錄
+        with self._transaction() as conn:
+            return conn.execute(
+                "DELETE FROM journal WHERE status = ? AND synced_at < ?", (SYNCED, time.time() - older_than)
+            ).rowcount
+
+    # ---- 查詢 ----
+    def unsynced(self, limit=500):
+        # 依受理順序回傳尚未寫入的 (ticket, row)
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "SELECT ticket, row FROM journal WHERE status != ? ORDER BY id LIMIT ?", (SYNCED, limit)
+            )
+            return [(ticket, json.loads(row)) for ticket, row in cur]
+
+    def status(self, ticket):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT status, error, attempts, accepted_at, synced_at, row FROM journal WHERE ticket = ?", (ticket,)
+            ).fetchone()
+        if not row:
+            return None
+        status, error, attempts, accepted_at, synced_at, data = row
+        return {"status": status, "error": error, "attempts": attempts, "accepted_at": accepted_at,
+                "synced_at": synced_at, "row": json.loads(data)}
+
+    def counts(self):
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM journal GROUP BY status").fetchall())
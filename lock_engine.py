@@ -0,0 +1,161 @@
+import datetime
+import threading
+import time
+
+# ========== Lock 機制（依專案代碼分開上鎖） ==========
+# Lock 只保護同一個專案代碼（ODM/產品應用/散熱方式，例如 CPNBAC）的開案流程，
+# 不同代碼的使用者可以同時在「✅ 完成」與「💾 確認送出」之間。
+# 每個代碼一列 [Key, User, Locked_Time, Heartbeat]（Google Sheet 為 Locks 工作表），由儲存後端提供：
+#   read_locks()                                  -> {key: (user, locked_time, heartbeat)}   一次讀取全部
+#   write_lock(key, user, locked_time, heartbeat)                                           一次寫入
+#   clear_lock(key, user, locked_time)            -> 持有者與取得時間都相符才整列清除，回傳是否清除
+# 取得 Lock 最多 2 次 API（讀 + 寫），釋放通常 2 次（讀回該列 + 清除）；本程序還不知道該 key 在第幾列時
+# （重新啟動後、或 Lock 由其他程序建立）要先 read_locks 一次，最多 3 次。
+# 租期 lease_seconds 從最後一次心跳（沒有心跳則從取得時間）起算，超過視為失效，其他人可直接取得；
+# 預覽頁每 heartbeat_seconds 秒送一次心跳續約，關掉分頁後 Lock 很快就會釋出。
+# 在 preempt_window 秒內（從取得時間起算，心跳不會延長），同一個代碼下優先順序較高
+# （USER_PRIORITY 數字較小）的使用者可以搶走 Lock（沿用原本規則）。
+# 讀取 -> 判斷 -> 寫入 不是原子操作：同一個程序內（所有 session 共用）以每個 key 一個 mutex 串行化，
+# 不同 key 互不影響；跨程序同時取得同一個 key 仍可能兩邊都成功（與原本的全域 Lock 相同）。
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class LockEngine:
+    def __init__(self, storage, priority, tz, lease_seconds=120, preempt_window=3, cache_seconds=5,
+                 heartbeat_seconds=30):
+        self.storage = storage
+        self.priority = priority
+        self.tz = tz
+        self.lease_seconds = lease_seconds
+        self.preempt_window = preempt_window
+        self.cache_seconds = cache_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._cache = None  # (讀取時間, {key: (user, locked_time, heartbeat)})
+        self._mutex = threading.Lock()
+        self._key_mutexes = {}
+
+    def _key_mutex(self, key):
+        with self._mutex:
+            return self._key_mutexes.setdefault(key, threading.Lock())
+
+    # ---- 時間 ----
+    def now(self):
+        return datetime.datetime.now(self.tz)
+
+    def parse_time(self, text):
+        try:
+            naive = datetime.datetime.strptime(str(text), TIME_FORMAT)
+        except ValueError:
+            return None
+        if hasattr(self.tz, "localize"):
+            return self.tz.localize(naive)
+        return naive.replace(tzinfo=self.tz)
+
+    def is_expired(self, locked_time, heartbeat="", now=None):
+        times = [t for t in (self.parse_time(locked_time), self.parse_time(heartbeat)) if t is not None]
+        if not times:
+            return True
+        return ((now or self.now()) - max(times)).total_seconds() > self.lease_seconds
+
+    # ---- 狀態快取（登入頁只需要知道目前持有者，可接受幾秒內的舊資料） ----
+    def _remember(self, key, user, locked_time, heartbeat=""):
+        with self._mutex:
+            if self._cache is not None:
+                self._cache[1][key] = (user, locked_time, heartbeat)
+
+    def states(self, max_age=None):
+        max_age = self.cache_seconds if max_age is None else max_age
+        with self._mutex:
+            cached = self._cache
+        if cached and time.monotonic() - cached[0] <= max_age:
+            return dict(cached[1])
+        locks = self.storage.read_locks()
+        with self._mutex:
+            self._cache = (time.monotonic(), dict(locks))
+        return dict(locks)
+
+    def state(self, key, max_age=None):
+        return self.states(max_age).get(key, ("", "", ""))
+
+    def holder(self, key, max_age=None):
+        # 目前有效的持有者（租期已過視為沒有人持有）
+        user, locked_time, heartbeat = self.state(key, max_age)
+        if not user or self.is_expired(locked_time, heartbeat):
+            return ""
+        return user
+
+    def held_by(self, username, max_age=None):
+        # username 目前持有（租期內）的所有代碼
+        now = self.now()
+        return sorted(key for key, (user, locked_time, heartbeat) in self.states(max_age).items()
+                      if user == username and not self.is_expired(locked_time, heartbeat, now))
+
+    # ---- 取得 / 心跳 / 釋放 ----
+    def acquire(self, username, key):
+        with self._key_mutex(key):
+            return self._acquire(username, key)
+
+    def _acquire(self, username, key):
+        now = self.now()
+        stamp = now.strftime(TIME_FORMAT)
+        current_user, locked_time, heartbeat = self.state(key, max_age=0)
+
+        if not current_user or self.is_expired(locked_time, heartbeat, now):
+            return self._take(key, username, stamp)
+
+        if current_user == username:
+            # 自己持有：租期過半才續約，避免每次按鈕都寫入
+            if not self._fresh(locked_time, heartbeat, now, self.lease_seconds / 2):
+                return self._renew(key, username, locked_time, stamp)
+            return True, ""
+
+        time_diff = (now - self.parse_time(locked_time)).total_seconds()
+        if time_diff <= self.preempt_window:
+            current_pri = self.priority.get(current_user, 99)
+            new_pri = self.priority.get(username, 99)
+            if new_pri < current_pri:
+                return self._take(key, username, stamp)
+        return False, current_user
+
+    def heartbeat(self, username, key):
+        # 預覽頁定期呼叫：仍由自己持有時續約，回傳 (是否仍持有, 目前持有者)
+        with self._key_mutex(key):
+            return self._heartbeat(username, key)
+
+    def _heartbeat(self, username, key):
+        now = self.now()
+        current_user, locked_time, heartbeat = self.state(key, max_age=0)
+        if current_user != username or self.is_expired(locked_time, heartbeat, now):
+            return False, "" if self.is_expired(locked_time, heartbeat, now) else current_user
+        if not self._fresh(locked_time, heartbeat, now, self.heartbeat_seconds / 2):
+            self._renew(key, username, locked_time, now.strftime(TIME_FORMAT))
+        return True, ""
+
+    def _fresh(self, locked_time, heartbeat, now, seconds):
+        # 最後一次續約（或取得）距今不到 seconds 秒
+        times = [t for t in (self.parse_time(locked_time), self.parse_time(heartbeat)) if t is not None]
+        return bool(times) and (now - max(times)).total_seconds() < seconds
+
+    def _take(self, key, username, stamp):
+        self.storage.write_lock(key, username, stamp, "")
+        self._remember(key, username, stamp)
+        return True, ""
+
+    def _renew(self, key, username, locked_time, stamp):
+        # 只更新心跳時間，取得時間不變（搶 Lock 的時間窗不會因為續約重新開始）
+        self.storage.write_lock(key, username, locked_time, stamp)
+        self._remember(key, username, locked_time, stamp)
+        return True, ""
+
+    def release(self, username, key):
+        with self._key_mutex(key):
+            with self._mutex:
+                cached = self._cache[1].get(key) if self._cache else None
+            locked_time = cached[1] if cached and cached[0] == username else ""
+            if self.storage.clear_lock(key, username, locked_time):
+                self._remember(key, "", "", "")
+            else:
+                # 沒有清除（已經被別人取得或已過期被覆寫）：快取可能是舊的，下次重新讀取
+                with self._mutex:
+                    self._cache = None
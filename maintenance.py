@@ -0,0 +1,29 @@
+# ========== 維護作業（命令列） ==========
+#   python maintenance.py --seed-seq            第一次使用 Seq 工作表時，依目前資料筆數設定起始流水號（已設定過就不變）
+#   python maintenance.py --seed-seq --force    重新依資料筆數對齊起始流水號（清除 Seq 工作表的配發紀錄）
+#   python maintenance.py --sync-to-sheet       SQLite 模式：把本機尚未同步的紀錄 append 到 Google Sheet（可排程執行）
+
+
+def main():
+    import argparse
+
+    import Project
+
+    parser = argparse.ArgumentParser(description="專案申請表維護作業")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--seed-seq", action="store_true", help="設定起始流水號")
+    action.add_argument("--sync-to-sheet", action="store_true", help="SQLite 模式下同步本機紀錄到 Google Sheet")
+    parser.add_argument("--batch-size", type=int, default=500, help="搭配 --sync-to-sheet：每次 append 的筆數")
+    parser.add_argument("--force", action="store_true", help="搭配 --seed-seq：已設定過也重新對齊")
+    args = parser.parse_args()
+
+    if args.seed_seq:
+        print(f"seq base: {Project.migrate_project_seq(force=args.force)}")
+    elif args.sync_to_sheet:
+        if Project.STORAGE_BACKEND != "sqlite":
+            parser.error("--sync-to-sheet 只適用於 STORAGE_BACKEND=sqlite")
+        print(f"synced {Project.export_local_to_google_sheet(batch_size=args.batch_size)} row(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import collections
+import functools
+import json
+import re
+import threading
+import time
+
+# ========== API 呼叫與耗時統計 ==========
+# 兩種紀錄：
+#   call -> 主要函式（acquire_lock、save_to_google_sheet、export_to_template…）每次呼叫的耗時
+#   api  -> 每一次實際送到 Google 的 HTTP 請求（包在 gspread 的 http_client.request 外層）
+# 每筆紀錄都帶著當下的 session / 第幾次重跑 / 頁面（由 main() 在每次重跑開頭設定），
+# 背景執行緒（例如批次寫入）沒有頁面資訊，記為 "background"。
+# 可輸出成 JSON lines（append_jsonl）或 Prometheus 文字格式（prometheus_text）。
+
+BACKGROUND = "background"
+
+
+class Metrics:
+    def __init__(self, max_events=5000, max_reruns=500, jsonl_path=None):
+        self.jsonl_path = jsonl_path  # 設定後每筆紀錄與每次重跑摘要都即時附加到這個檔案
+        self._local = threading.local()
+        self._mutex = threading.Lock()
+        self.events = collections.deque(maxlen=max_events)
+        self.reruns = collections.deque(maxlen=max_reruns)
+        # (kind, name, page) -> [次數, 總秒數, 最大秒數, 錯誤次數]
+        self.totals = collections.defaultdict(lambda: [0, 0.0, 0.0, 0])
+        # session -> {"reruns", "calls", "api_calls", "api_seconds"}
+        self.sessions = collections.defaultdict(lambda: {"reruns": 0, "calls": 0, "api_calls": 0, "api_seconds": 0.0})
+
+    # ---- 重跑範圍 ----
+    def begin_rerun(self, session, rerun, page):
+        self._local.context = {"session": session, "rerun": rerun, "page": page,
+                               "started": time.perf_counter(), "cpu_started": time.thread_time(), "calls": 0, "api_calls": 0, "api_seconds": 0.0}
+
+    def set_page(self, page):
+        ctx = getattr(self._local, "context", None)
+        if ctx:
+            ctx["page"] = page
+
+    def end_rerun(self):
+        ctx = getattr(self._local, "context", None)
+        self._local.context = None
+        if not ctx:
+            return None
+        summary = {
+            "ts": time.time(),
+            "session": ctx["session"],
+            "rerun": ctx["rerun"],
+            "page": ctx["page"],
+            "wall_ms": round((time.perf_counter() - ctx["started"]) * 1000, 2),
+            # Streamlit 每個 session 的腳本在自己的執行緒執行，thread_time 就是這次重跑用掉的 CPU
+            "cpu_ms": round((time.thread_time() - ctx["cpu_started"]) * 1000, 2),
+            "calls": ctx["calls"],
+            "api_calls": ctx["api_calls"],
+            "api_ms": round(ctx["api_seconds"] * 1000, 2),
+        }
+        with self._mutex:
+            self.reruns.append(summary)
+            self.sessions[ctx["session"]]["reruns"] += 1
+        if self.jsonl_path:
+            self.append_jsonl(self.jsonl_path, dict(summary, kind="rerun"))
+        return summary
+
+    def context(self):
+        return getattr(self._local, "context", None) or {"session": BACKGROUND, "rerun": 0, "page": BACKGROUND}
+
+    # ---- 紀錄 ----
+    def record(self, kind, name, seconds, ok=True):
+        ctx = getattr(self._local, "context", None)
+        session = ctx["session"] if ctx else BACKGROUND
+        page = ctx["page"] if ctx else BACKGROUND
+        event = {
+            "ts": time.time(), "kind": kind, "name": name, "ms": round(seconds * 1000, 2), "ok": ok,
+            "session": session, "rerun": ctx["rerun"] if ctx else 0, "page": page,
+        }
+        with self._mutex:
+            self.events.append(event)
+            total = self.totals[(kind, name, page)]
+            total[0] += 1
+            total[1] += seconds
+            total[2] = max(total[2], seconds)
+            total[3] += 0 if ok else 1
+            per_session = self.sessions[session]
+            if kind == "api":
+                per_session["api_calls"] += 1
+                per_session["api_seconds"] += seconds
+            else:
+                per_session["calls"] += 1
+        if self.jsonl_path:
+            self.append_jsonl(self.jsonl_path, event)
+        if ctx:
+            if kind == "api":
+                ctx["api_calls"] += 1
+                ctx["api_seconds"] += seconds
+            else:
+                ctx["calls"] += 1
+
+    def instrument(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                ok = True
+                try:
+                    return func(*args, **kwargs)
+                except BaseException:
+                    ok = False
+                    raise
+                finally:
+                    self.record("call", name, time.perf_counter() - start, ok)
+            return wrapper
+        return decorator
+
+    def instrument_http_client(self, http_client):
+        # gspread 所有 API 請求都經過 http_client.request，在這裡計數與計時
+        original = http_client.request
+
+        @functools.wraps(original)
+        def request(method, endpoint, *args, **kwargs):
+            start = time.perf_counter()
+            ok = True
+            try:
+                return original(method, endpoint, *args, **kwargs)
+            except BaseException:
+                ok = False
+                raise
+            finally:
+                self.record("api", api_operation(method, endpoint), time.perf_counter() - start, ok)
+
+        http_client.request = request
+        return http_client
+
+    # ---- 查詢 ----
+    def summary(self, page=None):
+        with self._mutex:
+            items = list(self.totals.items())
+        rows = []
+        for (kind, name, p), (count, seconds, peak, errors) in sorted(items):
+            if page and p != page:
+                continue
+            rows.append({"kind": kind, "name": name, "page": p, "count": count, "errors": errors,
+                         "avg_ms": round(seconds / count * 1000, 1), "max_ms": round(peak * 1000, 1),
+                         "total_ms": round(seconds * 1000, 1)})
+        return rows
+
+    def session_summary(self, session):
+        with self._mutex:
+            data = dict(self.sessions.get(session, {}))
+        if data:
+            data["api_ms"] = round(data.pop("api_seconds") * 1000, 1)
+        return data
+
+    def recent_reruns(self, session=None, limit=20):
+        with self._mutex:
+            reruns = list(self.reruns)
+        if session:
+            reruns = [r for r in reruns if r["session"] == session]
+        return reruns[-limit:]
+
+    # ---- 輸出 ----
+    def jsonl(self):
+        with self._mutex:
+            lines = [json.dumps(e, ensure_ascii=False) for e in self.events]
+            lines += [json.dumps(dict(r, kind="rerun"), ensure_ascii=False) for r in self.reruns]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def append_jsonl(self, path, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._mutex:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def prometheus_text(self, prefix="project_form"):
+        with self._mutex:
+            items = sorted(self.totals.items())
+        lines = []
+        for kind, label in (("call", "calls"), ("api", "api_requests")):
+            metric = f"{prefix}_{label}"
+            lines.append(f"# HELP {metric}_total Number of {kind} events by name and page.")
+            lines.append(f"# TYPE {metric}_total counter")
+            for (k, name, page), (count, _, _, _) in items:
+                if k == kind:
+                    lines.append(f'{metric}_total{{name="{_escape(name)}",page="{_escape(page)}"}} {count}')
+            lines.append(f"# HELP {metric}_errors_total Number of failed {kind} events.")
+            lines.append(f"# TYPE {metric}_errors_total counter")
+            for (k, name, page), (_, _, _, errors) in items:
+                if k == kind:
+                    lines.append(f'{metric}_errors_total{{name="{_escape(name)}",page="{_escape(page)}"}} {errors}')
+            lines.append(f"# HELP {metric}_seconds_sum Total seconds spent in {kind} events.")
+            lines.append(f"# TYPE {metric}_seconds_sum counter")
+            for (k, name, page), (_, seconds, _, _) in items:
+                if k == kind:
+                    lines.append(f'{metric}_seconds_sum{{name="{_escape(name)}",page="{_escape(page)}"}} {seconds:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def api_operation(method, endpoint):
+    # 把 URL 轉成簡短的操作名稱，例如 values.get、values:append、:batchUpdate、drive.files
+    path = str(endpoint).split("?")[0]
+    if "googleapis.com/drive" in path:
+        return "drive.files"
+    last = path.rstrip("/").rsplit("/", 1)[-1]
+    if ":" in last and not re.search(r"![A-Z]*\d*(:[A-Z]*\d*)?$", last):
+        op = last.rsplit(":", 1)[-1]
+        return f"values:{op}" if "/values" in path else f":{op}"
+    if "/values/" in path:
+        return f"values.{method.lower()}"
+    return f"spreadsheets.{method.lower()}"
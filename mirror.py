@@ -0,0 +1,208 @@
+import hashlib
+import threading
+import time
+
+# ========== Python 工作表本機鏡像 ==========
+# 在程序記憶體中保留一份註冊表（Python 工作表）副本，讀取一律走記憶體：
+#   - 超過 ttl 秒才向後端同步一次，而且只讀「最後已知那一列」之後的資料（delta sync）
+#   - 重疊讀回的最後已知列內容不同，或定期檢查的 Project_Number 欄位筆數／雜湊不符，
+#     代表有人在工作表上手動修改，才整張重新下載（full resync）
+#   - meta() 回傳同步時間、資料年齡等資訊，畫面可以顯示資料新舊程度
+#   - seed() 可用磁碟上的快照（analytics.RegisterSnapshot）當起點，啟動後只需增量同步
+
+DATE_COLUMNS = {
+    "Proposal_Date": "%Y/%m/%d",
+    "Sample_Date": "%Y/%m/%d",
+    "Update_Time": "%Y/%m/%d %H:%M",
+}
+
+
+def _column_hash(values):
+    digest = hashlib.sha1()
+    for value in values:
+        digest.update(str(value).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class RegisterMirror:
+    def __init__(self, storage, headers, ttl=60, verify_interval=300, key_column="Project_Number"):
+        self.storage = storage
+        self.headers = list(headers)
+        self.ttl = ttl
+        self.verify_interval = verify_interval
+        self.key_column = key_column
+        self._key_idx = self.headers.index(key_column)
+
+        self._rows = []
+        self._df = None
+        self._synced_at = None
+        self._verified_at = None
+        self._full_synced_at = None
+        self._full_syncs = 0
+        self._delta_syncs = 0
+        self._version = 0  # 資料列有變動就加一
+        self._indexes = {}  # 欄位 -> (值的集合, 已建索引的筆數)，contains() 用
+        self._seeded = False
+        self._mutex = threading.RLock()
+
+    # ---- 同步 ----
+    def _normalize(self, rows):
+        size = len(self.headers)
+        return [[("" if v is None else str(v)) for v in (list(r)[:size] + [""] * (size - len(r)))] for r in rows]
+
+    def full_sync(self):
+        with self._mutex:
+            self._rows = self._normalize(self.storage.fetch_rows(0))
+            self._df = None
+            self._indexes = {}
+            now = time.time()
+            self._synced_at = self._verified_at = self._full_synced_at = now
+            self._full_syncs += 1
+            self._version += 1
+
+    def sync(self):
+        with self._mutex:
+            if self._synced_at is None:
+                return self.full_sync()
+
+            known = len(self._rows)
+            if known == 0:
+                fresh = self._normalize(self.storage.fetch_rows(0))
+                overlap_ok = True
+            else:
+                # 多讀回最後一列，用來確認既有資料沒有被改動
+                fetched = self._normalize(self.storage.fetch_rows(known - 1))
+                overlap_ok = bool(fetched) and fetched[0] == self._rows[-1]
+                fresh = fetched[1:]
+            if not overlap_ok:
+                return self.full_sync()
+
+            now = time.time()
+            if self.verify_interval is not None and now - (self._verified_at or 0) >= self.verify_interval:
+                keys = [str(v) for v in self.storage.fetch_column(self.key_column)]
+                local_keys = [r[self._key_idx] for r in self._rows] + [r[self._key_idx] for r in fresh]
+                if len(keys) != len(local_keys) or _column_hash(keys) != _column_hash(local_keys):
+                    return self.full_sync()
+                self._verified_at = now
+
+            if fresh:
+                self._rows.extend(fresh)
+                self._df = None
+                self._version += 1
+            self._synced_at = now
+            self._delta_syncs += 1
+
+    def _ensure_fresh(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        with self._mutex:
+            if self._synced_at is None or time.time() - self._synced_at > max_age:
+                self.sync()
+
+    def seed(self, rows):
+        # 以快照資料當起點（只在還沒同步過時有效）；標記為過期並立即需要驗證，
+        # 下次讀取會先檢查重疊列與 Project_Number 雜湊，不符就整張重新下載
+        with self._mutex:
+            if self._synced_at is not None:
+                return False
+            self._rows = self._normalize(rows)
+            self._df = None
+            self._indexes = {}
+            self._synced_at = 0
+            self._verified_at = 0
+            self._version += 1
+            self._seeded = True
+            return True
+
+    def reset(self):
+        # 目前的分片被封存（整張換掉）後呼叫：丟掉本機資料，下次讀取時整張重新下載
+        with self._mutex:
+            self._rows = []
+            self._df = None
+            self._indexes = {}
+            self._synced_at = None
+            self._version += 1
+
+    def invalidate(self):
+        # 自己剛寫入資料時呼叫，下次讀取就會做一次增量同步
+        with self._mutex:
+            if self._synced_at is not None:
+                self._synced_at = 0
+
+    # ---- 讀取（記憶體） ----
+    def loaded(self):
+        # 記憶體中已經有資料（同步過或由快照 seed）；還沒有時任何讀取都會先整張下載
+        with self._mutex:
+            return self._synced_at is not None
+
+    def row_count(self, max_age=None):
+        self._ensure_fresh(max_age)
+        return len(self._rows)
+
+    def records(self, max_age=None):
+        self._ensure_fresh(max_age)
+        with self._mutex:
+            rows = list(self._rows)
+        return [dict(zip(self.headers, row)) for row in rows]
+
+    def find(self, column, value, max_age=None):
+        # 由最新一筆往回找，回傳第一筆符合的紀錄（同一個專案編號重複送出時取最後一筆）
+        self._ensure_fresh(max_age)
+        idx = self.headers.index(column)
+        value = str(value).strip()
+        with self._mutex:
+            for row in reversed(self._rows):
+                if row[idx].strip() == value:
+                    return dict(zip(self.headers, row))
+        return None
+
+    def contains(self, column, value, max_age=None):
+        # 欄位值索引：第一次查詢時建立，之後只補增量同步新增的列，整張重新下載後重建
+        self._ensure_fresh(max_age)
+        idx = self.headers.index(column)
+        with self._mutex:
+            values, indexed = self._indexes.get(column, (set(), 0))
+            values.update(row[idx].strip() for row in self._rows[indexed:])
+            self._indexes[column] = (values, len(self._rows))
+            return str(value).strip() in values
+
+    def rows_since(self, start, max_age=None):
+        # 回傳 (generation, version, 第 start 筆之後的資料列)；generation 改變代表整張重新下載過
+        self._ensure_fresh(max_age)
+        with self._mutex:
+            return self._full_syncs, self._version, self._rows[start:]
+
+    def page(self, start, limit, max_age=None):
+        # 第 start 筆起最多 limit 筆（只複製這一段，分段匯出用）
+        self._ensure_fresh(max_age)
+        with self._mutex:
+            return self._rows[start:start + limit]
+
+    def dataframe(self, max_age=None):
+        # 欄位型別：日期欄轉成 datetime，其餘為 string；同一份資料只建一次
+        self._ensure_fresh(max_age)
+        with self._mutex:
+            if self._df is None:
+                import pandas as pd
+
+                df = pd.DataFrame(self._rows, columns=self.headers, dtype="string")
+                for col, fmt in DATE_COLUMNS.items():
+                    if col in df.columns:
+                        df[col] = pd.to_datetime(df[col], format=fmt, errors="coerce")
+                self._df = df
+            return self._df
+
+    def meta(self):
+        with self._mutex:
+            now = time.time()
+            age = None if not self._synced_at else now - self._synced_at
+            return {
+                "rows": len(self._rows),
+                "synced_at": self._synced_at or None,
+                "full_synced_at": self._full_synced_at,
+                "age_seconds": age,
+                "stale": age is None or age > self.ttl,
+                "full_syncs": self._full_syncs,
+                "delta_syncs": self._delta_syncs,
+                "seeded": self._seeded,
+            }
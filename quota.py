@@ -0,0 +1,217 @@
+import collections
+import functools
+import heapq
+import itertools
+import threading
+import time
+
+# ========== Google API 配額排程（token bucket，全程序共用） ==========
+# 所有 session 共用同一個服務帳號，也就共用同一份每分鐘配額。每個 HTTP 請求送出前先向排程器領一個 token：
+#   - 讀取（GET）與寫入（其他方法）各一個 bucket，對應 Sheets API 的讀／寫配額；Drive 請求不受限
+#   - bucket 容量為 burst，每秒補 (per_minute - burst) / 60 個，任何 60 秒內最多用掉 per_minute 個
+#   - 沒有 token 時不回錯誤，排隊等待；排隊中依 USER_PRIORITY 的順序（數字小的先），同順位先到先出
+#   - 沒有登入使用者的請求（登入頁）排在所有使用者之後，背景執行緒（批次寫入、暖機）排在最後
+#   - 收到 429 時把該 bucket 清空並暫停 cooldown 秒
+# 目前使用者由 set_user() 記在執行緒上（main() 每次重跑開頭設定），丟到其他執行緒執行的工作用 bind() 帶過去。
+
+READ = "read"
+WRITE = "write"
+
+
+class _Bucket:
+    def __init__(self, name, per_minute, burst):
+        self.name = name
+        self.capacity = max(1, min(burst, per_minute))
+        self.rate = max(per_minute - self.capacity, 1) / 60.0  # 每秒補充的 token
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters = []  # heap: (priority, 排隊序號)
+        self.granted = 0
+        self.throttled = 0  # 需要排隊的次數
+        self.rejected = 0  # 仍然收到 429 的次數
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        # 距離下一個 token 可用的秒數
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class QuotaScheduler:
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, burst=10, priorities=None,
+                 cooldown=10.0, max_samples=2000):
+        self.priorities = dict(priorities or {})
+        self.cooldown = cooldown
+        self._buckets = {
+            READ: _Bucket(READ, reads_per_minute, burst),
+            WRITE: _Bucket(WRITE, writes_per_minute, burst),
+        }
+        lowest = max(self.priorities.values(), default=0)
+        self.anonymous_priority = lowest + 1
+        self.background_priority = lowest + 2
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._local = threading.local()
+        # (bucket, priority) -> 最近的等待秒數
+        self._waits = collections.defaultdict(lambda: collections.deque(maxlen=max_samples))
+        self._wait_totals = collections.defaultdict(lambda: [0, 0.0, 0.0])  # 次數, 總秒數, 最大秒數
+
+    # ---- 目前使用者 ----
+    def set_user(self, user):
+        self._local.user = user
+
+    def current_priority(self):
+        user = getattr(self._local, "user", None)
+        if user is None:
+            return self.background_priority
+        return self.priorities.get(user, self.anonymous_priority)
+
+    def bind(self, func):
+        # 把呼叫端的使用者帶到執行 func 的執行緒（ThreadPoolExecutor 等）
+        user = getattr(self._local, "user", None)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, "user", None)
+            self._local.user = user
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.user = previous
+        return wrapper
+
+    # ---- 領取 token ----
+    def acquire(self, kind=READ, priority=None):
+        # 阻塞到拿到 token 為止，回傳等待秒數
+        bucket = self._buckets[kind]
+        priority = self.current_priority() if priority is None else priority
+        start = time.monotonic()
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(bucket.waiters, entry)
+            queued = False
+            while True:
+                now = time.monotonic()
+                bucket.refill(now)
+                delay = bucket.delay(now)
+                if bucket.waiters[0] == entry and delay <= 0:
+                    break
+                queued = True
+                # 排在最前面的等到下一個 token；其他人等被叫醒（或最多 delay 秒後再檢查一次）
+                self._cond.wait(delay if bucket.waiters[0] == entry else max(delay, 0.05))
+            heapq.heappop(bucket.waiters)
+            bucket.tokens -= 1
+            bucket.granted += 1
+            bucket.throttled += queued
+            waited = time.monotonic() - start
+            self._waits[(kind, priority)].append(waited)
+            total = self._wait_totals[(kind, priority)]
+            total[0] += 1
+            total[1] += waited
+            total[2] = max(total[2], waited)
+            self._cond.notify_all()  # 下一位變成最前面
+        return waited
+
+    def penalize(self, kind):
+        # 仍然收到 429：配額設定比實際寬鬆或有其他程式共用，清空 bucket 並暫停一段時間
+        bucket = self._buckets[kind]
+        with self._cond:
+            bucket.refill(time.monotonic())
+            bucket.tokens = 0.0
+            bucket.paused_until = time.monotonic() + self.cooldown
+            bucket.rejected += 1
+
+    def wrap_http_client(self, http_client):
+        # gspread 所有 API 請求都經過 http_client.request，送出前先領 token
+        original = http_client.request
+
+        @functools.wraps(original)
+        def request(method, endpoint, *args, **kwargs):
+            kind = request_kind(method, endpoint)
+            if kind is None:
+                return original(method, endpoint, *args, **kwargs)
+            self.acquire(kind)
+            try:
+                return original(method, endpoint, *args, **kwargs)
+            except Exception as exc:
+                if getattr(getattr(exc, "response", None), "status_code", None) == 429:
+                    self.penalize(kind)
+                raise
+
+        http_client.request = request
+        return http_client
+
+    # ---- 統計 ----
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            buckets = []
+            for bucket in self._buckets.values():
+                bucket.refill(now)
+                buckets.append({
+                    "bucket": bucket.name,
+                    "per_minute": round(bucket.capacity + bucket.rate * 60),
+                    "tokens": round(bucket.tokens, 2),
+                    "queue_depth": len(bucket.waiters),
+                    "granted": bucket.granted,
+                    "throttled": bucket.throttled,
+                    "rejected": bucket.rejected,
+                    "paused_s": round(max(bucket.paused_until - now, 0.0), 1),
+                })
+            waits = []
+            for (kind, priority), samples in sorted(self._waits.items()):
+                count, seconds, peak = self._wait_totals[(kind, priority)]
+                ordered = sorted(samples)
+                waits.append({
+                    "bucket": kind,
+                    "priority": priority,
+                    "count": count,
+                    "avg_ms": round(seconds / count * 1000, 1),
+                    "p50_ms": round(_percentile(ordered, 50) * 1000, 1),
+                    "p95_ms": round(_percentile(ordered, 95) * 1000, 1),
+                    "max_ms": round(peak * 1000, 1),
+                })
+        return {"buckets": buckets, "waits": waits}
+
+    def prometheus_text(self, prefix="project_form"):
+        data = self.stats()
+        lines = []
+        for name, key, kind, help_text in (
+            ("quota_tokens", "tokens", "gauge", "Tokens currently available."),
+            ("quota_queue_depth", "queue_depth", "gauge", "Requests waiting for a token."),
+            ("quota_granted_total", "granted", "counter", "Requests granted a token."),
+            ("quota_throttled_total", "throttled", "counter", "Requests that had to wait for a token."),
+            ("quota_rejected_total", "rejected", "counter", "Requests rejected with 429 despite the scheduler."),
+        ):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for b in data["buckets"]:
+                lines.append(f'{prefix}_{name}{{bucket="{b["bucket"]}"}} {b[key]}')
+        for name, key, help_text in (
+            ("quota_wait_count", "count", "Number of token waits by bucket and priority."),
+            ("quota_wait_seconds_sum", None, "Total seconds spent waiting for a token."),
+        ):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for w in data["waits"]:
+                value = w[key] if key else w["avg_ms"] * w["count"] / 1000
+                lines.append(f'{prefix}_{name}{{bucket="{w["bucket"]}",priority="{w["priority"]}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def request_kind(method, endpoint):
+    # Drive API（開啟試算表時用檔名查詢）有自己的配額，不經過排程
+    if "googleapis.com/drive" in str(endpoint):
+        return None
+    return READ if str(method).upper() == "GET" else WRITE
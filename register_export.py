@@ -0,0 +1,154 @@
+import csv
+import io
+import os
+
+# ========== 匯出完整註冊表（Python 工作表） ==========
+# 分段讀取（每段 chunk_rows 筆），每段讀完就寫出並釋放，記憶體用量只跟一段的大小有關，不隨總筆數增加：
+#   xlsx     openpyxl write_only 模式，資料列直接寫進暫存的 XML，不建立儲存格物件；保留標題格式、凍結窗格與篩選
+#   csv      UTF-8（含 BOM，Excel 可直接開啟）
+#   parquet  每段一個 row group，全部欄位為字串
+# 資料來源：
+#   storage  直接向儲存後端分段讀取（Google Sheet 每段一次讀取，資料最新）
+#   mirror   從本機鏡像分段複製（不呼叫 API，資料最多舊 MIRROR_TTL_SECONDS 秒）
+# 已封存的分片（shards.py）排在目前的分片之前依序寫出。
+#   python register_export.py --format xlsx --out register.xlsx
+#   python register_export.py --format parquet --out register.parquet --source mirror --chunk-rows 5000
+
+FORMATS = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+HEADER_FILL = "DDEBF7"
+COLUMN_WIDTHS = {"Project_Name": 30, "Spec_Type": 30, "Spec_Data": 60}
+
+
+def storage_chunks(storage, chunk_rows=2000, shard=None):
+    # shard 為 None 代表目前使用中的分片，否則讀取該封存分片（見 shards.py）
+    start = 0
+    while True:
+        rows = storage.fetch_rows(start, chunk_rows) if shard is None else storage.fetch_shard(shard, start, chunk_rows)
+        if rows:
+            yield rows
+        if len(rows) < chunk_rows:
+            return
+        start += len(rows)
+
+
+def mirror_chunks(mirror, chunk_rows=2000, max_age=None):
+    # 第一段依 max_age 決定是否先同步，之後的段落不再同步（同一次匯出的資料一致）
+    start = 0
+    rows = mirror.page(start, chunk_rows, max_age)
+    while rows:
+        yield rows
+        start += len(rows)
+        rows = mirror.page(start, chunk_rows, max_age=float("inf"))
+
+
+def _pad(row, size):
+    row = ["" if v is None else str(v) for v in list(row)[:size]]
+    return row + [""] * (size - len(row))
+
+
+def write_xlsx(chunks, headers, fileobj, progress=None, title="Python"):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    # write_only 模式的欄寬、凍結窗格要在寫入資料列之前設定
+    for i, name in enumerate(headers, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = COLUMN_WIDTHS.get(name, max(len(name) + 4, 14))
+    ws.freeze_panes = "B2"
+
+    font = Font(bold=True)
+    fill = PatternFill("solid", fgColor=HEADER_FILL)
+    align = Alignment(horizontal="center", vertical="center")
+    header = []
+    for name in headers:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font, cell.fill, cell.alignment = font, fill, align
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for rows in chunks:
+        for row in rows:
+            ws.append(_pad(row, len(headers)))
+        count += len(rows)
+        if progress:
+            progress(count)
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(headers))}{count + 1}"
+    wb.save(fileobj)
+    return count
+
+
+def write_csv(chunks, headers, fileobj, progress=None):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(headers)
+    count = 0
+    for rows in chunks:
+        writer.writerows(_pad(row, len(headers)) for row in rows)
+        count += len(rows)
+        if progress:
+            progress(count)
+    text.flush()
+    text.detach()  # 不要關閉呼叫端的 fileobj
+    return count
+
+
+def write_parquet(chunks, headers, fileobj, progress=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(h, pa.string()) for h in headers])
+    count = 0
+    with pq.ParquetWriter(fileobj, schema, compression="zstd") as writer:
+        for rows in chunks:
+            rows = [_pad(row, len(headers)) for row in rows]
+            writer.write_table(pa.table({h: [r[i] for r in rows] for i, h in enumerate(headers)}, schema=schema))
+            count += len(rows)
+            if progress:
+                progress(count)
+    return count
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def write_register(fmt, chunks, headers, fileobj, progress=None):
+    # 回傳匯出筆數
+    return WRITERS[fmt](chunks, headers, fileobj, progress=progress)
+
+
+def register_filename(fmt, day):
+    return f"ProjectRegister_{day:%Y%m%d}{FORMATS[fmt][0]}"
+
+
+def main():
+    import argparse
+    import time
+
+    import Project
+
+    parser = argparse.ArgumentParser(description="匯出完整註冊表（Python 工作表）")
+    parser.add_argument("--out", required=True, help="輸出檔案路徑")
+    parser.add_argument("--format", choices=sorted(FORMATS), default=None, help="預設依副檔名判斷")
+    parser.add_argument("--source", choices=["storage", "mirror"], default="storage")
+    parser.add_argument("--chunk-rows", type=int, default=Project.EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.out)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error(f"無法由檔名判斷格式，請指定 --format（{', '.join(sorted(FORMATS))}）")
+    start = time.perf_counter()
+    with open(args.out, "wb") as f:
+        count = Project.export_register(fmt, f, source=args.source, chunk_rows=args.chunk_rows)
+    print(f"exported {count} row(s) to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+from register_export import storage_chunks, write_parquet
+
+# ========== 註冊表分片（依年度／筆數輪替） ==========
+# Python 工作表只放目前使用中的分片，送出、登入接續、鏡像同步、補寫確認都只讀寫這一張，不會隨年份越來越慢。
+# 輪替條件（mode）：
+#   year   目前分片最後一筆的 Update_Time 早於今年：每年第一次寫入前，把之前的資料整份封存
+#   rows   目前分片達到 max_rows 筆
+#   off    不輪替
+# 封存由儲存後端完成（storage.archive_active，Google Sheet 上改名成 Python_<期間>；rows 模式的期間為日期範圍），
+# 每個期間只封存一次。manifest（Shards 工作表）記錄每個分片的筆數與 Update_Time 範圍。封存後的分片不再變動：
+# 第一次用到時分段下載存成本機 Parquet（archive_dir/<分片>.parquet），之後只讀本機檔案。
+# 依專案編號查詢、批次匯出、統計報表、完整註冊表匯出需要舊資料時才讀封存分片，有日期區間時只讀範圍重疊的分片。
+#   python shards.py --list
+#   python shards.py --rollover             立即封存目前的分片（不論是否到期）
+#   python shards.py --download             預先下載所有封存分片到本機
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y/%m/%d %H:%M"
+MODES = ("year", "rows", "off")
+
+
+def _year(value):
+    text = str(value or "").strip()[:4]
+    return int(text) if text.isdigit() else None
+
+
+def _day(value):
+    try:
+        return datetime.datetime.strptime(str(value or "").strip()[:10], "%Y/%m/%d").date()
+    except ValueError:
+        return None
+
+
+class ShardManager:
+    def __init__(self, storage, mirror, prefix, archive_dir, mode="year", max_rows=0, tz=None,
+                 manifest_ttl=300, chunk_rows=2000):
+        self.storage = storage
+        self.mirror = mirror
+        self.headers = list(mirror.headers)
+        self.prefix = prefix
+        self.archive_dir = archive_dir
+        self.mode = mode if mode in MODES else "off"
+        self.max_rows = max_rows
+        self.tz = tz
+        self.manifest_ttl = manifest_ttl
+        self.chunk_rows = chunk_rows
+        self._mutex = threading.RLock()
+        self._manifest = None
+        self._manifest_at = 0.0
+        self._manifest_syncs = None  # 讀 manifest 時鏡像的 full_syncs；鏡像整張重新下載過（可能別人封存了）就重讀
+        self._checked_year = None  # year 模式：已確認這一年不需要封存
+        self._checked_at = 0.0  # rows 模式：上次檢查筆數的時間
+        self._retry_at = 0.0  # 封存失敗（或別人正在封存）後，這個時間之前不再檢查
+        self.rollovers = 0
+        self.failures = 0
+        self.last_error = None  # (時間, 錯誤訊息)，顯示在管理者的監控面板
+
+    # ---- manifest ----
+    def manifest(self, max_age=None):
+        max_age = self.manifest_ttl if max_age is None else max_age
+        full_syncs = self.mirror.meta()["full_syncs"]
+        with self._mutex:
+            if (self._manifest is None or time.time() - self._manifest_at > max_age
+                    or self._manifest_syncs != full_syncs):
+                self._manifest = self.storage.read_shards()
+                self._manifest_at = time.time()
+                self._manifest_syncs = full_syncs
+            return list(self._manifest)
+
+    def shards_between(self, start=None, end=None):
+        # 與日期區間（含）重疊的封存分片，依封存順序；時間範圍不明的分片一律列入
+        selected = []
+        for shard in self.manifest():
+            first, last = _day(shard["First_Time"]), _day(shard["Last_Time"])
+            if first and last and ((start and last < start) or (end and first > end)):
+                continue
+            selected.append(shard["Shard"])
+        return selected
+
+    # ---- 輪替 ----
+    # 是否到期以儲存後端為準（storage.active_range：Google Sheet 只讀 Update_Time 一欄），不看鏡像：
+    # 鏡像可能還沒同步過，或封存後還留著舊資料。每次寫入前都會呼叫，所以檢查結果要快取：
+    #   year   確認過目前分片沒有今年以前的資料後，到明年才需要再檢查（自己寫入的都是今年的資料）
+    #   rows   每 manifest_ttl 秒最多檢查一次
+    # 檢查或封存失敗時（權限、改名錯誤等）同樣等 manifest_ttl 秒才重試，不會每次寫入都多讀 Update_Time 與 manifest。
+    def _period(self, first, last, now):
+        if self.mode == "rows":
+            first_day, last_day = _day(first) or now.date(), _day(last) or now.date()
+            return f"{first_day:%Y%m%d}-{last_day:%Y%m%d}"
+        first_year, last_year = _year(first) or _year(last) or now.year, _year(last) or now.year
+        return str(last_year) if first_year >= last_year else f"{first_year}-{last_year}"
+
+    def due(self, now=None):
+        # 目前的分片需要封存時回傳期間名稱（例如 "2025"、"2019-2025"），否則回傳 None
+        if self.mode == "off":
+            return None
+        now = now or datetime.datetime.now(self.tz)
+        with self._mutex:
+            if self.mode == "year" and self._checked_year == now.year:
+                return None
+            if self.mode == "rows" and time.time() - self._checked_at < self.manifest_ttl:
+                return None
+            count, first, last = self.storage.active_range()
+            self._checked_at = time.time()
+            last_year = _year(last)
+            if self.mode == "year" and (not count or last_year is None or last_year >= now.year):
+                self._checked_year = now.year
+                return None
+            if self.mode == "rows" and (not self.max_rows or count < self.max_rows):
+                return None
+            return self._period(first, last, now)
+
+    def maybe_rollover(self, now=None):
+        # 寫入前呼叫（背景寫入執行緒），到期才封存；回傳 manifest 列或 None，失敗時記錄錯誤後往外丟
+        with self._mutex:
+            if time.time() < self._retry_at:
+                return None
+            try:
+                period = self.due(now)
+                if period is None:
+                    return None
+                return self.rollover(period, now)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = (datetime.datetime.now(self.tz).strftime(TIME_FORMAT), str(e))
+                self._retry_at = time.time() + self.manifest_ttl
+                raise
+
+    def rollover(self, period=None, now=None):
+        # 分片名稱由期間決定；manifest 已經有同一個期間（例如別的程序剛封存過）就不封存，回傳 None
+        now = now or datetime.datetime.now(self.tz)
+        with self._mutex:
+            if period is None:
+                count, first, last = self.storage.active_range()
+                if not count:
+                    return None
+                period = self._period(first, last, now)
+            name = f"{self.prefix}_{period}"
+            manifest = self.manifest(max_age=0)
+            if any(s["Shard"] == name or s["Period"] == period for s in manifest):
+                logger.warning("shard for period %s already archived, skip rollover", period)
+                # 同一年（rows 模式為 manifest_ttl 秒）內不再重試，留給人工處理（shards.py --list）
+                self._checked_year, self._checked_at = now.year, time.time()
+                return None
+            try:
+                entry = self.storage.archive_active(name, period, now.strftime(TIME_FORMAT))
+            finally:
+                # 不論是自己還是別人封存成功，或只做到一半就失敗，目前的分片都可能換過：鏡像丟掉舊資料、manifest 重新讀取
+                self._manifest = None
+                self.mirror.reset()
+            if entry is None:
+                # 別人先封存了同名的分片：等 manifest_ttl 秒後再檢查，不要每次寫入都重試
+                self._retry_at = time.time() + self.manifest_ttl
+                return None
+            self._checked_year, self._checked_at = now.year, time.time()
+            self.last_error = None
+            self.rollovers += 1
+            return entry
+
+    # ---- 封存分片（本機 Parquet） ----
+    def _path(self, shard):
+        return os.path.join(self.archive_dir, f"{shard}.parquet")
+
+    def download(self, shard):
+        # 封存分片不會再變動，本機已有就直接使用；沒有才分段下載（記憶體只保留一段）
+        path = self._path(shard)
+        if os.path.exists(path):
+            return path
+        with self._mutex:
+            if not os.path.exists(path):
+                os.makedirs(self.archive_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    write_parquet(storage_chunks(self.storage, self.chunk_rows, shard=shard), self.headers, f)
+                os.replace(tmp_path, path)
+        return path
+
+    def chunks(self, shard, chunk_rows=None):
+        # 依序回傳封存分片的資料列，每段最多 chunk_rows 筆；之後新增的欄位補空白
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(self.download(shard))
+        names = set(pf.schema_arrow.names)
+        present = [h for h in self.headers if h in names]
+        for batch in pf.iter_batches(batch_size=chunk_rows or self.chunk_rows, columns=present):
+            columns = [batch.column(h).to_pylist() if h in names else [""] * batch.num_rows for h in self.headers]
+            yield [list(row) for row in zip(*columns)]
+
+    def column(self, name, shards):
+        import pyarrow.parquet as pq
+
+        values = []
+        for shard in shards:
+            values.extend(pq.read_table(self.download(shard), columns=[name]).column(name).to_pylist())
+        return values
+
+    def records(self, shards):
+        for shard in shards:
+            for rows in self.chunks(shard):
+                for row in rows:
+                    yield dict(zip(self.headers, row))
+
+    def find(self, column, value):
+        # 由最新的封存分片往回找，同一個分片內取最後一筆符合的紀錄；先只讀該欄，找到才讀那一列
+        import pyarrow.parquet as pq
+
+        value = str(value).strip()
+        for shard in reversed(self.manifest()):
+            path = self.download(shard["Shard"])
+            values = [str(v).strip() for v in pq.read_table(path, columns=[column]).column(column).to_pylist()]
+            if value not in values:
+                continue
+            table = pq.read_table(path).slice(len(values) - 1 - values[::-1].index(value), 1)
+            return {h: table.column(h)[0].as_py() if h in table.column_names else "" for h in self.headers}
+        return None
+
+    def meta(self):
+        with self._mutex:
+            manifest = list(self._manifest or [])
+        return {
+            "mode": self.mode,
+            "shards": len(manifest),
+            "archived_rows": sum(int(s["Rows"] or 0) for s in manifest),
+            "local": sum(os.path.exists(self._path(s["Shard"])) for s in manifest),
+            "rollovers": self.rollovers,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+def main():
+    import argparse
+
+    import Project
+
+    parser = argparse.ArgumentParser(description="註冊表分片管理")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--list", action="store_true", help="列出封存分片")
+    action.add_argument("--rollover", action="store_true", help="立即封存目前的分片")
+    action.add_argument("--download", action="store_true", help="下載所有封存分片到本機")
+    parser.add_argument("--period", help="封存分片的期間名稱（預設依資料的年份範圍）")
+    args = parser.parse_args()
+
+    manager = Project.shard_manager
+    if args.rollover:
+        print(manager.rollover(args.period) or "nothing archived")
+    elif args.download:
+        for shard in manager.manifest(max_age=0):
+            print(manager.download(shard["Shard"]))
+    else:
+        for shard in manager.manifest(max_age=0):
+            print(shard)
+
+
+if __name__ == "__main__":
+    main()
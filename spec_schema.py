@@ -0,0 +1,132 @@
+import collections
+import json
+
+# ========== C. 規格資訊欄位定義 ==========
+# 每個散熱方案只在這裡定義一次，表單、預覽、Excel 文字與寫入工作表都使用同一份。
+# 每個欄位寫成 (欄位名稱, 畫面標籤, 單位, widget key)，清單順序就是畫面與 Excel 的順序，
+# 尺寸類欄位（Chip/Length/Width/Height）一律放在最後。
+# 載入時編譯成 SPEC_SECTIONS（tuple），執行時不再重建 dict 或重新排序。
+
+SPEC_SCHEMA = {
+    "Air Cooling氣冷": {
+        "cell": "A17",
+        "fields": [
+            ("Air_Flow", "Air Flow (RPM/Voltage/CFM)", "RPM/Voltage/CFM", "air_flow"),
+            ("Tcase_Max", "Tcase_Max (°C)", "°C", "air_tcase"),
+            ("Thermal_Resistance", "Thermal Resistance (°C/W)", "°C/W", "air_res"),
+            ("Max_Power", "Max Power (W)", "W", "air_power"),
+            ("Chip_Length", "Chip_Length (mm)", "mm", "air_len"),
+            ("Chip_Width", "Chip_Width (mm)", "mm", "air_wid"),
+            ("Chip_Height", "Chip_Height (mm)", "mm", "air_hei"),
+        ],
+    },
+    "Fan風扇": {
+        "cell": "C17",
+        "fields": [
+            ("Max_Power", "Max Power (W)", "W", "fan_power"),
+            ("Input_Voltage", "Input voltage (V)", "V", "fan_volt"),
+            ("Input_Current", "Input current (A)", "A", "fan_curr"),
+            ("PQ", "P-Q", "", "fan_pq"),
+            ("Speed", "Rotational speed (RPM)", "RPM", "fan_speed"),
+            ("Noise", "Noise (dB)", "dB", "fan_noise"),
+            ("Tone", "Tone", "", "fan_tone"),
+            ("Sone", "Sone", "sone", "fan_sone"),
+            ("Weight", "Weight (g)", "g", "fan_weight"),
+            ("Connector", "端子頭型號", "", "fan_con"),
+            ("Wiring", "線序", "", "fan_wire"),
+            ("Cable_Length", "出框線長", "mm", "fan_cable"),
+            ("Length", "Length (mm)", "mm", "fan_len"),
+            ("Width", "Width (mm)", "mm", "fan_wid"),
+            ("Height", "Height (mm)", "mm", "fan_hei"),
+        ],
+    },
+    "Liquid Cooling水冷": {
+        "cell": "E17",
+        "fields": [
+            ("Plate_Form", "Plate Form", "", "liq_plate"),
+            ("Max_Power", "Max Power (W)", "W", "liq_max_power"),
+            ("Tj_Max", "Tj_Max (°C)", "°C", "liq_tj"),
+            ("Tcase_Max", "Tcase_Max (°C)", "°C", "liq_tcase"),
+            ("T_Inlet", "T_Inlet (°C)", "°C", "liq_inlet"),
+            ("Thermal_Resistance", "Thermal Resistance (°C/W)", "°C/W", "liq_res"),
+            ("Flow_Rate", "Flow rate (LPM)", "LPM", "liq_flow"),
+            ("Impedance", "Impedance (KPa)", "KPa", "liq_imp"),
+            ("Max_Loading", "Max loading (lbs)", "lbs", "liq_load"),
+            ("Chip_Length", "Chip_Length (mm)", "mm", "liq_chip_length"),
+            ("Chip_Width", "Chip_Width (mm)", "mm", "liq_chip_width"),
+            ("Chip_Height", "Chip_Height (mm)", "mm", "liq_chip_height"),
+        ],
+    },
+}
+
+# line_prefix：Excel 每行的前綴，例如 "Max_Power (W): "
+SpecField = collections.namedtuple("SpecField", "key label unit widget_key line_prefix")
+SpecSection = collections.namedtuple("SpecSection", "name cell fields keys")
+
+
+def compile_schema(schema):
+    sections = []
+    for name, spec in schema.items():
+        fields = tuple(
+            SpecField(key, label, unit, widget_key, f"{key} ({unit}): " if unit else f"{key}: ")
+            for key, label, unit, widget_key in spec["fields"]
+        )
+        sections.append(SpecSection(name, spec["cell"], fields, frozenset(f.key for f in fields)))
+    return tuple(sections)
+
+
+SPEC_SECTIONS = compile_schema(SPEC_SCHEMA)
+SPEC_SECTION_NAMES = tuple(s.name for s in SPEC_SECTIONS)
+SPEC_BY_NAME = {s.name: s for s in SPEC_SECTIONS}
+
+
+def ordered_sections(specs):
+    # 依定義順序回傳 (section, 欄位值)；不在定義中的方案略過
+    if not isinstance(specs, dict):
+        return
+    for section in SPEC_SECTIONS:
+        if section.name in specs:
+            yield section, specs[section.name] or {}
+
+
+def section_text(section, values):
+    # 模板儲存格文字：第一行方案名稱、空一行，之後每個欄位一行；定義外的欄位附在最後
+    lines = [section.name, ""]
+    lines += [f.line_prefix + str(values[f.key]) for f in section.fields if f.key in values]
+    lines += [f"{k}: {v}" for k, v in values.items() if k not in section.keys]
+    return "\n".join(lines)
+
+
+def serialize_sections(specs):
+    # 寫入工作表 Spec_Type 欄：方案名稱以 ", " 串接
+    if not isinstance(specs, dict):
+        return ""
+    return ", ".join([s.name for s in SPEC_SECTIONS if s.name in specs] + [k for k in specs if k not in SPEC_BY_NAME])
+
+
+def encode_spec(specs):
+    # 完整規格內容存成一格 JSON（Spec_Data 欄）；空白欄位不存，還原時由定義補回
+    if not isinstance(specs, dict):
+        return ""
+    data = {name: {k: v for k, v in (values or {}).items() if v not in ("", None)} for name, values in specs.items()}
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data else ""
+
+
+def decode_spec(text):
+    # encode_spec 的反向：依定義補齊每個方案的欄位（順序與表單相同），無法解析時回傳 {}
+    try:
+        data = json.loads(text) if text else {}
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    specs = {}
+    for name, values in data.items():
+        values = values if isinstance(values, dict) else {}
+        section = SPEC_BY_NAME.get(name)
+        if section:
+            specs[name] = {f.key: values.get(f.key, "") for f in section.fields}
+            specs[name].update((k, v) for k, v in values.items() if k not in section.keys)
+        else:
+            specs[name] = dict(values)
+    return specs
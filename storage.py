@@ -0,0 +1,613 @@
+import datetime
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import closing, contextmanager
+
+# ========== 儲存後端 ==========
+# Project.py 只透過這裡的介面讀寫資料，實際存放位置由設定 STORAGE_BACKEND 決定：
+#   "gsheets" -> GoogleSheetStorage（正式環境，直接讀寫 Google Sheet）
+#   "sqlite"  -> SQLiteStorage（本機資料庫，不需網路，可再用 sync_to_google_sheet 匯出到 Google Sheet）
+
+LOCK_HEADERS = ["Key", "User", "Locked_Time", "Heartbeat"]
+SHARD_HEADERS = ["Shard", "Period", "Rows", "First_Time", "Last_Time", "Archived_Time"]
+SEQ_NAME = "project"
+
+
+class Storage:
+    # ---- 專案紀錄 ----
+    def append_records(self, rows):
+        raise NotImplementedError
+
+    def get_all_records(self):
+        raise NotImplementedError
+
+    def count_records(self):
+        raise NotImplementedError
+
+    def get_last_record(self, user):
+        # 該業務最後一筆紀錄（dict），沒有則回傳 None
+        raise NotImplementedError
+
+    def fetch_rows(self, start=0, limit=None):
+        # 第 start 筆（從 0 起算，不含標題列）之後的資料列，依 headers 順序；limit 為最多幾筆（None 代表全部）
+        raise NotImplementedError
+
+    def fetch_column(self, name):
+        raise NotImplementedError
+
+    # ---- 分片（封存的舊資料列，見 shards.py）；上面的讀寫都只針對目前使用中的分片 ----
+    def read_shards(self):
+        # 已封存的分片（manifest），依封存順序：[{Shard, Period, Rows, First_Time, Last_Time, Archived_Time}]
+        raise NotImplementedError
+
+    def active_range(self):
+        # 目前分片的 (筆數, 最早 Update_Time, 最晚 Update_Time)，判斷是否需要封存用（見 shards.py）
+        raise NotImplementedError
+
+    def archive_active(self, shard, period, archived_time):
+        # 把目前所有資料列封存成 shard，之後從空白開始；回傳 manifest 列，shard 名稱已存在（別人先封存）時回傳 None
+        raise NotImplementedError
+
+    def fetch_shard(self, shard, start=0, limit=None):
+        # 同 fetch_rows，讀取已封存的分片
+        raise NotImplementedError
+
+    # ---- 流水號 ----
+    def seed_seq(self, force=False):
+        raise NotImplementedError
+
+    def allocate_seq(self, count=1, owner=""):
+        raise NotImplementedError
+
+    # ---- Lock（每個 key 一列 [Key, User, Locked_Time, Heartbeat]，見 lock_engine.py） ----
+    def read_locks(self):
+        # {key: (user, locked_time, heartbeat)}
+        raise NotImplementedError
+
+    def write_lock(self, key, user, locked_time, heartbeat=""):
+        raise NotImplementedError
+
+    def clear_lock(self, key, user, locked_time=""):
+        # 只有目前持有者是 user（且取得時間是 locked_time）時才整列清除，回傳是否有清除
+        raise NotImplementedError
+
+
+# ========== Google Sheet（gspread 延後到第一次使用才載入） ==========
+class GoogleSheetStorage(Storage):
+    def __init__(self, client, sheet_name, worksheet_name, headers,
+                 lock_sheet_name="Lock", seq_sheet_name="Seq", tz=None, client_factory=None,
+                 shard_sheet_name="Shards"):
+        self._client = client
+        self._client_factory = client_factory
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
+        self.headers = list(headers)
+        self.lock_sheet_name = lock_sheet_name
+        self.seq_sheet_name = seq_sheet_name
+        self.shard_sheet_name = shard_sheet_name
+        self.tz = tz
+        self._spreadsheet = None
+        self._worksheets = {}
+        self._seq_base = None
+        self._mutex = threading.RLock()
+        # 業務 -> 最後一筆紀錄所在列號；_indexed_rows 為已掃描到的最後一列（第 1 列是標題）
+        self._user_rows = {}
+        self._indexed_rows = 1
+        self._header_row = None
+        self._lock_rows = {}  # Lock key -> 所在列號
+
+    # ---- 工作表（第一次使用才連線，開啟一次後重複使用） ----
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    @property
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            self._spreadsheet = self.client.open(self.sheet_name)
+        return self._spreadsheet
+
+    def worksheet(self, title, rows=10, cols=2, header=None):
+        import gspread
+
+        with self._mutex:
+            if title not in self._worksheets:
+                try:
+                    ws = self.spreadsheet.worksheet(title)
+                except gspread.exceptions.WorksheetNotFound:
+                    ws = self.spreadsheet.add_worksheet(title=title, rows=rows, cols=cols)
+                    if header:
+                        ws.update(range_name=f"A1:{gspread.utils.rowcol_to_a1(1, len(header))}", values=[header])
+                self._worksheets[title] = ws
+            return self._worksheets[title]
+
+    @property
+    def sheet(self):
+        return self.worksheet(self.worksheet_name)
+
+    # ---- 專案紀錄 ----
+    def append_records(self, rows):
+        if not rows:
+            return
+        response = self.sheet.append_rows(rows, value_input_option="RAW")
+        first_row, _ = _rows_from_append_response(response)
+        self._index_appended(first_row, rows)
+
+    def get_all_records(self):
+        return self.sheet.get_all_records()
+
+    def fetch_rows(self, start=0, limit=None):
+        return self._fetch(self.sheet, start, limit)
+
+    def _fetch(self, ws, start=0, limit=None):
+        import gspread
+
+        last_col = gspread.utils.rowcol_to_a1(1, len(self.headers)).rstrip("0123456789")
+        end = "" if limit is None else start + 1 + limit
+        return ws.get(f"A{start + 2}:{last_col}{end}")
+
+    def fetch_column(self, name):
+        return self.sheet.col_values(self.headers.index(name) + 1)[1:]
+
+    # ---- 業務最後一筆紀錄索引（登入時接續使用） ----
+    # 只掃描 Sales_User 這一欄，而且每次只讀「上次掃描之後」新增的列；
+    # 自己 append 的列直接由回傳的列號更新索引。接續時只讀那一列。
+    @property
+    def _user_col(self):
+        import gspread
+
+        col = gspread.utils.rowcol_to_a1(1, self.headers.index("Sales_User") + 1)
+        return col.rstrip("0123456789")
+
+    def _index_appended(self, first_row, rows):
+        user_idx = self.headers.index("Sales_User")
+        with self._mutex:
+            for offset, row in enumerate(rows):
+                user = str(row[user_idx] if len(row) > user_idx else "").strip()
+                if user:
+                    self._user_rows[user] = first_row + offset
+            # 新列緊接在已掃描範圍之後才推進，否則留給下次增量掃描
+            if first_row == self._indexed_rows + 1:
+                self._indexed_rows = first_row + len(rows) - 1
+
+    def _sync_user_index(self):
+        with self._mutex:
+            start = self._indexed_rows + 1
+            col = self._user_col
+            values = self.sheet.get(f"{col}{start}:{col}")
+            for offset, cell in enumerate(values):
+                user = str(cell[0]).strip() if cell else ""
+                if user:
+                    self._user_rows[user] = start + offset
+            self._indexed_rows = start + len(values) - 1
+
+    def _reset_user_index(self):
+        with self._mutex:
+            self._user_rows = {}
+            self._indexed_rows = 1
+            self._header_row = None
+
+    def get_last_record(self, user):
+        user = str(user).strip()
+        for _ in range(2):
+            self._sync_user_index()
+            row = self._user_rows.get(user)
+            if not row:
+                return None
+            if self._header_row is None:
+                # 工作表標題列可能還沒有之後新增的欄位（例如 Spec_Data），缺的依 headers 順序補在後面
+                header = self.sheet.row_values(1) or []
+                self._header_row = header + [h for h in self.headers if h not in header]
+            values = self.sheet.row_values(row)
+            record = dict(zip(self._header_row, values + [""] * (len(self._header_row) - len(values))))
+            if str(record.get("Sales_User", "")).strip() == user:
+                return record
+            # 列號已對不上（工作表被手動刪列或排序），整個重建後再試一次
+            self._reset_user_index()
+        return None
+
+    def count_records(self):
+        # 只讀第一欄（Project_Number），扣掉標題列
+        return max(len(self.sheet.col_values(1)) - 1, 0)
+
+    # ---- 分片（Shards 工作表：第 1 列標題 SHARD_HEADERS，之後每個封存分片一列） ----
+    # 封存時先建立一張空白的新工作表（暫時名稱），再用一次 batch_update 同時把目前的工作表改名成 shard、
+    # 新工作表改名成 worksheet_name，不會有找不到工作表的空窗。其他程序都以工作表名稱讀寫，改名後自然寫到新的工作表；
+    # shard 名稱由期間決定（shards.py 不會換名稱重試），兩個程序同時封存同一個期間時，後到的那一次會因為名稱重複整批失敗。
+    @property
+    def shard_ws(self):
+        return self.worksheet(self.shard_sheet_name, rows=10, cols=len(SHARD_HEADERS), header=SHARD_HEADERS)
+
+    def read_shards(self):
+        values = self.shard_ws.get("A2:F")
+        return [dict(zip(SHARD_HEADERS, [str(v) for v in row] + [""] * (len(SHARD_HEADERS) - len(row))))
+                for row in values if row and row[0]]
+
+    def active_range(self):
+        # 只讀 Update_Time 一欄（每一列送出時都有寫入時間）
+        times = [str(t) for t in self.sheet.col_values(self.headers.index("Update_Time") + 1)[1:]]
+        filled = [t for t in times if t]
+        return len(times), min(filled, default=""), max(filled, default="")
+
+    def archive_active(self, shard, period, archived_time):
+        import gspread
+
+        with self._mutex:
+            active = self.sheet
+            fresh = self.spreadsheet.add_worksheet(title=f"{self.worksheet_name}_{uuid.uuid4().hex[:8]}",
+                                                   rows=1000, cols=len(self.headers))
+            fresh.update(range_name=f"A1:{gspread.utils.rowcol_to_a1(1, len(self.headers))}", values=[self.headers])
+            try:
+                self.spreadsheet.batch_update({"requests": [
+                    _rename_request(active.id, shard),
+                    _rename_request(fresh.id, self.worksheet_name),
+                ]})
+            except gspread.exceptions.APIError:
+                self.spreadsheet.del_worksheet(fresh)
+                return None
+            finally:
+                # 不論誰封存成功，目前的工作表都已經換過或需要重新開啟
+                self._worksheets.pop(self.worksheet_name, None)
+                self._reset_user_index()
+
+        # 改名前一刻才寫入的列也算在內：筆數與時間範圍直接讀封存後的工作表
+        archived = self.worksheet(shard)
+        rows = len(archived.col_values(1)[1:])
+        times = [t for t in archived.col_values(self.headers.index("Update_Time") + 1)[1:] if t]
+        entry = {"Shard": shard, "Period": period, "Rows": str(rows), "First_Time": min(times, default=""),
+                 "Last_Time": max(times, default=""), "Archived_Time": archived_time}
+        self.shard_ws.append_rows([[entry[h] for h in SHARD_HEADERS]], value_input_option="RAW", table_range="A1")
+        return entry
+
+    def fetch_shard(self, shard, start=0, limit=None):
+        return self._fetch(self.worksheet(shard), start, limit)
+
+    # ---- 流水號（Seq 工作表） ----
+    # Seq 工作表格式：
+    #   A1:B1 -> ["Seq_Base", 起始流水號]（由 seed_seq 依 Python 工作表現有資料筆數寫入）
+    #   第 2 列起每列代表一個已配發的流水號 -> [使用者, 配發時間]
+    # 配發時用 append_rows 追加列，由 Google 回傳實際寫入的列號換算流水號：
+    #   流水號 = Seq_Base + (列號 - 1)
+    # append 由 Google 端依序處理，多人同時配發也不會拿到相同號碼，而且每次只需一次小請求
+    @property
+    def seq_ws(self):
+        with self._mutex:
+            created = self.seq_sheet_name not in self._worksheets
+            ws = self.worksheet(self.seq_sheet_name, rows=1, cols=2)
+            if created and self._seq_base is None:
+                value = ws.acell("B1").value
+                if str(value or "").strip().isdigit():
+                    self._seq_base = int(value)
+            return ws
+
+    def seed_seq(self, force=False):
+        with self._mutex:
+            ws_seq = self.seq_ws
+            if not force and self._seq_base is not None:
+                return self._seq_base
+
+            total_rows = self.count_records() + sum(int(s["Rows"] or 0) for s in self.read_shards())
+            if force:
+                ws_seq.clear()
+            ws_seq.update(range_name="A1:B1", values=[["Seq_Base", total_rows]])
+            self._seq_base = total_rows
+            return total_rows
+
+    def allocate_seq(self, count=1, owner=""):
+        with self._mutex:
+            ws_seq = self.seq_ws
+            base = self._seq_base if self._seq_base is not None else self.seed_seq()
+
+        stamp = datetime.datetime.now(self.tz).strftime("%Y-%m-%d %H:%M:%S")
+        response = ws_seq.append_rows(
+            [[owner, stamp] for _ in range(count)],
+            value_input_option="RAW",
+            insert_data_option="INSERT_ROWS",
+            table_range="A1",
+        )
+        first_row, last_row = _rows_from_append_response(response)
+        return [base + row - 1 for row in range(first_row, last_row + 1)]
+
+    # ---- Lock ----
+    # 每個 key 一列，第一次使用某個 key 時 append 新的一列，之後固定更新同一列（列不會刪除，列號不變）。
+    # 兩個程序同時 append 同一個 key 時以列號較小的那一列為準。
+    @property
+    def lock_ws(self):
+        return self.worksheet(self.lock_sheet_name, rows=100, cols=len(LOCK_HEADERS), header=LOCK_HEADERS)
+
+    def read_locks(self):
+        values = self.lock_ws.get("A2:D")
+        locks, rows = {}, {}
+        for i, row in enumerate(values, start=2):
+            row = [str(v) for v in row] + [""] * (4 - len(row))
+            if row[0] and row[0] not in locks:
+                locks[row[0]] = (row[1], row[2], row[3])
+                rows[row[0]] = i
+        with self._mutex:
+            self._lock_rows = rows
+        return locks
+
+    def _lock_row(self, key):
+        with self._mutex:
+            row = self._lock_rows.get(key)
+        if row is None:
+            self.read_locks()
+            with self._mutex:
+                row = self._lock_rows.get(key)
+        return row
+
+    def write_lock(self, key, user, locked_time, heartbeat=""):
+        row = self._lock_row(key)
+        if row is None:
+            response = self.lock_ws.append_rows([[key, user, locked_time, heartbeat]], value_input_option="RAW",
+                                                table_range="A1")
+            row, _ = _rows_from_append_response(response)
+            with self._mutex:
+                self._lock_rows.setdefault(key, row)
+            return
+        self.lock_ws.update(range_name=f"A{row}:D{row}", values=[[key, user, locked_time, heartbeat]])
+
+    def clear_lock(self, key, user, locked_time=""):
+        # Google Sheet 沒有條件式寫入：先讀回該列，User 與 Locked_Time（有給的話）都相符才整列清空
+        # （User、Locked_Time、Heartbeat 一次寫入），只清一半會讓持有者的 Lock 看起來已經失效。
+        # 讀與寫之間仍有極短的空窗，同一個程序內由 LockEngine 的 key mutex 串行化。
+        row = self._lock_row(key)
+        if row is None:
+            return False
+        ws_lock = self.lock_ws
+        current = [str(v) for v in ((ws_lock.get(f"A{row}:D{row}") or [[]])[0])] + [""] * 4
+        if current[0] != key or current[1] != user or (locked_time and current[2] != locked_time):
+            return False
+        ws_lock.update(range_name=f"B{row}:D{row}", values=[["", "", ""]])
+        return True
+
+
+def _rename_request(sheet_id, title):
+    return {"updateSheetProperties": {"properties": {"sheetId": sheet_id, "title": title}, "fields": "title"}}
+
+
+def _rows_from_append_response(response):
+    import gspread
+
+    # response["updates"]["updatedRange"] 例如 "Seq!A5:B7" -> (5, 7)
+    updated = response["updates"]["updatedRange"].split("!")[-1]
+    start, _, end = updated.partition(":")
+    first_row = gspread.utils.a1_to_rowcol(start)[0]
+    last_row = gspread.utils.a1_to_rowcol(end or start)[0]
+    return first_row, last_row
+
+
+# ========== SQLite ==========
+class SQLiteStorage(Storage):
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = list(headers)
+        self._columns = ", ".join(_quote(h) for h in self.headers)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE 先取得寫入鎖，整段讀取與寫入在同一個交易內完成
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_db(self):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        columns = ", ".join(f"{_quote(h)} TEXT NOT NULL DEFAULT ''" for h in self.headers)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    {columns},
+                    synced INTEGER NOT NULL DEFAULT 0,
+                    shard TEXT NOT NULL DEFAULT ''
+                );
+                CREATE INDEX IF NOT EXISTS idx_records_project_number ON records ("Project_Number");
+                CREATE INDEX IF NOT EXISTS idx_records_sales_user ON records ("Sales_User", id);
+                CREATE INDEX IF NOT EXISTS idx_records_unsynced ON records (synced, id);
+                CREATE TABLE IF NOT EXISTS seq (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS shards (
+                    "Shard" TEXT PRIMARY KEY,
+                    "Period" TEXT NOT NULL DEFAULT '',
+                    "Rows" TEXT NOT NULL DEFAULT '',
+                    "First_Time" TEXT NOT NULL DEFAULT '',
+                    "Last_Time" TEXT NOT NULL DEFAULT '',
+                    "Archived_Time" TEXT NOT NULL DEFAULT ''
+                );
+                CREATE TABLE IF NOT EXISTS key_locks (
+                    "Key" TEXT PRIMARY KEY,
+                    "User" TEXT NOT NULL DEFAULT '',
+                    "Locked_Time" TEXT NOT NULL DEFAULT '',
+                    "Heartbeat" TEXT NOT NULL DEFAULT ''
+                );
+            """)
+            # 舊資料庫缺少之後新增的欄位時補上（新欄位一律加在 headers 最後）
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(records)")}
+            for h in self.headers:
+                if h not in existing:
+                    conn.execute(f"ALTER TABLE records ADD COLUMN {_quote(h)} TEXT NOT NULL DEFAULT ''")
+            # 分片：shard 為空字串代表目前使用中的資料列，封存後改成分片名稱
+            if "shard" not in existing:
+                conn.execute("ALTER TABLE records ADD COLUMN shard TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_records_shard ON records (shard, id)")
+
+    # ---- 專案紀錄 ----
+    def append_records(self, rows):
+        if not rows:
+            return
+        placeholders = ", ".join("?" for _ in self.headers)
+        values = [[_cell(v) for v in _pad(row, len(self.headers))] for row in rows]
+        with self._transaction() as conn:
+            conn.executemany(f"INSERT INTO records ({self._columns}) VALUES ({placeholders})", values)
+
+    def get_all_records(self):
+        with closing(self._connect()) as conn:
+            cur = conn.execute(f"SELECT {self._columns} FROM records WHERE shard = '' ORDER BY id")
+            return [dict(zip(self.headers, row)) for row in cur]
+
+    def count_records(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM records WHERE shard = ''").fetchone()[0]
+
+    def fetch_rows(self, start=0, limit=None):
+        return self.fetch_shard("", start, limit)
+
+    def fetch_column(self, name):
+        with closing(self._connect()) as conn:
+            cur = conn.execute(f"SELECT {_quote(name)} FROM records WHERE shard = '' ORDER BY id")
+            return [row[0] for row in cur]
+
+    def get_last_record(self, user):
+        # 走 (Sales_User, id) 索引，只取一列
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f'SELECT {self._columns} FROM records WHERE "Sales_User" = ? AND shard = \'\' ORDER BY id DESC LIMIT 1',
+                (str(user).strip(),),
+            ).fetchone()
+            return dict(zip(self.headers, row)) if row else None
+
+    def fetch_unsynced(self, limit=500):
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                f"SELECT id, {self._columns} FROM records WHERE synced = 0 ORDER BY id LIMIT ?", (limit,)
+            )
+            return [(row[0], list(row[1:])) for row in cur]
+
+    def mark_synced(self, ids):
+        with self._transaction() as conn:
+            conn.executemany("UPDATE records SET synced = 1 WHERE id = ?", [(i,) for i in ids])
+
+    # ---- 分片 ----
+    def read_shards(self):
+        names = ", ".join(_quote(h) for h in SHARD_HEADERS)
+        with closing(self._connect()) as conn:
+            cur = conn.execute(f"SELECT {names} FROM shards ORDER BY rowid")
+            return [dict(zip(SHARD_HEADERS, row)) for row in cur]
+
+    def active_range(self):
+        with closing(self._connect()) as conn:
+            rows, first, last = conn.execute(
+                'SELECT COUNT(*), MIN(NULLIF("Update_Time", \'\')), MAX("Update_Time") FROM records WHERE shard = \'\''
+            ).fetchone()
+            return rows, first or "", last or ""
+
+    def archive_active(self, shard, period, archived_time):
+        with self._transaction() as conn:
+            if conn.execute('SELECT 1 FROM shards WHERE "Shard" = ?', (shard,)).fetchone():
+                return None
+            conn.execute("UPDATE records SET shard = ? WHERE shard = ''", (shard,))
+            rows, first, last = conn.execute(
+                'SELECT COUNT(*), MIN(NULLIF("Update_Time", \'\')), MAX("Update_Time") FROM records WHERE shard = ?',
+                (shard,),
+            ).fetchone()
+            entry = {"Shard": shard, "Period": period, "Rows": str(rows), "First_Time": first or "",
+                     "Last_Time": last or "", "Archived_Time": archived_time}
+            conn.execute(
+                f"INSERT INTO shards ({', '.join(_quote(h) for h in SHARD_HEADERS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                [entry[h] for h in SHARD_HEADERS],
+            )
+            return entry
+
+    def fetch_shard(self, shard, start=0, limit=None):
+        with closing(self._connect()) as conn:
+            cur = conn.execute(f"SELECT {self._columns} FROM records WHERE shard = ? ORDER BY id LIMIT ? OFFSET ?",
+                               (shard, -1 if limit is None else limit, start))
+            return [list(row) for row in cur]
+
+    # ---- 流水號 ----
+    def seed_seq(self, force=False):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM seq WHERE name = ?", (SEQ_NAME,)).fetchone()
+            if row is not None and not force:
+                return row[0]
+            total_rows = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO seq (name, value) VALUES (?, ?)", (SEQ_NAME, total_rows))
+            return total_rows
+
+    def allocate_seq(self, count=1, owner=""):
+        self.seed_seq()
+        with self._transaction() as conn:
+            current = conn.execute("SELECT value FROM seq WHERE name = ?", (SEQ_NAME,)).fetchone()[0]
+            conn.execute("UPDATE seq SET value = ? WHERE name = ?", (current + count, SEQ_NAME))
+        return list(range(current + 1, current + count + 1))
+
+    # ---- Lock（每個 key 一列） ----
+    def read_locks(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT "Key", "User", "Locked_Time", "Heartbeat" FROM key_locks').fetchall()
+            return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def write_lock(self, key, user, locked_time, heartbeat=""):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO key_locks ("Key", "User", "Locked_Time", "Heartbeat") VALUES (?, ?, ?, ?)',
+                (key, user, locked_time, heartbeat),
+            )
+
+    def clear_lock(self, key, user, locked_time=""):
+        with self._transaction() as conn:
+            return conn.execute(
+                'UPDATE key_locks SET "User" = \'\', "Locked_Time" = \'\', "Heartbeat" = \'\' '
+                'WHERE "Key" = ? AND "User" = ? AND (? = \'\' OR "Locked_Time" = ?)',
+                (key, user, locked_time, locked_time),
+            ).rowcount > 0
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _cell(value):
+    return "" if value is None else str(value)
+
+
+def _pad(row, size):
+    row = list(row)[:size]
+    return row + [""] * (size - len(row))
+
+
+# ========== SQLite -> Google Sheet 匯出 ==========
+def sync_to_google_sheet(local, remote, batch_size=500):
+    # 把本機尚未同步的紀錄依序批次 append 到 Google Sheet，每批只呼叫一次 append_rows
+    synced = 0
+    while True:
+        pending = local.fetch_unsynced(batch_size)
+        if not pending:
+            return synced
+        remote.append_records([row for _, row in pending])
+        local.mark_synced([row_id for row_id, _ in pending])
+        synced += len(pending)
+
+
+# ========== 依設定建立後端 ==========
+def create_storage(backend, headers, client=None, sheet_name="", worksheet_name="",
+                   lock_sheet_name="Lock", seq_sheet_name="Seq", sqlite_path="project_form.db", tz=None,
+                   client_factory=None, shard_sheet_name="Shards"):
+    backend = (backend or "gsheets").strip().lower()
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path, headers)
+    if backend in ("gsheets", "google", "google_sheet"):
+        return GoogleSheetStorage(
+            client, sheet_name, worksheet_name, headers,
+            lock_sheet_name=lock_sheet_name, seq_sheet_name=seq_sheet_name, tz=tz,
+            client_factory=client_factory, shard_sheet_name=shard_sheet_name,
+        )
+    raise ValueError(f"未知的 STORAGE_BACKEND：{backend}")
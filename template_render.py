@@ -0,0 +1,135 @@
+import io
+import re
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+
+# ========== Excel 模板輸出 ==========
+# XlsxTemplate：模板只解析一次，把要填寫的儲存格（E5、B5 … A17/C17/E17）在工作表 XML 中的位置先切好，
+# 每次輸出只把這些儲存格換成 inline string，其餘檔案內容（樣式、圖片、第二張工作表）原封不動，
+# 不需要經過 openpyxl 載入與重新序列化整本活頁簿。
+# render_openpyxl：原本的 openpyxl 作法，保留作為備援（例如模板改版後找不到預期的儲存格）。
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+# XML 1.0 不允許的控制字元（openpyxl 遇到也會報錯），輸出前移除
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class TemplateError(Exception):
+    pass
+
+
+class XlsxTemplate:
+    def __init__(self, path, cells):
+        self.path = path
+        self.cells = list(cells)
+        with zipfile.ZipFile(path) as zf:
+            self.sheet_part = _active_sheet_part(zf)
+            sheet_xml = zf.read(self.sheet_part).decode("utf-8")
+            self._static_zip = _copy_zip_without(zf, self.sheet_part)
+        self._segments, self._slots = _compile_slots(sheet_xml, self.cells)
+
+    def render(self, values):
+        parts = [self._segments[0]]
+        for (ref, attrs, original), segment in zip(self._slots, self._segments[1:]):
+            if ref in values:
+                parts.append(_cell_xml(ref, attrs, values[ref]))
+            else:
+                parts.append(original)
+            parts.append(segment)
+        sheet_xml = "".join(parts).encode("utf-8")
+
+        # 靜態部分已經壓縮好，只追加這一張工作表
+        output = io.BytesIO(self._static_zip)
+        output.seek(0, io.SEEK_END)
+        with zipfile.ZipFile(output, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(self.sheet_part, sheet_xml)
+        return output.getvalue()
+
+
+def _active_sheet_part(zf):
+    # 與 openpyxl 的 wb.active 相同：workbookView 的 activeTab（預設 0）對應的工作表
+    workbook = zf.read("xl/workbook.xml").decode("utf-8")
+    rels = zf.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+    active = re.search(r'<workbookView\b[^>]*\bactiveTab="(\d+)"', workbook)
+    index = int(active.group(1)) if active else 0
+    sheets = re.findall(r'<sheet\b[^>]*\br:id="([^"]+)"', workbook)
+    if index >= len(sheets):
+        raise TemplateError("找不到作用中的工作表")
+    target = re.search(r'<Relationship\b[^>]*\bId="%s"[^>]*\bTarget="([^"]+)"' % re.escape(sheets[index]), rels)
+    if not target:
+        target = re.search(r'<Relationship\b[^>]*\bTarget="([^"]+)"[^>]*\bId="%s"' % re.escape(sheets[index]), rels)
+    if not target:
+        raise TemplateError("找不到作用中工作表的關聯")
+    path = target.group(1)
+    return path.lstrip("/") if path.startswith("/") else "xl/" + path
+
+
+def _copy_zip_without(zf, skip):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as out:
+        for info in zf.infolist():
+            if info.filename == skip:
+                continue
+            out.writestr(info, zf.read(info.filename), compress_type=info.compress_type)
+    return buffer.getvalue()
+
+
+def _compile_slots(sheet_xml, cells):
+    # 找出每個儲存格 <c r="E5" .../> 或 <c r="E5" ...>...</c> 的位置，切成「固定文字 + 儲存格」交錯的片段
+    found = []
+    for ref in cells:
+        m = re.search(r'<c r="%s"((?:\s[^>]*?)?)(?:/>|>.*?</c>)' % re.escape(ref), sheet_xml, re.S)
+        if not m:
+            raise TemplateError(f"模板中找不到儲存格 {ref}")
+        attrs = re.sub(r'\s(?:t|r)="[^"]*"', "", m.group(1))
+        found.append((m.start(), m.end(), ref, attrs, m.group(0)))
+    found.sort()
+
+    segments, slots, pos = [], [], 0
+    for start, end, ref, attrs, original in found:
+        segments.append(sheet_xml[pos:start])
+        slots.append((ref, attrs, original))
+        pos = end
+    segments.append(sheet_xml[pos:])
+    return segments, slots
+
+
+def _cell_xml(ref, attrs, value):
+    if value is None or value == "":
+        return f'<c r="{ref}"{attrs}/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"{attrs}><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c r="{ref}"{attrs} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+# ========== 模板快取（每個程序每個模板只解析一次） ==========
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(path, cells):
+    key = (path, tuple(cells))
+    with _templates_lock:
+        if key not in _templates:
+            _templates[key] = XlsxTemplate(path, cells)
+        return _templates[key]
+
+
+def render_xml(path, cells, values):
+    return get_template(path, cells).render(values)
+
+
+def render_openpyxl(path, values):
+    from openpyxl import load_workbook  # 只有備援路徑才載入 openpyxl
+
+    wb = load_workbook(path)
+    ws = wb.active
+    for ref, value in values.items():
+        ws[ref] = value
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,287 @@
+import itertools
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# ========== 背景批次寫入（write-behind） ==========
+# 送出時只把資料列放進佇列就立即回傳編號，背景執行緒累積到 batch_size 筆或等滿 flush_interval 秒
+# 才用一次 flush_rows(rows)（Google Sheet 為 append_rows）寫入，429 / 5xx 以指數退避重試。
+# 每筆資料的狀態可用 status(ticket) 查詢：pending -> committed / failed
+# 有設定 journal（journal.SubmitJournal）時：
+#   - submit 先把資料列寫進本機日誌才回傳，程序中斷也不會遺失
+#   - 暫時性錯誤重試用完後不算失敗，標記為 spooled 留在日誌，每 replay_interval 秒再整批補寫一次
+#   - 程序啟動時把日誌中尚未寫入的資料列重新排入（replay）
+#   - 上一次寫入結果不明的資料列，先呼叫 reconcile(tickets) 確認哪些已經在工作表上，只補寫沒有的
+# ticket 是冪等鍵：同一個 ticket 重複 submit（重試、連點、逾時後再送一次）不會再排入，直接回傳原本的 ticket。
+# 依序檢查記憶體中的狀態、日誌、known(ticket)（例如鏡像中已寫入的 Submission_Id），都沒有才受理。
+
+PENDING = "pending"
+COMMITTED = "committed"
+FAILED = "failed"
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_code(exc):
+    response = getattr(exc, "response", None)
+    code = getattr(response, "status_code", None)
+    return getattr(exc, "code", None) if code is None else code
+
+
+def is_rejected(exc):
+    # 4xx（包含 429）代表伺服器明確拒絕，資料確定沒有寫入；5xx、逾時、連線中斷則結果不明
+    code = _status_code(exc)
+    return code is not None and 400 <= code < 500
+
+
+def is_retryable(exc):
+    # gspread.exceptions.APIError 會帶 response.status_code；連線中斷或逾時也視為暫時性錯誤
+    code = _status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+class WriteBehindQueue:
+    def __init__(self, flush_rows, batch_size=50, flush_interval=1.0,
+                 max_retries=6, base_delay=1.0, max_delay=32.0, max_tracked=10000,
+                 journal=None, reconcile=None, replay_interval=30.0, known=None):
+        self.flush_rows = flush_rows
+        self.journal = journal
+        self.reconcile = reconcile
+        self.known = known
+        self.replay_interval = replay_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_tracked = max_tracked
+
+        self._queue = queue.Queue()
+        self._status = OrderedDict()
+        self._status_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._idle = threading.Condition(self._status_lock)
+        self._queued = set()  # 已排入佇列或寫入中的 ticket
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self.duplicates = 0  # 因為 ticket 已受理而略過的 submit 次數
+
+    # ---- 對外介面 ----
+    def submit(self, row, ticket=None):
+        # known() 可能比較慢（查鏡像等），在 _submit_lock 外先查，不擋住其他 session 的送出
+        if ticket is not None and self.known is not None and self.known(ticket):
+            return self._duplicate(ticket)
+        with self._submit_lock:
+            if ticket is not None and self._seen(ticket):
+                return self._duplicate(ticket)
+            ticket = ticket or f"w{next(self._ids)}"
+            if self.journal is not None:
+                self.journal.append(ticket, row)  # 先寫進本機日誌才算受理
+            self._enqueue(ticket, row)
+        self._ensure_thread()
+        return ticket
+
+    def accepted(self, ticket):
+        # ticket 是否已經受理過（不論目前是等待中、已寫入或失敗）
+        return self._seen(ticket) or (self.known is not None and bool(self.known(ticket)))
+
+    def _seen(self, ticket):
+        # 本程序記憶體中的狀態或本機日誌裡有這個 ticket
+        with self._status_lock:
+            if ticket in self._status:
+                return True
+        return self.journal is not None and self.journal.status(ticket) is not None
+
+    def _duplicate(self, ticket):
+        with self._status_lock:
+            self.duplicates += 1
+        return ticket
+
+    def _enqueue(self, ticket, row):
+        with self._status_lock:
+            if ticket in self._queued:
+                return
+            if ticket not in self._status:
+                self._status[ticket] = {"status": PENDING, "error": "", "row": list(row), "attempts": 0,
+                                        "accepted_at": time.time(), "committed_at": None, "spooled": False}
+                self._trim()
+            self._queued.add(ticket)
+        self._queue.put(ticket)
+
+    def status(self, ticket):
+        with self._status_lock:
+            entry = self._status.get(ticket)
+            if entry:
+                return dict(entry)
+        if self.journal is not None:
+            # 程序重啟後記憶體中沒有狀態，改查日誌
+            entry = self.journal.status(ticket)
+            if entry:
+                synced = entry["status"] == "synced"
+                return {"status": COMMITTED if synced else PENDING, "error": entry["error"], "row": entry["row"],
+                        "attempts": entry["attempts"], "accepted_at": entry["accepted_at"],
+                        "committed_at": entry["synced_at"], "spooled": not synced and bool(entry["error"])}
+        return None
+
+    def retry(self, ticket):
+        # 失敗的資料列重新排入佇列
+        with self._status_lock:
+            entry = self._status.get(ticket)
+            if not entry or entry["status"] != FAILED:
+                return False
+            entry.update(status=PENDING, error="", attempts=0, spooled=False)
+            self._queued.add(ticket)
+        self._ensure_thread()
+        self._queue.put(ticket)
+        return True
+
+    def wait(self, ticket, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._idle:
+            while self._status.get(ticket, {}).get("status") == PENDING:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            return dict(self._status.get(ticket, {}))
+
+    def pending_count(self):
+        with self._status_lock:
+            return sum(1 for e in self._status.values() if e["status"] == PENDING)
+
+    # ---- 背景執行緒 ----
+    def _ensure_thread(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def replay(self):
+        # 日誌中尚未寫入的資料列（程序中斷前受理的、spooled 的）重新排入佇列
+        if self.journal is None:
+            return 0
+        count = 0
+        for ticket, row in self.journal.unsynced():
+            with self._status_lock:
+                if ticket in self._queued:
+                    continue
+            self._enqueue(ticket, row)
+            count += 1
+        return count
+
+    def _run(self):
+        if self.journal is not None:
+            self.replay()
+        while True:
+            try:
+                first = self._queue.get(timeout=self.replay_interval if self.journal is not None else None)
+            except queue.Empty:
+                self.replay()
+                continue
+            batch = [first]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, tickets):
+        with self._status_lock:
+            batch = [t for t in tickets if self._status.get(t, {}).get("status") == PENDING]
+            spooled = any(self._status[t].get("spooled") for t in batch)
+        # spooled 的資料列代表服務還沒恢復，只試一次，失敗就等下一次 replay
+        max_retries = 0 if spooled else self.max_retries
+        tickets = batch
+        attempt = 0
+        try:
+            while tickets:
+                wrote = False
+                try:
+                    tickets = self._claim(tickets)
+                    if not tickets:
+                        return
+                    with self._status_lock:
+                        rows = [self._status[t]["row"] for t in tickets]
+                    wrote = True
+                    self.flush_rows(rows)
+                    if self.journal is not None:
+                        self.journal.mark_synced(tickets)
+                    self._finish(tickets, COMMITTED, attempts=attempt)
+                    return
+                except Exception as exc:
+                    attempt += 1
+                    error = f"{type(exc).__name__}: {exc}"
+                    if self.journal is not None:
+                        self.journal.release(tickets, error, uncertain=wrote and not is_rejected(exc))
+                    if not is_retryable(exc):
+                        self._finish(tickets, FAILED, error, attempt)
+                        return
+                    if attempt > max_retries:
+                        if self.journal is not None:
+                            self._spool(tickets, error, attempt)
+                        else:
+                            self._finish(tickets, FAILED, error, attempt)
+                        return
+                    delay = min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
+                    time.sleep(delay + random.uniform(0, delay / 2))
+        finally:
+            with self._status_lock:
+                self._queued.difference_update(batch)
+
+    def _claim(self, tickets):
+        # 沒有日誌時全部直接寫入；有日誌時先認領，結果不明的先到工作表確認，只寫入還沒有的
+        if self.journal is None:
+            return tickets
+        claimed = self.journal.claim(tickets)
+        uncertain = [t for t in tickets if claimed.get(t)]
+        present = set()
+        if uncertain and self.reconcile is not None:
+            present = set(self.reconcile(uncertain))
+            done = [t for t in uncertain if t in present]
+            if done:
+                self.journal.mark_synced(done)
+                self._finish(done, COMMITTED)
+            self.journal.mark_certain([t for t in uncertain if t not in present])
+        # 被其他程序認領的不在 claimed 內，交給對方處理
+        return [t for t in tickets if t in claimed and t not in present]
+
+    def _spool(self, tickets, error, attempts):
+        with self._status_lock:
+            for t in tickets:
+                entry = self._status.get(t)
+                if entry is not None:
+                    entry.update(error=error, attempts=attempts, spooled=True)
+
+    def _finish(self, tickets, status, error="", attempts=None):
+        now = time.time()
+        with self._idle:
+            for t in tickets:
+                entry = self._status.get(t)
+                if entry is None:
+                    continue
+                entry["status"] = status
+                entry["error"] = error
+                entry["spooled"] = False
+                if attempts is not None:
+                    entry["attempts"] = attempts
+                if status == COMMITTED:
+                    entry["committed_at"] = now
+            self._idle.notify_all()
+
+    def _trim(self):
+        # 只保留最近 max_tracked 筆已完成的狀態，避免長時間執行時無限成長
+        while len(self._status) > self.max_tracked:
+            oldest, entry = next(iter(self._status.items()))
+            if entry["status"] == PENDING:
+                break
+            self._status.pop(oldest)